@@ -1,3 +1,6 @@
+import numpy as np
+
+
 # define an abstract class template of the Agent
 class agent():
     def __init__(self, bus1=None, bus2=None, timescale=None):
@@ -13,6 +16,7 @@ class agent():
         self.actNum = None
         self.trainable = False
         self.rewardFcn = None
+        self.action = None
 
     # reset internal states and assign the environment handle
     def reset(self, env):
@@ -30,6 +34,11 @@ class agent():
     def setAction(self):
         pass
 
+    # raw action of the last getAction, None if the agent does not act
+    # recorded in the trajectories of the env
+    def last_action(self):
+        return None
+
     # (ML agent only) the environment should be set to train this agent, train the model if applicable
     def train(self):
         pass
@@ -37,11 +46,29 @@ class agent():
     # (RL agent only) compute a reward corresponding to the action
     def getReward(self):
         pass
+
+    # (dynamic agent only) next simulation time in seconds at which the agent has
+    # to observe and act, np.inf if only after a network change, None if at every
+    # time step. Used by the adaptive stepping of dynamic events
+    def wake_time(self):
+        return None
     
     # (ML agent only) construct a model, called at agent initialization
     def build(self):
         pass
 
+    # (ML agent only) raw actions (agents x actNum) of the stacked states
+    # (agents x svNum) of agents sharing this model, in one forward pass.
+    # Agent groups call it instead of getAction, every agent gets its row as
+    # self.action before setAction
+    def forward(self, states):
+        pass
+
+    # group stepping the agents of this class and model together, called on
+    # one of them. Agents with a vectorized group return it (see OCRelayAgent)
+    def group(self, agents):
+        return agentGroup(agents)
+
     # (ML agent only) save model or weight to local drive
     def save(self):
         pass
@@ -49,3 +76,78 @@ class agent():
     # (ML agent only) load saved model or weight stored previously
     def load(self):
         pass
+
+
+# agents of one class and model, observed and acted for by the env as one
+# batch: one forward pass of the shared model for the stacked states if the
+# class implements forward, one call per agent otherwise. Vectorized groups
+# override observe/getAction/setAction to read the snapshot and write the
+# engine once for all their agents
+# the agents stay the reference: a group reloads their internal states at the
+# start of every episode (they may be reset one by one) and keeps them up to
+# date, e.g. for the trajectories and the agent under training
+class agentGroup():
+    def __init__(self, agents):
+        self.agents = agents
+        self.model = getattr(agents[0], 'model', None)
+        self.env = None
+        self.states = None
+        self.actions = None
+        # only call the methods the agents implement
+        cls = type(agents[0])
+        self.batched = cls.forward is not agent.forward
+        self.rewarded = cls.getReward is not agent.getReward
+
+    # assign the environment handle, after the agents were reset
+    def reset(self, env):
+        self.env = env
+
+    # read the internal states of the agents, at the start of every episode
+    def load_members(self):
+        pass
+
+    def observe(self):
+        for a in self.agents:
+            a.observe()
+
+    def getAction(self):
+        if not self.batched:
+            for a in self.agents:
+                a.getAction()
+            return
+
+        self.states = np.stack([np.asarray(a.state, dtype=float) for a in self.agents])
+        self.actions = self.agents[0].forward(self.states)
+        for a, act in zip(self.agents, self.actions):
+            a.action = act
+
+    def setAction(self):
+        for a in self.agents:
+            a.setAction()
+
+    def getReward(self):
+        if self.rewarded:
+            for a in self.agents:
+                a.getReward()
+
+    # earliest wake up time of the agents, None if one acts at every time step
+    def wake_time(self):
+        tNext = np.inf
+        for a in self.agents:
+            w = a.wake_time()
+            if w is None:
+                return None
+            tNext = min(tNext, w)
+        return tNext
+
+
+# groups of a list of agents, one per class and model in the order of their
+# first agent, or one per agent (merge=False) to step them one by one
+def make_groups(agents, merge=True):
+    if not merge:
+        return [agentGroup([a]) for a in agents]
+
+    members = {}
+    for a in agents:
+        members.setdefault((type(a), id(getattr(a, 'model', None))), []).append(a)
+    return [m[0].group(m) for m in members.values()]
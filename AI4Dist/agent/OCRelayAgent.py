@@ -1,7 +1,25 @@
-from .AgentTemplate import agent
+from .AgentTemplate import agent, agentGroup
 import numpy as np
 
 
+# relative measurement noise of the currents
+NOISE = 0.015
+
+# inverse time curves, delay = TD * A / (M^p - 1) + B with M the ratio between
+# the fault and pickup currents: (A, p, B)
+CURVES = {
+    # IEC 60255
+    'IEC-SIT': (0.14, 0.02, 0), # standard inverse time
+    'IEC-VIT': (13.5, 0.02, 0), # very inverse
+    'IEC-EIT': (80, 2, 0), # extremely inverse
+    'IEC-LTSI': (120, 1, 0), # long time standard inverse
+    # IEEE C37.112-1996
+    'IEEE-MIT': (0.0515, 0.02, 0.114), # moderately inverse
+    'IEEE-VIT': (19.61, 2, 0.491), # very inverse
+    'IEEE-EIT': (28.2, 2, 0.1217), # extremely inverse
+}
+
+
 class OCAgent(agent):
     def __init__(self, bus1=None, bus2=None, line=None, Ipickup=None, TD_TMS=None, curve=None):
         # name (string) of the buses
@@ -30,64 +48,43 @@ class OCAgent(agent):
 
     # return the time delay of this relay for a fault current
     def time_delay(self, Ifault):
+        if self.curve not in CURVES:
+            raise ValueError(f'Please specify a valid Curve Type for Overcurrent relay at bus {self.bus1}!')
+        A, p, B = CURVES[self.curve]
+
         # ratio between actual and pickup current
         M = Ifault / self.Ip
+        return self.td * A / (M ** p - 1) + B
 
-        # IEC curve formulas (IEC 60255)
-        if 'IEC' in self.curve:
-            if self.curve == 'IEC-SIT': # standard inverse time
-                k = 0.14
-                alpha = 0.02
-            elif self.curve == 'IEC-VIT': # very inverse
-                k = 13.5
-                alpha = 0.02
-            elif self.curve == 'IEC-EIT': # extremely inverse
-                k = 80
-                alpha = 2
-            elif self.curve == 'IEC-LTSI': # long time standard inverse
-                k = 120
-                alpha = 1
-            else:
-                raise ValueError(f'Please specify a valid Curve Type for Overcurrent relay at bus {self.bus1}!')
-
-            return self.td * k / (M ** alpha - 1)
-
-        # IEEE curve formulas (IEEE C37.112-1996)
-        elif 'IEEE' in self.curve:
-            if self.curve == 'IEEE-MIT': # moderately inverse
-                A = 0.0515
-                B = 0.114
-                p = 0.02
-            elif self.curve == 'IEEE-VIT': # very inverse
-                A = 19.61
-                B = 0.491
-                p = 2
-            elif self.curve == 'IEEE-EIT': # extremely inverse
-                A = 28.2
-                B = 0.1217
-                p = 2
-            else:
-                raise ValueError(f'Please specify a valid Curve Type for Overcurrent relay at bus {self.bus1}!')
-
-            return self.td * A / (M**p - 1) + B
-
+    # relays are stepped together by an ocGroup
+    def group(self, agents):
+        return ocGroup(agents)
 
     # reset internal states and assign the environment handle
     def reset(self, env):
         self.env = env
+        self.idx = env.agents.index(self)
         self.tripped = False
         self.open = False
-        self.waveform = {'I':[]}
+        self.channel = env.recorder.register(f'{self.line}.I')
         self.state = None
+        self.trip = None
         self.triggerTime = None
+        self.tripTime = None
         self.delay = None
     
     # gather required observations from the environment
     def observe(self):
-        I = self.env.case.get_line_I(self.line, 'Iseq', self.phases)
-        self.state = I[1] * np.random.uniform(0.985, 1.015) # positive seq current magnitude
-        self.time = self.env.case.sol.Seconds
-        self.waveform['I'].append(self.state)
+        I = self.env.case.snap_line_I(self.line, 'Iseq', self.phases)
+        noise = 1 + NOISE * (2 * self.env.step_random()[self.idx] - 1)
+        self.state = I[1] * noise # positive seq current magnitude
+        self.time = self.env.case.engine.seconds()
+        self.env.recorder.record(self.channel, self.time, self.state)
+
+    # current waveform of the episode
+    @property
+    def waveform(self):
+        return {'I': self.env.recorder.current(self.channel)[1]}
 
     # compute raw action using agent model
     def getAction(self):
@@ -106,10 +103,134 @@ class OCAgent(agent):
             # if the current fells below Ip, stop the counting
             self.triggerTime = None
         
+    # trip signal of the last getAction
+    def last_action(self):
+        return self.trip
+
     # modify the circuit model based on computed action
     def setAction(self):
         if self.trip == 1:
             self.open = True
             self.env.case.trip_elmt(self.line)
+
+    # next time this relay has to act: right away when it picks up or drops off,
+    # when the time delay runs out while triggered, otherwise only after a
+    # network change
+    def wake_time(self):
+        if self.open:
+            return np.inf
+        if (self.state > self.Ip) != (self.triggerTime is not None):
+            return self.time
+        if self.triggerTime is not None:
+            return self.triggerTime + self.delay
+        return np.inf
             
 
+
+
+# overcurrent relays stepped as one vector: the currents of all relays are one
+# gather from the snapshot, the inverse time curves are evaluated for all the
+# relays picking up at once and the trips are one bulk engine write
+# triggerTime is NaN for the relays that are not triggered
+class ocGroup(agentGroup):
+    def __init__(self, agents):
+        super().__init__(agents)
+        self.lines = [a.line for a in agents]
+        self.Ip = np.array([a.Ip for a in agents], dtype=float)
+        self.td = np.array([a.td for a in agents], dtype=float)
+        # curve coefficients, NaN for an invalid curve (raised when it picks up)
+        coefs = np.array([CURVES.get(a.curve, (np.nan,) * 3) for a in agents], dtype=float)
+        self.A, self.p, self.B = coefs.T
+
+        # rows of the lines in the snapshot, found again when it is rebuilt
+        self.rows = None
+        self.rowsOf = None
+
+        self.time = None
+        self.state = None
+
+    # internal states of the relays, the agents may have been reset one by one
+    def load_members(self):
+        value = lambda v: np.nan if v is None else v
+        self.channels = np.array([a.channel for a in self.agents])
+        self.idx = np.array([a.idx for a in self.agents])
+        # recorder channels are written at once unless relays share a line
+        self.distinct = len(np.unique(self.channels)) == len(self.channels)
+        self.triggerTime = np.array([value(a.triggerTime) for a in self.agents], dtype=float)
+        self.delay = np.array([value(a.delay) for a in self.agents], dtype=float)
+        self.tripTime = np.array([value(a.tripTime) for a in self.agents], dtype=float)
+        self.tripped = np.array([a.tripped for a in self.agents], dtype=bool)
+        self.open = np.array([a.open for a in self.agents], dtype=bool)
+        self.trip = np.array([a.trip == 1 for a in self.agents], dtype=bool)
+        # relays without a trip signal yet, written at the next getAction
+        self.unset = np.array([a.trip is None for a in self.agents], dtype=bool)
+
+    def snapshot_rows(self):
+        case = self.env.case
+        if self.rowsOf is not case.snapIseq:
+            self.rows = np.array([case.elmtSeqSlice['line.' + l].start for l in self.lines], dtype=int)
+            self.rowsOf = case.snapIseq
+        return self.rows
+
+    # positive sequence current magnitudes of all relays with their noise
+    def observe(self):
+        case = self.env.case
+        noise = 1 + NOISE * (2 * self.env.step_random()[self.idx] - 1)
+        self.state = case.snapIseq[self.snapshot_rows(), 1] * noise
+        self.time = case.engine.seconds()
+        if self.distinct:
+            self.env.recorder.record(self.channels, self.time, self.state)
+        for a, s in zip(self.agents, self.state):
+            a.state = s
+            a.time = self.time
+            if not self.distinct:
+                self.env.recorder.record(a.channel, self.time, s)
+
+    # pick up, trip when triggered for long enough, drop off below Ip
+    def getAction(self):
+        above = self.state > self.Ip
+        triggered = ~np.isnan(self.triggerTime)
+
+        # trigger the relays that pick up, with their time delays
+        new = above & ~triggered
+        if new.any():
+            bad = np.flatnonzero(new & np.isnan(self.A))
+            if len(bad) > 0:
+                raise ValueError(f'Please specify a valid Curve Type for Overcurrent relay at bus {self.agents[bad[0]].bus1}!')
+            M = self.state[new] / self.Ip[new]
+            self.triggerTime[new] = self.time
+            self.delay[new] = self.td[new] * self.A[new] / (M ** self.p[new] - 1) + self.B[new]
+
+        trip = above & triggered & (self.time - self.triggerTime >= self.delay)
+        for i in np.flatnonzero((trip != self.trip) | self.unset):
+            self.agents[i].trip = int(trip[i])
+        self.unset[:] = False
+        self.trip = trip
+        self.tripped |= trip
+        self.tripTime[trip] = self.time
+        drop = ~above & triggered
+        self.triggerTime[drop] = np.nan
+
+        for i in np.flatnonzero(new | trip | drop):
+            a = self.agents[i]
+            a.triggerTime = None if drop[i] else self.triggerTime[i]
+            a.delay = self.delay[i]
+            a.tripped = bool(self.tripped[i])
+            a.tripTime = self.tripTime[i] if self.tripped[i] else None
+
+    # open every tripping line with one engine call
+    def setAction(self):
+        idx = np.flatnonzero(self.trip)
+        if len(idx) == 0:
+            return
+        self.open[idx] = True
+        for i in idx:
+            self.agents[i].open = True
+        self.env.case.trip_elmts([self.lines[i] for i in idx])
+
+    def wake_time(self):
+        triggered = ~np.isnan(self.triggerTime)
+        w = np.where(triggered, self.triggerTime + self.delay, np.inf)
+        w[(self.state > self.Ip) != triggered] = self.time
+        w[self.open] = np.inf
+        return w.min() if len(w) > 0 else np.inf
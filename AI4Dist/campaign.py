@@ -0,0 +1,155 @@
+import os, glob, json, hashlib, math
+import multiprocessing as mp
+import numpy as np
+import pandas as pd
+
+
+# environment of a campaign worker process
+WORKER = {}
+
+
+# build the environment of a worker once
+def campaign_init(env_fn, seed):
+    WORKER['env'] = env_fn()
+    WORKER['seed'] = seed
+
+
+# draw a scenario from its number, the same seed and number always give the
+# same hour and fault, no matter how the campaign is sharded
+def draw_scenario(e, seed, sid):
+    np.random.seed([seed, sid])
+    hourNum = np.random.choice(e.commonIndex.size)
+    flt = e.case.random_fault()
+    return hourNum, flt
+
+
+# simulate one fault scenario until the end of the dynamic event
+def run_scenario(e, hourNum, flt):
+    e.reset('fixed', hourNum, flt)
+    done = 0
+    while not done:
+        _, _, done, _ = e.step()
+
+    # trip time of every relay, NaN if it did not trip
+    trips = []
+    for a in e.dynamicAgentIdx:
+        t = getattr(e.agents[a], 'tripTime', None)
+        trips.append(np.nan if t is None else t)
+
+    return trips
+
+
+# column names of the relay trip times
+def trip_columns(e):
+    cols = []
+    for i, a in enumerate(e.dynamicAgentIdx):
+        line = getattr(e.agents[a], 'line', None)
+        cols.append(f'trip_{line}' if line is not None else f'trip_{i}')
+    return cols
+
+
+# run a chunk of scenarios in a worker, returns the results as columns
+def run_chunk(task):
+    k, start, stop, specs = task
+    e = WORKER['env']
+    tripCols = trip_columns(e)
+    rows = {c: [] for c in ['scenario', 'hour', 'bus', 'type', 'phases', 'R', 'onset'] + tripCols}
+    for i, sid in enumerate(range(start, stop)):
+        if specs is None:
+            hourNum, flt = draw_scenario(e, WORKER['seed'], sid)
+        else:
+            np.random.seed([WORKER['seed'], sid])
+            hourNum = specs[i]['hour']
+            flt = e.case.make_fault(specs[i])
+        trips = run_scenario(e, hourNum, flt)
+
+        rows['scenario'].append(sid)
+        rows['hour'].append(hourNum)
+        rows['bus'].append(flt.bus)
+        rows['type'].append(str(flt.type))
+        rows['phases'].append('.'.join(flt.get_spec()['phases']))
+        rows['R'].append(flt.R)
+        rows['onset'].append(flt.T)
+        for c, t in zip(tripCols, trips):
+            rows[c].append(t)
+
+    cols = {c: np.array(v) for c, v in rows.items()}
+    cols['hour'] = cols['hour'].astype(np.int64)
+    trips = np.stack([cols[c] for c in tripCols], axis=1).astype(float) if tripCols else np.full((stop - start, 1), np.nan)
+    # first relay trip clears the fault
+    cols['clear_time'] = np.min(np.where(np.isnan(trips), np.inf, trips), axis=1) - cols['onset']
+    cols['missed'] = np.isnan(trips).all(axis=1)
+    cols['clear_time'][cols['missed']] = np.nan
+
+    return k, cols
+
+
+# Monte Carlo fault campaign
+# env_fn: picklable function (defined at module level) that builds the env
+#         with its relay agents, every worker builds its own
+# out_path: folder of the results, one part-<chunk>.npz of columns per chunk of
+#           scenarios, written as soon as the chunk finishes. Chunks already in
+#           the folder are skipped, so an interrupted campaign can be resumed
+#           with the same settings, other settings raise unless overwrite
+# scenarioNum: number of random scenarios (bus, phases, R, onset, hour), or
+# specs: list of given scenarios {'hour', 'bus', 'type', 'phases', 'R', 'T'}
+# overwrite: delete the results of a campaign with other settings in out_path
+def run_campaign(env_fn, out_path, scenarioNum=None, specs=None, seed=0, workers=None,
+                 chunk=64, start_method='spawn', overwrite=False):
+    if specs is not None:
+        scenarioNum = len(specs)
+    if scenarioNum is None:
+        raise ValueError(f'Please give the number of scenarios or the scenario specs!')
+    os.makedirs(out_path, exist_ok=True)
+
+    # the parts in the folder must come from the same campaign
+    meta = {'scenarioNum': scenarioNum, 'seed': seed, 'chunk': chunk, 'given': specs is not None,
+            'specs': None if specs is None else hashlib.sha1(json.dumps(specs, sort_keys=True, default=str).encode()).hexdigest()}
+    metaPath = os.path.join(out_path, 'meta.json')
+    parts = glob.glob(os.path.join(out_path, 'part-*.npz'))
+    if len(parts) > 0:
+        old = None
+        if os.path.isfile(metaPath):
+            with open(metaPath) as fh:
+                old = json.load(fh)
+        if old != meta:
+            if not overwrite:
+                raise ValueError(f'{out_path} holds the results of a campaign with other settings {old}, use overwrite=True to replace them!')
+            for fp in parts:
+                os.remove(fp)
+    with open(metaPath, 'w') as fh:
+        json.dump(meta, fh, indent=1)
+
+    # chunks still to run
+    tasks = []
+    for k, start in enumerate(range(0, scenarioNum, chunk)):
+        stop = min(start + chunk, scenarioNum)
+        if not os.path.isfile(os.path.join(out_path, f'part-{k:06d}.npz')):
+            tasks.append((k, start, stop, None if specs is None else specs[start:stop]))
+
+    ctx = mp.get_context(start_method)
+    with ctx.Pool(workers, initializer=campaign_init, initargs=(env_fn, seed)) as pool:
+        for k, cols in pool.imap_unordered(run_chunk, tasks):
+            tmp = os.path.join(out_path, f'part-{k:06d}.tmp.npz')
+            np.savez(tmp, **cols)
+            os.replace(tmp, os.path.join(out_path, f'part-{k:06d}.npz'))
+
+    return out_path
+
+
+# load the results of a campaign into a DataFrame, one row per scenario
+# only the parts of the campaign in meta.json are read
+def read_campaign(out_path):
+    with open(os.path.join(out_path, 'meta.json')) as fh:
+        meta = json.load(fh)
+    partNum = math.ceil(meta['scenarioNum'] / meta['chunk'])
+    parts = sorted(glob.glob(os.path.join(out_path, 'part-*[0-9].npz')))
+    frames = []
+    for fp in parts:
+        if int(os.path.basename(fp)[5:-4]) >= partNum:
+            continue
+        with np.load(fp) as data:
+            frames.append(pd.DataFrame({c: data[c] for c in data.files}))
+    if len(frames) == 0:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True).sort_values('scenario').reset_index(drop=True)
@@ -0,0 +1,63 @@
+import os, re, hashlib, pickle
+
+
+# bump when the cached fields or the way they are derived change
+CACHE_VERSION = 3
+
+# DSS commands and properties that pull in other files
+FILE_REFS = re.compile(r'^\s*(?:redirect|compile|buscoords)\s+\[?([^\]\s!]+)|\bfile\s*=\s*\[?([^\]\s)!]+)', re.IGNORECASE | re.MULTILINE)
+
+
+# content hash of a .dss file and every file it references (redirects, bus
+# coordinates, files of loadshapes, ...), recursively
+def case_hash(case_path, h=None, seen=None):
+    if h is None:
+        h = hashlib.sha1()
+        seen = set()
+    case_path = os.path.abspath(case_path)
+    if case_path in seen or not os.path.isfile(case_path):
+        return h
+    seen.add(case_path)
+
+    with open(case_path, 'rb') as fh:
+        content = fh.read()
+    h.update(os.path.basename(case_path).lower().encode())
+    h.update(content)
+
+    folder = os.path.dirname(case_path)
+    for m in FILE_REFS.finditer(content.decode(errors='ignore')):
+        ref = (m.group(1) or m.group(2)).strip('"\'').replace('\\', '/')
+        case_hash(os.path.join(folder, ref), h, seen)
+
+    return h
+
+
+# cache key of a case for an engine
+def case_key(case_path, engine):
+    h = case_hash(case_path)
+    h.update(f'{type(engine).__name__}-{CACHE_VERSION}'.encode())
+    return h.hexdigest()
+
+
+# cached metadata of a case, None if not cached yet
+def load_case_meta(cache_dir, key):
+    fp = os.path.join(cache_dir, f'{key}.pkl')
+    if not os.path.isfile(fp):
+        return None
+    try:
+        with open(fp, 'rb') as fh:
+            return pickle.load(fh)
+    except Exception:
+        print(f'Warning: case cache {fp} cannot be read, parsing the case again!')
+        return None
+
+
+# store the metadata of a case, written atomically since many workers may
+# start on the same case
+def save_case_meta(cache_dir, key, meta):
+    os.makedirs(cache_dir, exist_ok=True)
+    fp = os.path.join(cache_dir, f'{key}.pkl')
+    tmp = fp + f'.tmp{os.getpid()}'
+    with open(tmp, 'wb') as fh:
+        pickle.dump(meta, fh, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, fp)
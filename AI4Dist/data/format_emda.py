@@ -1,47 +1,143 @@
+import os, glob, time, argparse
 import numpy as np
 import pandas as pd
-from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from ..profile_store import write_store
+from ..utils import hourly_series
 
 
-iso = 'spp'
-city = 'south'
+# convert the COVID-EMDA data release (https://github.com/tamu-engineering-research/COVID-EMDA)
+# into load/pv/wind profiles of every ISO and city
+# layout of the release: <release>/<iso>/<iso>_<city>_load.csv with a row per day
+# and a column per hour, and <iso>/<iso>_rto_genmix.csv with a row per day and fuel
+# usage: python -m AI4Dist.data.format_emda <release> [out] [--store <folder>]
 
-load_path = rf"C:\Users\Dongqi Wu\OneDrive\Work\Finished\LAADS\EMDA\COVID-EMDA\data_release\{iso}\{iso}_{city}_load.csv"
-genmix_path = rf"C:\Users\Dongqi Wu\OneDrive\Work\Finished\LAADS\EMDA\COVID-EMDA\data_release\{iso}\{iso}_rto_genmix.csv"
 
-date_range = pd.date_range(datetime(2017, 1, 1), datetime(2020, 12, 31))
-    
+# output folders of the profiles by kind, as in the repository
+PROFILE_FOLDERS = {'load': 'load_profile', 'pv': 'PV_profile', 'wind': 'wind_profile'}
 
-df_load = pd.read_csv(load_path, index_col='date', parse_dates=True)
-df_genmix = pd.read_csv(genmix_path, index_col='date', parse_dates=True)
+# genmix fuels of the renewable profiles
+GENMIX_FUELS = {'pv': 'solar', 'wind': 'wind'}
 
-df_genmix = pd.read_csv(genmix_path, index_col='date', parse_dates=True)
-df_genmix = df_genmix.loc[df_genmix.index.isin(date_range)]
-df_genmix = df_genmix.set_index([df_genmix.index, 'fuel'])
-df_genmix = pd.DataFrame({'value': df_genmix.stack()}).reset_index(1)
-df_genmix.index = pd.to_datetime(
-        df_genmix.index.get_level_values(0).strftime('%Y-%m-%d ') + df_genmix.index.get_level_values(1))
-df_genmix.index.name = 'date_time'
+# days converted by default
+START_DATE = '2017-01-01'
+END_DATE = '2020-12-31'
 
 
-df_load = df_load.loc[df_load.index.isin(date_range)]
-df_load = pd.DataFrame({'load': df_load.stack()})
-df_load.index = pd.to_datetime(
-df_load.index.get_level_values(0).strftime('%Y-%m-%d ') + df_load.index.get_level_values(1))
-df_load.index.name = 'date_time'
-df_load = df_load.rename(columns={'load':'value'})
+# scale a profile to [0, 1]
+def min_max(s):
+    return (s - s.min()) / (s.max() - s.min())
 
-df_pv = df_genmix.loc[df_genmix['fuel']=='solar']
-df_pv = df_pv.drop(columns='fuel')
-df_wind = df_genmix.loc[df_genmix['fuel']=='wind']
-df_wind = df_wind.drop(columns='fuel')
 
+# load profile of a city csv
+def load_profile(path, start=START_DATE, end=END_DATE):
+    return min_max(hourly_series(pd.read_csv(path), start, end))
 
-df_load = (df_load-df_load.min())/(df_load.max()-df_load.min())
-df_pv = (df_pv-df_pv.min())/(df_pv.max()-df_pv.min())
-df_wind = (df_wind-df_wind.min())/(df_wind.max()-df_wind.min())
 
+# pv and wind profiles of an ISO genmix csv, read once for both
+# a fuel missing in the genmix gives an empty profile
+def genmix_profiles(path, start=START_DATE, end=END_DATE):
+    df = pd.read_csv(path)
+    return {kind: min_max(hourly_series(df[df['fuel'] == fuel], start, end)) for kind, fuel in GENMIX_FUELS.items()}
 
-df_load.to_csv(rf'load_profile\{iso}_{city}_load.csv')
-df_pv.to_csv(rf'pv_profile\{iso}_{city}_pv.csv')
-df_wind.to_csv(rf'wind_profile\{iso}_{city}_wind.csv')
+
+# csv path of a profile
+def profile_path(out, kind, name):
+    return os.path.join(out, PROFILE_FOLDERS[kind], f'{name}_{kind}.csv')
+
+
+# a profile in the csv layout of the repository, timestamps are formatted
+# by numpy at once instead of strftime per row
+def profile_csv(s):
+    stamps = np.datetime_as_string(s.index.to_numpy(dtype='datetime64[s]'), unit='s')
+    rows = [f'{t[:10]} {t[11:]},{v!r}' for t, v in zip(stamps.tolist(), s.to_numpy(dtype=float).tolist())]
+    return '\n'.join(['date_time,value'] + rows) + '\n'
+
+
+def write_profile(text, fp):
+    os.makedirs(os.path.dirname(fp), exist_ok=True)
+    with open(fp, 'w') as fh:
+        fh.write(text)
+
+
+# convert the loads of the cities of an ISO and its genmix (read once),
+# runs in a worker process
+# returns {profile name: (timestamps in ns, values, csv path)} for the store
+def convert_iso(release, out, iso, cities, start=START_DATE, end=END_DATE):
+    profiles = {}
+    for city in cities:
+        profiles[(city, 'load')] = load_profile(os.path.join(release, iso, f'{iso}_{city}_load.csv'), start, end)
+
+    # every city of an ISO gets the renewable profiles of the ISO
+    genmix = os.path.join(release, iso, f'{iso}_rto_genmix.csv')
+    if os.path.isfile(genmix):
+        for kind, s in genmix_profiles(genmix, start, end).items():
+            for city in cities:
+                profiles[(city, kind)] = s
+    else:
+        print(f'Warning: no genmix for {iso}, its cities have no pv and wind profiles')
+
+    res = {}
+    texts = {}
+    for (city, kind), s in profiles.items():
+        fp = profile_path(out, kind, f'{iso}_{city}')
+        if id(s) not in texts:
+            texts[id(s)] = profile_csv(s)
+        write_profile(texts[id(s)], fp)
+        res[f'{iso}_{city}_{kind}'] = (s.index.to_numpy(dtype='datetime64[ns]').astype(np.int64), s.to_numpy(), fp)
+    return res
+
+
+# ISO and city of every load csv of the release
+def find_cities(release, isos=None, rto=False):
+    cities = []
+    for fp in sorted(glob.glob(os.path.join(release, '*', '*_load.csv'))):
+        iso = os.path.basename(os.path.dirname(fp))
+        name = os.path.basename(fp)[:-len('_load.csv')]
+        if not name.startswith(iso + '_') or (isos is not None and iso not in isos):
+            continue
+        city = name[len(iso) + 1:]
+        if city == 'rto' and not rto:
+            continue
+        cities.append((iso, city))
+    return cities
+
+
+# convert every ISO/city of the release in parallel, write the csv profiles
+# under out and, if store is given, also a compiled profile store (see
+# profile_store) from the converted series without reading the csv files again
+def convert_release(release, out, store=None, isos=None, rto=False, workers=None, start=START_DATE, end=END_DATE):
+    cities = find_cities(release, isos, rto)
+    if len(cities) == 0:
+        raise ValueError(f'No <iso>/<iso>_<city>_load.csv files in {release}!')
+    byIso = {}
+    for iso, city in cities:
+        byIso.setdefault(iso, []).append(city)
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        jobs = [pool.submit(convert_iso, release, out, iso, c, start, end) for iso, c in byIso.items()]
+        for j in jobs:
+            results.update(j.result())
+
+    if store is not None:
+        write_store(store, {n: pd.Series(v, index=idx) for n, (idx, v, _) in results.items()},
+                    {n: fp for n, (_, _, fp) in results.items()})
+    return sorted(fp for _, _, fp in results.values())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert the COVID-EMDA data release into load/pv/wind profiles')
+    parser.add_argument('release', help='data_release folder of COVID-EMDA')
+    parser.add_argument('out', nargs='?', default='profiles', help='output folder of the *_profile folders')
+    parser.add_argument('--store', default=None, help='also write a compiled profile store to this folder')
+    parser.add_argument('--iso', nargs='*', default=None, help='only these ISOs')
+    parser.add_argument('--rto', action='store_true', help='also convert the ISO wide (rto) loads')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('--start', default=START_DATE, help='first day')
+    parser.add_argument('--end', default=END_DATE, help='last day')
+    args = parser.parse_args()
+
+    t = time.perf_counter()
+    files = convert_release(args.release, args.out, args.store, args.iso, args.rto, args.workers, args.start, args.end)
+    print(f'{len(files)} profiles written in {time.perf_counter() - t:.1f} s')
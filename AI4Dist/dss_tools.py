@@ -1,113 +1,330 @@
-import win32com.client
 import networkx as nx
 import matplotlib.pyplot as plt
+import matplotlib.colors as mcolors
 import csv
 import numpy as np
 import pandas as pd
 import random
+import copy
 from .utils import *
+from .engine.engine_template import engine as dssEngine
+from .case_cache import case_key, load_case_meta, save_case_meta
+from .gen_table import genTable, genFrame, GEN_FIELDS
+from .instrument import get_stats
+from .topology import topoIndex
+from .registry import elementRegistry
+from .sensitivity import voltSensitivity
+from .render import feederMap, case_layout, NODE_COLOR, NODE_SIZE, FAULT_COLOR, FAULT_SIZE, FUSE_COLOR, FUSE_SIZE
 from rl.core import Env
 
 
+# create the solver engine used by a dssCase
+# 'com': OpenDSS COM server (Windows only)
+# 'direct': in-process DSS C-API through OpenDSSDirect.py (any platform)
+# 'nosolve': stand-in for profiling, 'direct' without the solver
+# 'synthetic': stand-in without OpenDSS, plausible values from a captured
+#              topology of the case, see engine.synthetic_engine
+# an engine object can also be passed directly, e.g. a RecordEngine or a
+# ReplayEngine of engine.replay_engine
+def get_engine(kind='com'):
+    if isinstance(kind, dssEngine):
+        return kind
+    elif kind == 'com':
+        from .engine.com_engine import COMEngine
+        return COMEngine()
+    elif kind == 'direct':
+        from .engine.direct_engine import DirectEngine
+        return DirectEngine()
+    elif kind == 'nosolve':
+        from .engine.nosolve_engine import NoSolveEngine
+        return NoSolveEngine()
+    elif kind == 'synthetic':
+        from .engine.synthetic_engine import SyntheticEngine
+        return SyntheticEngine()
+    else:
+        raise ValueError(f'Solver engine {kind} is not supported!')
+
+
+# setpoints saved by a checkpoint, read and written through the engine collections
+CHECKPOINT_PROPS = {'loads': ['kW', 'kvar'], 'generators': ['kW', 'kvar', 'kV'],
+                    'pvsystems': ['kVArated', 'pf']}
+
+
+# element classes with their own dynamics, a circuit with any of them changes
+# at every dynamic step
+MACHINE_CLASSES = ['generator', 'pvsystem', 'storage', 'indmach012', 'vsconverter', 'upfc']
+# control classes without a fixed delay before their actions (e.g. fuse curves)
+INSTANT_CONTROL_CLASSES = ['fuse', 'relay', 'recloser', 'swtcontrol', 'invcontrol', 'expcontrol',
+                           'storagecontroller', 'gendispatcher', 'upfccontrol', 'espvlcontrol']
+
+# rating (kVA) given to a pv system dispatched at 0
+PV_MIN_KVA = 1e-3
+# power (kW) given to a generator dispatched at (almost) 0, the dynamic machine
+# model of a generator without power does not converge. Absorbing (negative)
+# dispatch is passed on as it is
+GEN_MIN_KW = 1e-3
+
+# case metadata kept in the on-disk cache, see case_cache
+CACHE_FIELDS = ['groundPath', 'busNames', 'busNum', 'busPhases', 'lineNames', 'lineNum', 'lineT',
+                'xfmrName', 'xfmrNum', 'xfmrT', 'genNum', 'pvNum', 'genTable',
+                'loadNames', 'loadNum', 'loadP', 'loadQ', 'graph', 'edge_order',
+                'nodeNum', 'busNodeSlice', 'vllI', 'vllJ', 'busVLLSlice', 'busSeqRow', 'vSeqIdx',
+                'vSeqBase', 'pdNames', 'elmtSlice', 'elmtCond', 'elmtSeqSlice', 'condNum', 'iSeqIdx', 'registry']
+
+
+# DSS command defining an hourly loadshape
+def loadshape_cmd(name, mult):
+    mult = np.asarray(mult, dtype=float).tolist()
+    return f'New Loadshape.{name} npts={len(mult)} interval=1 mult=({" ".join(repr(m) for m in mult)})'
+
+
 # load a DSS case into the dssCase object
 # The dssCase object provide a easy interface with OpenDSS and
 # utility functions
+# cache_dir: folder of the on-disk metadata cache, the network info is parsed
+#            once per case content and engine and read back afterwards
+# stats: runStats counting the engine calls, see instrument.get_stats
 class dssCase():
-    def __init__(self, case_path, ts):
+    def __init__(self, case_path, ts, engine='com', cache_dir=None, stats=None):
         # initialize DSS interface objects
-        self.dss_handle = win32com.client.Dispatch("OpenDSSEngine.DSS")
-        self.txt = self.dss_handle.Text
-        self.ckt = self.dss_handle.ActiveCircuit
-        self.sol = self.ckt.Solution
-        self.ActElmt = self.ckt.ActiveCktElement
-        self.ActBus = self.ckt.ActiveBus
+        self.stats = stats if stats is not None else get_stats()
+        self.engine = self.stats.count_engine(get_engine(engine))
         
         # load the case passed through argument
         self.case_path = case_path
-        self.load_case()
-        self.solve_case()
-        self.check_grounding()
-
-        # examine the network info of the DSS case and create a graph
-        self.get_network_info()
-        self.create_graph()
-        self.sort_edges()
-        self.clrDict =[ 'sandybrown' for _ in range(self.graph.number_of_nodes()) ]
+        with self.stats.phase('load_case'):
+            self.load_case()
+            self.solve_case()
+
+        meta = None
+        if cache_dir is not None:
+            key = case_key(case_path, self.engine)
+            meta = load_case_meta(cache_dir, key)
+
+        if meta is None:
+            self.check_grounding()
+
+            # examine the network info of the DSS case and create a graph
+            self.get_network_info()
+            self.build_snapshot()
+            self.create_graph()
+            self.sort_edges()
+
+            if cache_dir is not None:
+                save_case_meta(cache_dir, key, {f: getattr(self, f) for f in CACHE_FIELDS})
+        else:
+            self.__dict__.update(meta)
+            self.alloc_snapshot()
+        # parent, depth, children and Euler tour of the radial tree, see topology
+        self.topo = topoIndex(self.busNum, self.lineT, self.xfmrT)
+        # demand currently set on the loads, kept by scale_loads and rollback
+        self.loadKW = self.loadP.copy()
+        self.loadKvar = self.loadQ.copy()
+        # colors and sizes of the buses on the feeder map, by bus id
+        self.clrDict = np.full(self.busNum, NODE_COLOR, dtype=object)
         self.edgeClrDict = [ 'grey' for _ in range(self.graph.number_of_edges()) ]
         self.sizeDict = np.ones(self.busNum) * 20
+        # feeder maps with their artists, built on the first draw_graph, see render
+        self.maps = {}
+        self.fuseBuses = None
 
         # simulation information
         self.ts = ts
 
+        # lines opened by trip_elmt and edits made by edit_elmt, undone by rollback
+        self.openElmts = set()
+        self.editLog = []
+        # number of changes made to the network through trips and edits
+        self.changeCount = 0
+        # for skipping steps in solve_steps: time of the last solution seen with
+        # an empty control queue, and the shortest delay of the controls
+        self.queueClearTime = None
+        self.quietDelay = None
+        # voltage sensitivities predicting small steady state changes, see use_sensitivity
+        self.sensitivity = None
+
     # clean DSS memory    
     def reset_dss(self):
-        self.dss_handle.ClearAll()
+        self.engine.clear()
 
     # load a local case from the case file
     def load_case(self):
-        self.txt.Command = f"compile [{self.case_path}]"
+        self.engine.command(f"compile [{self.case_path}]")
 
     # solve the current loaded case
     def solve_case(self):
-        self.sol.Solve()
+        self.engine.solve()
+
+    # predict the steady state solutions after small generator setpoint changes
+    # from cached voltage sensitivities, see sensitivity.voltSensitivity
+    def use_sensitivity(self, **kwargs):
+        self.sensitivity = voltSensitivity(self, **kwargs)
+
+    # solve k time steps of the dynamic mode in one call
+    # without machines the circuit only changes through control actions, which
+    # run at the earliest quiet_delay() after the control queue was last seen
+    # empty. Steps before that are skipped by moving the time forward
+    def solve_steps(self, k):
+        t = self.engine.seconds()
+        if self.engine.control_queue_size() == 0:
+            self.queueClearTime = t
+
+        skip = 0
+        if self.queueClearTime is not None:
+            horizon = self.queueClearTime + self.quiet_delay()
+            skip = int(min(k - 1, np.floor((horizon - t) / self.ts) - 1))
+        if skip > 0:
+            self.engine.command(f'set sec={t + skip * self.ts}')
+
+        if k - skip > 1:
+            self.engine.command(f'set number={k - skip}')
+            self.engine.solve()
+            self.engine.command('set number=1')
+        else:
+            self.engine.solve()
+
+    # shortest time in which the circuit can change by itself after the control
+    # queue was empty: 0 with machines or controls acting without a fixed delay,
+    # else the shortest delay of the regulator and capacitor controls
+    def quiet_delay(self):
+        if self.quietDelay is None:
+            delays = [np.inf]
+            for n in self.engine.element_names():
+                cls = n.split('.')[0].lower()
+                if cls in MACHINE_CLASSES or cls in INSTANT_CONTROL_CLASSES:
+                    delays.append(0)
+                elif cls == 'regcontrol':
+                    delays.append(float(self.engine.get_property(n, 'delay')))
+                elif cls == 'capcontrol':
+                    delays.append(float(self.engine.get_property(n, 'delay')))
+                    delays.append(float(self.engine.get_property(n, 'delayoff')))
+            self.quietDelay = min(delays)
+        return self.quietDelay
+
+    ## QSTS
+    # engine-native loadshapes of an hourly profile window, loads and renewable
+    # generators follow them in the yearly mode (snap and dynamics ignore them)
+    # loadMult: (hours,) or (hours x loads) multipliers of the nominal demand
+    # pvMult, windMult: (hours,) share of the rated power of pv and wind generators
+    def set_loadshapes(self, loadMult, pvMult=None, windMult=None):
+        self.scale_loads(1.0)
+        loadMult = np.asarray(loadMult, dtype=float)
+        if loadMult.ndim == 1:
+            self.engine.command(loadshape_cmd('ai4dist_load', loadMult))
+            self.engine.command('batchedit load..* yearly=ai4dist_load')
+        else:
+            for i, n in enumerate(self.loadNames):
+                self.engine.command(loadshape_cmd(f'ai4dist_load{i}', loadMult[:, i]))
+                self.engine.command(f'edit load.{n} yearly=ai4dist_load{i}')
+
+        # renewables produce all their available power, edits are undone by rollback
+        gens = self.genTable
+        if pvMult is not None and len(gens.fuel_rows('pv')) > 0:
+            self.engine.command(loadshape_cmd('ai4dist_pv', pvMult))
+            for i in gens.fuel_rows('pv'):
+                kva = gens.cols['kVAbase'][i]
+                name = f'pvsystem.{gens.cols["name"][i]}'
+                self.edit_elmt(name, ['Pmpp', 'irradiance', 'kVA', 'pf'], [kva, 1, kva, 1])
+                self.engine.command(f'edit {name} yearly=ai4dist_pv')
+        if windMult is not None and len(gens.fuel_rows('wind')) > 0:
+            self.engine.command(loadshape_cmd('ai4dist_wind', windMult))
+            for i in gens.fuel_rows('wind'):
+                name = f'generator.{gens.cols["name"][i]}'
+                self.edit_elmt(name, ['kW'], [gens.cols['kVAbase'][i]])
+                self.engine.command(f'edit {name} yearly=ai4dist_wind')
+
+    # start the yearly mode at the first hour of the loadshapes
+    def start_qsts(self):
+        self.engine.clear_control_queue()
+        self.engine.command('reset monitors')
+        self.engine.command('set mode=yearly hour=0 sec=0 stepsize=1h number=1')
+
+    # solve the next k hours in one call
+    def solve_qsts(self, k):
+        self.engine.command(f'set number={k}')
+        self.engine.solve()
+
+    # monitor of an element recording every QSTS hour, returns its name
+    # mode: DSS monitor mode, 0 voltages and currents, 1 powers
+    def add_monitor(self, elmt, mode=0):
+        name = 'ai4dist_' + elmt.replace('.', '_').lower()
+        self.engine.command(f'New Monitor.{name} element={elmt} terminal=1 mode={mode} ppolar=no enabled=yes')
+        return name
+
+    # samples of a monitor, DataFrame with a column per channel
+    def read_monitor(self, name):
+        channels, data = self.engine.monitor_data(name)
+        return pd.DataFrame(data, columns=channels)
 
     # process case and get network informations
+    # every element is interned in self.registry, see registry.elementRegistry
     def get_network_info(self):
+        self.registry = elementRegistry()
         # list of bus names
-        self.busNames = self.ckt.AllBusNames
+        self.busNames = self.engine.bus_names()
         self.busNum = len(self.busNames)
         # list of phases for each bus
         self.busPhases = []
         for n in self.busNames:
-            self.ckt.SetActiveBus(n)
-            self.busPhases.append(self.ActBus.Nodes)
+            self.engine.set_active_bus(n)
+            self.busPhases.append(self.engine.bus_nodes())
+        self.registry.add_buses(self.busNames, self.busPhases)
 
         # list of lines
-        self.lineNames = self.ckt.Lines.AllNames
-        self.lineNum = self.ckt.Lines.Count
+        self.lineNames = self.engine.names('lines')
+        self.lineNum = self.engine.count('lines')
 
+        busIdx = self.registry.ids['bus']
         self.lineT = []
+        linePairs = []
         for n in self.lineNames:
             full_name = 'line.' + n
-            self.ckt.SetActiveElement(full_name)
-            F = self.ActElmt.Properties('Bus1').val.split('.')[0]
-            T = self.ActElmt.Properties('Bus2').val.split('.')[0]
+            self.engine.set_active_element(full_name)
+            buses = self.engine.elmt_bus_names()
+            F = buses[0].split('.')[0].lower()
+            T = buses[1].split('.')[0].lower()
             
             # take only the 3-phase bus name
             try:
-                self.lineT.append((self.busNames.index(F),self.busNames.index(T)))
+                self.lineT.append((busIdx[F], busIdx[T]))
+                linePairs.append(self.lineT[-1])
             except Exception:
                 print("Inconsistency in Bus/Line declearation!")
+                linePairs.append((-1, -1))
+        self.registry.add_lines(self.lineNames, linePairs)
             
         # add transformers as lines (for graph making purpose)
-        self.xfmrName = self.ckt.Transformers.AllNames
-        self.xfmrNum = self.ckt.Transformers.Count
+        self.xfmrName = self.engine.names('transformers')
+        self.xfmrNum = self.engine.count('transformers')
+        self.registry.add('transformer', self.xfmrName)
         self.xfmrT = []
         for tr in self.xfmrName:
             full_name = 'Transformer.' + tr
-            self.ckt.SetActiveElement(full_name)
-            F = self.busNames.index(self.ActElmt.busNames[0].split('.')[0])
-            T = self.busNames.index(self.ActElmt.busNames[1].split('.')[0])
+            self.engine.set_active_element(full_name)
+            buses = self.engine.elmt_bus_names()
+            F = busIdx[buses[0].split('.')[0].lower()]
+            T = busIdx[buses[1].split('.')[0].lower()]
 
             self.xfmrT.append((F,T))
         self.xfmrT = list(set(self.xfmrT))
 
-        # check generators
+        # check generators and loads
         self.parse_generators()
+        self.parse_loads()
 
     # check and store existing generators in the system
     def parse_generators(self):
         # containers
-        genFields = ["name", "fuel", "bus", "Pg", "Qg", "Vg", "kVAbase", "Pmin", "Pmax", "Qmin", "Qmax", "Pcost"]
-        genDict = {key: [] for key in genFields}
+        genDict = {key: [] for key in GEN_FIELDS}
 
         # source as inf bus, DSS only allow one Vsource now?
-        self.ckt.Vsources.First
-        self.ckt.SetActiveElement(f'vsource.{self.ckt.Vsources.Name}')
-        genDict['name'].append(self.ckt.Vsources.Name)
-        genDict['Vg'].append(self.ckt.Vsources.pu)
+        self.engine.first('vsources')
+        srcName = self.engine.get('vsources', 'Name')
+        self.engine.set_active_element(f'vsource.{srcName}')
+        genDict['name'].append(srcName)
+        genDict['Vg'].append(self.engine.get('vsources', 'pu'))
         genDict['fuel'].append('source')
-        genDict['bus'].append(self.ckt.ActiveCktElement.BusNames[1])
+        genDict['bus'].append(self.engine.elmt_bus_names()[1])
         genDict['kVAbase'].append(1e9)
         genDict['Pmin'].append(-1e9)
         genDict['Pmax'].append(1e9)
@@ -118,77 +335,124 @@ class dssCase():
         genDict['Pcost'].append(0)
         
         # rotational
-        gens = self.ckt.Generators
-        self.genNum = gens.Count
-        gens.First
+        self.genNum = self.engine.count('generators')
+        self.engine.first('generators')
         for i in range(self.genNum):
-            self.ckt.SetActiveElement(f'generator.{gens.Name}')
-            genDict['name'].append(gens.Name)
-            genDict['Vg'].append(gens.kV)
+            genName = self.engine.get('generators', 'Name')
+            self.engine.set_active_element(f'generator.{genName}')
+            genDict['name'].append(genName)
+            genDict['Vg'].append(self.engine.get('generators', 'kV'))
             genDict['fuel'].append('default')
-            genDict['bus'].append(self.ckt.ActiveCktElement.BusNames[0])
-            genDict['kVAbase'].append(gens.kVArated)
+            genDict['bus'].append(self.engine.elmt_bus_names()[0])
+            genDict['kVAbase'].append(self.engine.get('generators', 'kVArated'))
             genDict['Pmin'].append(-1e9)
             genDict['Pmax'].append(1e9)
             genDict['Qmin'].append(-1e9)
             genDict['Qmax'].append(1e9)
-            genDict['Pg'].append(gens.kW)
-            genDict['Qg'].append(gens.kvar)
+            genDict['Pg'].append(self.engine.get('generators', 'kW'))
+            genDict['Qg'].append(self.engine.get('generators', 'kvar'))
             genDict['Pcost'].append(0)
-            gens.Next
+            self.engine.next('generators')
 
         # pv generators
-        pvs = self.ckt.PVSystems
-        self.pvNum = pvs.Count
-        pvs.First
+        self.pvNum = self.engine.count('pvsystems')
+        self.engine.first('pvsystems')
         for i in range(self.pvNum):
-            self.ckt.SetActiveElement(f'pvsystem.{pvs.Name}')
-            genDict['name'].append(pvs.Name)
-            genDict['Vg'].append(self.ckt.ActiveCktElement.SeqVoltages[1])
+            pvName = self.engine.get('pvsystems', 'Name')
+            self.engine.set_active_element(f'pvsystem.{pvName}')
+            genDict['name'].append(pvName)
+            genDict['Vg'].append(self.engine.elmt_seq_voltages()[1])
             genDict['fuel'].append('pv')
-            genDict['bus'].append(self.ckt.ActiveCktElement.BusNames[0])
-            genDict['kVAbase'].append(pvs.kVArated)
+            genDict['bus'].append(self.engine.elmt_bus_names()[0])
+            genDict['kVAbase'].append(self.engine.get('pvsystems', 'kVArated'))
             genDict['Pmin'].append(-1e9)
             genDict['Pmax'].append(1e9)
             genDict['Qmin'].append(-1e9)
             genDict['Qmax'].append(1e9)
-            genDict['Pg'].append(pvs.kW)
-            genDict['Qg'].append(pvs.kvar)
+            genDict['Pg'].append(self.engine.get('pvsystems', 'kW'))
+            genDict['Qg'].append(self.engine.get('pvsystems', 'kvar'))
             genDict['Pcost'].append(0)
-            pvs.Next
+            self.engine.next('pvsystems')
         
-        self.genDF = pd.DataFrame.from_dict(genDict)
+        self.genTable = genTable(genDict)
+        # generators and pv systems share the generator ids, in genTable order
+        self.registry.add('generator', genDict['name'])
+
+    # DataFrame-like view of the generator table, writes go to the table and
+    # are pushed by the next sync_gen_df. genDF.to_frame() for a pandas copy
+    @property
+    def genDF(self):
+        return genFrame(self.genTable)
+
+    # cache the nominal demand of every load, profiles are applied to these baselines
+    def parse_loads(self):
+        self.loadNames = self.engine.names('loads')
+        self.loadNum = len(self.loadNames)
+        self.registry.add('load', self.loadNames)
+        self.loadP = np.array(self.engine.get_all('loads', 'kW'), dtype=float)
+        self.loadQ = np.array(self.engine.get_all('loads', 'kvar'), dtype=float)
+
+    # scale every load from its nominal demand
+    # mult: a scalar or one multiplier per load (loadNames order)
+    # push: write the demand to the engine now, otherwise at the next push_loads
+    def scale_loads(self, mult, push=True):
+        mult = np.broadcast_to(np.asarray(mult, dtype=float), (self.loadNum,))
+        self.loadKW = self.loadP * mult
+        self.loadKvar = self.loadQ * mult
+        if push:
+            self.push_loads()
+
+    # write the demand kept in loadKW/loadKvar to the engine
+    def push_loads(self):
+        self.engine.set_all('loads', 'kW', self.loadKW)
+        self.engine.set_all('loads', 'kvar', self.loadKvar)
 
     # add generator into the system
     def add_gen(self, **kwargs):
-        genFields = ["name", "fuel", "bus", "Pg", "Qg", "Vg", "kVAbase", "Pmin", "Pmax", "Qmin", "Qmax", "Pcost"]
-        newGen = {}
-        newGen = {key: 0 for key in genFields}
-        # add to gen dataframe
+        newGen = {key: 0 for key in GEN_FIELDS}
+        # add to gen table
         for k, v in kwargs.items():
             newGen[k] = v
             
-        self.genDF = self.genDF.append(newGen, ignore_index=True)
+        self.genTable.append(synced=True, **newGen)
+        self.registry.add('generator', [newGen['name']])
+        self.quietDelay = None
         # add to network model
         if newGen['fuel'] == 'pv':
             genS = np.linalg.norm([newGen["Pg"], newGen["Qg"]])
             genPF = newGen["Pg"] / genS
-            self.txt.Command = f'New pvsystem.{newGen["name"]} phase=1 bus1={newGen["bus"]} kv={newGen["Vg"]} kva={genS} pf={genPF} pctPmpp=100'
+            self.engine.command(f'New pvsystem.{newGen["name"]} phase=1 bus1={newGen["bus"]} kv={newGen["Vg"]} kva={genS} pf={genPF} %Pmpp=100')
         else:
-            self.txt.Command = f'New generator.{newGen["name"]} bus1={newGen["bus"]} kv={newGen["Vg"]} kw={newGen["Pg"]} kva={newGen["kVAbase"]} model=7 Balanced=Yes'
+            self.engine.command(f'New generator.{newGen["name"]} bus1={newGen["bus"]} kv={newGen["Vg"]} kw={newGen["Pg"]} kva={newGen["kVAbase"]} model=7 Balanced=Yes')
         
 
-    # sync data a generator DF with model
+    # push the generators changed since the last sync to the model
     def sync_gen_df(self):
-        # 1st (source) is always slack
-        for i in range(1, self.genDF.shape[0]):
-            gen = self.genDF.iloc[i]
-            if gen["fuel"] == 'pv':
-                genS = np.linalg.norm([gen["Pg"], gen["Qg"]])
-                genPF = gen["Pg"] / genS
-                self.txt.Command = f'edit pvsystem.{gen["name"]} kv={gen["Vg"]} kva={genS} pf={genPF}'
+        gens = self.genTable
+        rows = gens.dirty_rows()
+        for i in rows:
+            # source is always slack
+            if gens.cols['fuel'][i] == 'source':
+                continue
+            name = gens.cols['name'][i]
+            Pg, Qg, Vg = gens.cols['Pg'][i], gens.cols['Qg'][i], gens.cols['Vg'][i]
+            if gens.cols['fuel'][i] == 'pv':
+                # no kV in the PVSystem collection, edit it only when changed
+                if 'Vg' in gens.dirty_fields(i):
+                    self.engine.command(f'edit pvsystem.{name} kv={Vg}')
+                genS = np.linalg.norm([Pg, Qg])
+                # a pv system cannot be rated 0 kVA, an idle one keeps a tiny rating
+                genPF = Pg / genS if genS > 0 else 1
+                genS = max(genS, PV_MIN_KVA)
+                self.engine.set('pvsystems', 'Name', name)
+                self.engine.set('pvsystems', 'kVArated', genS)
+                self.engine.set('pvsystems', 'pf', genPF)
             else:
-                self.txt.Command = f'edit generator.{gen["name"]} kv={gen["Vg"]} kw={gen["Pg"]} kvar={gen["Qg"]}'
+                self.engine.set('generators', 'Name', name)
+                self.engine.set('generators', 'kV', Vg)
+                self.engine.set('generators', 'kW', GEN_MIN_KW if 0 <= Pg < GEN_MIN_KW else Pg)
+                self.engine.set('generators', 'kvar', Qg)
+        gens.mark_synced(rows)
         
         return
     
@@ -196,31 +460,13 @@ class dssCase():
     def check_grounding(self):
         self.groundPath = False
         # go through transformers, loads and capactiors
-        xfmrs = self.ckt.Transformers
-        xfmrs.First
-        for i in range(xfmrs.Count):
-            if not xfmrs.IsDelta:
-                self.groundPath = True
-                return
-            xfmrs.Next
-            
-        # capacitors
-        caps = self.ckt.Capacitors
-        caps.First
-        for i in range(caps.Count):
-            if not caps.IsDelta:
-                self.groundPath = True
-                return
-            caps.Next
-            
-        # loads
-        loads = self.ckt.Loads
-        loads.First
-        for i in range(loads.Count):
-            if not loads.IsDelta:
-                self.groundPath = True
-                return
-            loads.Next       
+        for cls in ['transformers', 'capacitors', 'loads']:
+            self.engine.first(cls)
+            for i in range(self.engine.count(cls)):
+                if not self.engine.get(cls, 'IsDelta'):
+                    self.groundPath = True
+                    return
+                self.engine.next(cls)
         
         
 
@@ -268,14 +514,23 @@ class dssCase():
 
 
     # draw the network graph using matplotlib
-    def draw_graph(self):
-        plt.figure()
+    # the map and its artists are built once, later calls only restyle them
+    # fp: render to this file without any window (headless), otherwise the map
+    #     is shown in a window refreshed in place on the next calls
+    def draw_graph(self, fp=None):
         self.mark_fuse_lines()
-        nx.draw(self.graph, pos=self.posDict, node_color=self.clrDict,\
-                edge_color=self.edgeClrDict, with_labels=False, node_size=self.sizeDict)
-        
-        plt.show()
-        
+        live = fp is None
+        if live not in self.maps:
+            self.maps[live] = feederMap(case_layout(self), live=live)
+        m = self.maps[live]
+        m.reset_style()
+        m.nodeColor[:] = mcolors.to_rgba_array(list(self.clrDict))
+        m.nodeSize[:] = self.sizeDict
+        if live:
+            m.refresh()
+            plt.show()
+        else:
+            m.save(fp)
 
     # sort nodes using DFS
     def sort_edges(self):
@@ -294,64 +549,67 @@ class dssCase():
         self.posDict = {}
         for line in allLines:
             name, x, y = line.split(delim)
-            busID = self.busNames.index(name)
+            busID = self.registry.bus(name)
             self.posDict.update({busID:[getNum(x),getNum(y)]})
+        # positions changed, the maps are laid out again
+        self.maps = {}
             
     # mark the nodes that have protection problem as red
+    # log: list of logs with a fault, or fault bus names (e.g. the 'bus'
+    # column of campaign results)
     def mark_logged_buses(self, log):
 
         # all bus where a fault is not detected
-        allBuses = [self.busNames.index(l.fault.bus) for l in log]
+        allBuses = [self.registry.bus(l if isinstance(l, str) else l.fault.bus) for l in log]
 
         # paint these buses in red
-        for n in self.graph.nodes:
-            if n in allBuses:
-                self.clrDict[n] = 'red'
-                self.sizeDict[n] = 75
-            else:
-                self.clrDict[n] = 'sandybrown'
-                self.sizeDict[n] = 10
+        marked = np.zeros(self.busNum, dtype=bool)
+        marked[allBuses] = True
+        self.clrDict = np.where(marked, FAULT_COLOR, NODE_COLOR).astype(object)
+        self.sizeDict = np.where(marked, FAULT_SIZE, NODE_SIZE)
 
-    # mark the lines with fuse as yellow
-    def mark_fuse_lines(self):
+    # buses at the end of the lines with a fuse, found once
+    def fuse_buses(self):
+        if self.fuseBuses is None:
+            # find the list of all fuses
+            fuseLines = []
+            fuseNum = self.engine.count('fuses')
+            self.engine.first('fuses')
+            for i in range(fuseNum):
+                fuseLines.append(self.engine.get('fuses', 'MonitoredObj'))
+                self.engine.next('fuses')
+
+            # find the 2nd bus of the line
+            self.fuseBuses = np.array([self.registry.lineBuses[self.registry.line(l)][1] for l in fuseLines], dtype=int)
+        return self.fuseBuses
 
-        # find the list of all fuses
-        fuseLines = []
-        fuses = self.ckt.Fuses
-        fuseNum = fuses.Count
-        fuses.First
-        for i in range(fuseNum):
-            fuseLines.append(fuses.MonitoredObj.replace('line.',''))
-            fuses.Next
-
-        # find the 2nd bus of the line
-        for line in fuseLines:
-            lineidx = self.lineNames.index(line)
-            bus2 = self.lineT[lineidx][1]
-            self.clrDict[bus2] = 'blue'
-            self.sizeDict[bus2] = 50
+    # mark the lines with fuse as blue
+    def mark_fuse_lines(self):
+        bus2 = self.fuse_buses()
+        self.clrDict[bus2] = FUSE_COLOR
+        self.sizeDict[bus2] = FUSE_SIZE
     
         
     # get line current measurement using line name
     def get_line_I(self, name, field, phase):
         full_name = 'line.' + name
-        self.ckt.SetActiveElement(full_name)
+        self.engine.set_active_element(full_name)
         if phase == 3:
             if field == 'Iseq':
-                res = self.ActElmt.SeqCurrents[0:3]
+                res = self.engine.elmt_seq_currents()[0:3]
             elif field == 'Ipuseq':
-                res = self.ActElmt.SeqCurrents[0:3]
+                res = self.engine.elmt_seq_currents()[0:3]
             elif field == 'Iph':
-                res = cart_to_pol(self.ActElmt.Currents[0:6])
+                res = cart_to_pol(self.engine.elmt_currents()[0:6])
             else:
                 raise ValueError(f'Please use a valid field name for Line measurement')
         # return both phase currents if 2 conductors
         elif phase == 2:
-            res = cart_to_pol(self.ActElmt.Currents[0:4])
+            res = cart_to_pol(self.engine.elmt_currents()[0:4])
             
         # return single phase current if only 1 conductor
         elif phase == 1:
-            res = cart_to_pol(self.ActElmt.Currents[0:2])
+            res = cart_to_pol(self.engine.elmt_currents()[0:2])
             
         return res
     
@@ -365,38 +623,38 @@ class dssCase():
     # Sequence
     # [V0, V1, V2]
     def get_bus_V(self, name, field, phase):
-        self.ckt.SetActiveBus(name)
-        baseV = self.ActBus.kVbase * 1000
+        self.engine.set_active_bus(name)
+        baseV = self.engine.bus_kv_base() * 1000
         if phase == 3:       
             if field == 'Vseq':
-                res = self.ActBus.SeqVoltages
+                res = self.engine.bus_seq_voltages()
             if field == 'Vpuseq':
-                res = [i / baseV for i in self.ActBus.SeqVoltages]
+                res = [i / baseV for i in self.engine.bus_seq_voltages()]
             elif field == 'VLN':
-                mag, angle = cart_to_pol(self.ActBus.Voltages)
+                mag, angle = cart_to_pol(self.engine.bus_voltages())
                 res = [mag, angle]
             elif field == 'VLL':
-                mag, angle = cart_to_pol(self.ActBus.VLL)
+                mag, angle = cart_to_pol(self.engine.bus_vll())
                 res = [mag, angle]
             else:
                 raise ValueError(f'Please use a valid field name for Bus measurement')
 
         elif phase == 2:
             if field == 'VLN':
-                mag, angle = cart_to_pol(self.ActBus.Voltages)
+                mag, angle = cart_to_pol(self.engine.bus_voltages())
                 res = [mag, angle]
             elif field == 'VLL':
-                mag, angle = cart_to_pol(self.ActBus.VLL)
+                mag, angle = cart_to_pol(self.engine.bus_vll())
                 res = [mag, angle]
             else:
                 raise ValueError(f'Please use a valid field name for Line measurement') 
     
         elif phase == 1:
             if field == 'VLN':
-                mag, angle = cart_to_pol(self.ActBus.Voltages)
+                mag, angle = cart_to_pol(self.engine.bus_voltages())
                 res = [mag, angle]
             elif field == 'VLL':
-                mag, angle = cart_to_pol(self.ActBus.VLL)
+                mag, angle = cart_to_pol(self.engine.bus_vll())
                 res = [mag, angle]
             else:
                 raise ValueError(f'Please use a valid field name for Line measurement')   
@@ -404,30 +662,280 @@ class dssCase():
         
         return res
 
+    # prepare the index and the preallocated arrays of measurement snapshots
+    # rebuilt by snapshot() when elements are added (e.g. a fault)
+    def build_snapshot(self):
+        # nodes, bus by bus in the order of all_bus_volts
+        nodeNames = self.engine.all_node_names()
+        self.nodeNum = len(nodeNames)
+        self.busNodeSlice = {}
+        busNodes = {}
+        for i, n in enumerate(nodeNames):
+            b = n.split('.')[0]
+            busNodes.setdefault(b, []).append(i)
+        for b, idx in busNodes.items():
+            self.busNodeSlice[b] = slice(idx[0], idx[-1] + 1)
+
+        # line-to-line pairs of the first three nodes of each bus, as in bus_vll
+        vllI, vllJ = [], []
+        self.busVLLSlice = {}
+        for b, idx in busNodes.items():
+            start = len(vllI)
+            if len(idx) >= 3:
+                vllI += idx[0:3]
+                vllJ += [idx[1], idx[2], idx[0]]
+            elif len(idx) == 2:
+                vllI.append(idx[0])
+                vllJ.append(idx[1])
+            self.busVLLSlice[b] = slice(start, len(vllI))
+        self.vllI = np.array(vllI, dtype=int)
+        self.vllJ = np.array(vllJ, dtype=int)
+
+        # buses with phases 1, 2, 3 get sequence voltages
+        self.busSeqRow = {}
+        seqIdx = []
+        seqBase = []
+        for b, idx in busNodes.items():
+            phases = [int(nodeNames[i].split('.')[1]) for i in idx]
+            if all(p in phases for p in [1, 2, 3]):
+                self.busSeqRow[b] = len(seqIdx)
+                seqIdx.append([idx[phases.index(p)] for p in [1, 2, 3]])
+                self.engine.set_active_bus(b)
+                seqBase.append(self.engine.bus_kv_base() * 1000)
+        self.vSeqIdx = np.array(seqIdx, dtype=int).reshape(-1, 3)
+        self.vSeqBase = np.array(seqBase, dtype=float)[:, None]
+
+        # conductors of power delivery elements, terminal by terminal
+        self.pdNames = [n.lower() for n in self.engine.pd_names()]
+        self.elmtSlice = {}
+        self.elmtCond = {}
+        self.elmtSeqSlice = {}
+        seqIdx = []
+        start = 0
+        for n in self.pdNames:
+            self.engine.set_active_element(n)
+            condNum = len(self.engine.elmt_node_order())
+            termNum = len(self.engine.elmt_bus_names())
+            cond = condNum // termNum
+            self.elmtSlice[n] = slice(start, start + condNum)
+            self.elmtCond[n] = cond
+            if cond >= 3:
+                self.elmtSeqSlice[n] = slice(len(seqIdx), len(seqIdx) + termNum)
+                seqIdx += [[start + t*cond + k for k in range(3)] for t in range(termNum)]
+            start += condNum
+        self.condNum = start
+        self.iSeqIdx = np.array(seqIdx, dtype=int).reshape(-1, 3)
+        self.alloc_snapshot()
+
+    # preallocated snapshot arrays
+    def alloc_snapshot(self):
+        self.snapV = np.zeros(self.nodeNum, dtype=complex)
+        self.snapVmag = np.zeros(self.nodeNum)
+        self.snapVang = np.zeros(self.nodeNum)
+        self.snapVLL = np.zeros(len(self.vllI), dtype=complex)
+        self.snapVLLmag = np.zeros(len(self.vllI))
+        self.snapVLLang = np.zeros(len(self.vllI))
+        self.snapVseq = np.zeros((len(self.vSeqIdx), 3))
+        self.snapVpuseq = np.zeros((len(self.vSeqIdx), 3))
+        self.snapI = np.zeros(self.condNum, dtype=complex)
+        self.snapImag = np.zeros(self.condNum)
+        self.snapIang = np.zeros(self.condNum)
+        self.snapIseq = np.zeros((len(self.iSeqIdx), 3))
+
+    # measure the whole network after a solution with two bulk engine calls
+    # results are written in place into the snap* arrays, read them through
+    # snap_bus_V and snap_line_I (or directly with the name to slice indexes)
+    # the solution is also the new operating point of the sensitivities
+    def snapshot(self):
+        V = np.asarray(self.engine.all_bus_volts(), dtype=float)
+        I = np.asarray(self.engine.all_pd_currents(), dtype=float)
+        if V.size != 2 * self.nodeNum or I.size != 2 * self.condNum:
+            self.build_snapshot()
+        self.snapV[:] = V.view(complex)
+        self.snapI[:] = I.view(complex)
+        self.update_snapshot()
+        if self.sensitivity is not None:
+            self.sensitivity.anchor()
+
+    # derived snapshot arrays (magnitudes, angles, line-to-line and sequence
+    # values) of the node voltages snapV and element currents snapI
+    def update_snapshot(self):
+        # node voltages
+        np.abs(self.snapV, out=self.snapVmag)
+        np.arctan2(self.snapV.imag, self.snapV.real, out=self.snapVang)
+        np.subtract(self.snapV[self.vllI], self.snapV[self.vllJ], out=self.snapVLL)
+        np.abs(self.snapVLL, out=self.snapVLLmag)
+        np.arctan2(self.snapVLL.imag, self.snapVLL.real, out=self.snapVLLang)
+        np.abs(phase_to_seq(self.snapV[self.vSeqIdx]), out=self.snapVseq)
+        np.divide(self.snapVseq, self.vSeqBase, out=self.snapVpuseq)
+
+        # element currents
+        np.abs(self.snapI, out=self.snapImag)
+        np.arctan2(self.snapI.imag, self.snapI.real, out=self.snapIang)
+        np.abs(phase_to_seq(self.snapI[self.iSeqIdx]), out=self.snapIseq)
+
+    # bus voltage measurement from the last snapshot, same fields and outputs
+    # as get_bus_V but as views of the snapshot arrays
+    def snap_bus_V(self, name, field, phase):
+        if field == 'VLN':
+            s = self.busNodeSlice[name]
+            res = [self.snapVmag[s], self.snapVang[s]]
+        elif field == 'VLL':
+            s = self.busVLLSlice[name]
+            res = [self.snapVLLmag[s], self.snapVLLang[s]]
+        elif phase == 3 and field == 'Vseq':
+            res = self.snapVseq[self.busSeqRow[name]]
+        elif phase == 3 and field == 'Vpuseq':
+            res = self.snapVpuseq[self.busSeqRow[name]]
+        else:
+            raise ValueError(f'Please use a valid field name for Bus measurement')
+
+        return res
+
+    # line current measurement from the last snapshot, same fields and outputs
+    # as get_line_I but as views of the snapshot arrays
+    def snap_line_I(self, name, field, phase):
+        full_name = 'line.' + name
+        if phase == 3 and field in ['Iseq', 'Ipuseq']:
+            res = self.snapIseq[self.elmtSeqSlice[full_name].start]
+        elif phase == 3 and field != 'Iph':
+            raise ValueError(f'Please use a valid field name for Line measurement')
+        else:
+            s = self.elmtSlice[full_name].start
+            res = (self.snapImag[s:s + phase], self.snapIang[s:s + phase])
+
+        return res
+
     # edit a property, or a list of properties, of a DSS element
-    def edit_elmt(self, name, fields, vals):
+    # log: keep the previous values so that rollback can undo the edit
+    def edit_elmt(self, name, fields, vals, log=True):
+        if not isinstance(fields, list):
+            fields = [fields]
+            vals = [vals]
+
+        if log:
+            old = [self.engine.get_property(name, f) for f in fields]
+            self.editLog.append((name, fields, old))
+
         cmd = f'Edit {name}'
-        # if providing a list of properties, iterate through
-        if isinstance(fields, list):
-            for f, v in zip(fields, vals):
-                cmd += f' {f}={v}'
-        # if only one property, add and execute
-        else:
-            cmd += f'{fields}={vals}'
+        for f, v in zip(fields, vals):
+            cmd += f' {f}={v}'
 
-        self.txt.Command = cmd
+        self.engine.command(cmd)
+        self.changeCount += 1
 
     # trip an element in the netwrok
     def trip_elmt(self, elmt):
-        self.txt.Command = f'open line.{elmt} term=1'
+        self.engine.command(f'open line.{elmt} term=1')
+        self.openElmts.add(elmt)
+        self.changeCount += 1
+
+    # trip several lines with one engine call
+    def trip_elmts(self, elmts):
+        self.engine.commands([f'open line.{elmt} term=1' for elmt in elmts])
+        self.openElmts.update(elmts)
+        self.changeCount += len(elmts)
+
+    # close a tripped element again
+    def close_elmt(self, elmt):
+        self.engine.command(f'close line.{elmt} term=1')
+        self.openElmts.discard(elmt)
+        self.changeCount += 1
+
+    # save the solved state of the circuit: elements, switch positions, edits,
+    # load and generator setpoints, regulator taps, capacitor states, time and
+    # the solution. rollback() restores it in place without recompiling
+    def checkpoint(self):
+        cp = {}
+        cp['elements'] = set(n.lower() for n in self.engine.element_names())
+        cp['open'] = set(self.openElmts)
+        cp['edits'] = len(self.editLog)
+        cp['setpoints'] = {}
+        for cls, props in CHECKPOINT_PROPS.items():
+            if self.engine.count(cls) > 0:
+                cp['setpoints'][cls] = {p: self.engine.get_all(cls, p) for p in props}
+        cp['genTable'] = copy.deepcopy(self.genTable)
+
+        # states changed by controls during solutions
+        cp['states'] = {}
+        for t in sorted(set(self.engine.get_all('regcontrols', 'Transformer'))):
+            cp['states'][f'Transformer.{t}'] = ('taps', self.engine.get_property(f'Transformer.{t}', 'taps'))
+        for c in self.engine.names('capacitors'):
+            cp['states'][f'Capacitor.{c}'] = ('states', self.engine.get_property(f'Capacitor.{c}', 'states'))
+
+        cp['time'] = (self.engine.hour(), self.engine.seconds())
+        cp['V'] = np.array(self.engine.all_bus_volts(), dtype=float)
+        return cp
+
+    # restore a checkpoint: disable elements added since (e.g. faults), undo
+    # edits and trips, reset setpoints, states and time, then solve again
+    def rollback(self, cp, solve=True):
+        for n in self.engine.element_names():
+            if n.lower() not in cp['elements']:
+                self.engine.command(f'Edit {n} enabled=no')
+
+        # undo edits, latest first
+        for name, fields, old in reversed(self.editLog[cp['edits']:]):
+            keep = [i for i, v in enumerate(old) if v != '----']
+            if len(keep) < len(fields):
+                print(f'Warning: cannot restore {[fields[i] for i in range(len(fields)) if i not in keep]} of {name}!')
+            if len(keep) > 0:
+                self.edit_elmt(name, [fields[i] for i in keep], [old[i] for i in keep], log=False)
+        del self.editLog[cp['edits']:]
+
+        # switch positions
+        for e in sorted(self.openElmts - cp['open']):
+            self.close_elmt(e)
+        for e in sorted(cp['open'] - self.openElmts):
+            self.trip_elmt(e)
+
+        for cls, props in cp['setpoints'].items():
+            for p, vals in props.items():
+                self.engine.set_all(cls, p, vals)
+        if 'loads' in cp['setpoints']:
+            self.loadKW = np.array(cp['setpoints']['loads']['kW'], dtype=float)
+            self.loadKvar = np.array(cp['setpoints']['loads']['kvar'], dtype=float)
+        self.genTable = copy.deepcopy(cp['genTable'])
+        self.registry.trim('generator', len(self.genTable))
+        self.restore_states(cp)
+        if solve:
+            self.solve_case()
+
+    # restore the regulator taps, capacitor states and time of a checkpoint
+    # and drop the waiting control actions
+    def restore_states(self, cp):
+        for name, (prop, val) in cp['states'].items():
+            if self.engine.get_property(name, prop) != val:
+                self.engine.command(f'Edit {name} {prop}={val}')
+
+        self.engine.clear_control_queue()
+        self.queueClearTime = None
+        self.engine.command(f'set mode=snap hour={cp["time"][0]} sec={cp["time"][1]}')
 
     
+    # restore the generator table of a checkpoint without touching the engine,
+    # the rows that differ from what the engine has are pushed by the next
+    # sync_gen_df (the power of every row if generators were added since)
+    def rollback_gens(self, cp):
+        if len(self.genTable) == len(cp['genTable']):
+            for f in GEN_FIELDS:
+                self.genTable[f] = cp['genTable'][f]
+        else:
+            self.genTable = copy.deepcopy(cp['genTable'])
+            self.genTable.mark_unsynced(['Pg', 'Qg'])
+            self.registry.trim('generator', len(self.genTable))
+
     # create a random fault in this case
     def random_fault(self):
         randFault = fault(self.busNames, self.busPhases, self.ts, self.groundPath)
         
         return randFault
 
+    # create a given fault in this case
+    # spec: {'bus', 'type', 'phases', 'R', 'T'}, as the attributes of a fault
+    def make_fault(self, spec):
+        return fault(self.busNames, self.busPhases, self.ts, self.groundPath, spec)
+
     # create a random transient event in this case
     def random_event(self):
         pass
@@ -436,14 +944,28 @@ class dssCase():
 
 # fault class for DSS
 class fault():
-    def __init__(self, buses, phases, ts, GNDFlag):
+    def __init__(self, buses, phases, ts, GNDFlag, spec=None):
         self.GNDFlag = GNDFlag
-        self.bus = self.rand_bus(buses[2:], phases[2:])
-        self.phases = self.rand_phase(buses[2:], phases[2:])
-        self.R = self.rand_resistance()
-        self.T = self.rand_time(ts)
+        if spec is None:
+            self.bus = self.rand_bus(buses[2:], phases[2:])
+            self.phases = self.rand_phase(buses[2:], phases[2:])
+            self.R = self.rand_resistance()
+            self.T = self.rand_time(ts)
+        else:
+            if spec['bus'] not in buses:
+                raise ValueError(f'Fault bus {spec["bus"]} is not in the case!')
+            self.bus = spec['bus']
+            self.type = spec['type']
+            self.phases = [str(p) for p in spec['phases']]
+            self.R = spec['R']
+            self.T = spec['T']
         self.cmd = self.get_cmd_string()
 
+    # attributes that define this fault, see dssCase.make_fault
+    def get_spec(self):
+        return {'bus': self.bus, 'type': str(self.type), 'phases': [str(p) for p in self.phases],
+                'R': self.R, 'T': self.T}
+
     # location of fault        
     def rand_bus(self, buses, phases):
         # return a random bus in the system
@@ -476,9 +998,9 @@ class fault():
                 self.type = '2'
                 
             if self.type == '1':
-                return np.random.choice(p)
+                return str(np.random.choice(p))
             elif self.type == '2' or self.type == '2g':
-                return np.random.choice(p, 2, replace=False)
+                return [str(i) for i in np.random.choice(p, 2, replace=False)]
         
         # if 3p line, can have all kinds of fault
         elif len(p) == 3:
@@ -528,5 +1050,7 @@ class fault():
         cmd += ' R=' + str(self.R)
         # fault time
         cmd += ' ONtime=' + str(self.T)
+        # a fault of a previous episode may have been disabled by a rollback
+        cmd += ' Enabled=yes'
 
         return cmd
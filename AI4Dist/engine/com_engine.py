@@ -0,0 +1,148 @@
+import win32com.client
+import numpy as np
+from .engine_template import engine
+
+
+# collection attribute of ActiveCircuit for each element class
+COM_CLASSES = {'lines': 'Lines', 'transformers': 'Transformers', 'loads': 'Loads',
+               'generators': 'Generators', 'pvsystems': 'PVSystems',
+               'capacitors': 'Capacitors', 'fuses': 'Fuses', 'vsources': 'Vsources',
+               'regcontrols': 'RegControls'}
+
+
+# OpenDSS engine through the COM server (Windows only)
+# every property access is a cross-process round trip
+class COMEngine(engine):
+    def __init__(self):
+        # initialize DSS interface objects
+        self.dss_handle = win32com.client.Dispatch("OpenDSSEngine.DSS")
+        self.txt = self.dss_handle.Text
+        self.ckt = self.dss_handle.ActiveCircuit
+        self.sol = self.ckt.Solution
+        self.ActElmt = self.ckt.ActiveCktElement
+        self.ActBus = self.ckt.ActiveBus
+
+    ## TEXT INTERFACE
+    def command(self, cmd):
+        self.txt.Command = cmd
+
+    def clear(self):
+        self.dss_handle.ClearAll()
+
+    def result(self):
+        return self.txt.Result
+
+    ## SOLUTION
+    def solve(self):
+        self.sol.Solve()
+
+    def converged(self):
+        return self.sol.Converged
+
+    def seconds(self):
+        return self.sol.Seconds
+
+    def hour(self):
+        return self.sol.Hour
+
+    def control_queue_size(self):
+        return self.ckt.CtrlQueue.QueueSize
+
+    def clear_control_queue(self):
+        self.ckt.CtrlQueue.ClearQueue()
+
+    def monitor_data(self, name):
+        mon = self.ckt.Monitors
+        mon.Name = name
+        channels = [np.asarray(mon.Channel(k + 1)) for k in range(mon.NumChannels)]
+        return ['hour'] + list(mon.Header), np.column_stack([np.asarray(mon.dblHour)] + channels)
+
+    ## CIRCUIT
+    def bus_names(self):
+        return list(self.ckt.AllBusNames)
+
+    def set_active_bus(self, name):
+        self.ckt.SetActiveBus(name)
+
+    def set_active_element(self, name):
+        self.ckt.SetActiveElement(name)
+
+    def element_names(self):
+        return list(self.ckt.AllElementNames)
+
+    def all_node_names(self):
+        return list(self.ckt.AllNodeNames)
+
+    def all_bus_volts(self):
+        return self.ckt.AllBusVolts
+
+    def pd_names(self):
+        return list(self.ckt.PDElements.AllNames)
+
+    def all_pd_currents(self):
+        return self.ckt.PDElements.AllCurrents
+
+    ## ACTIVE BUS
+    def bus_nodes(self):
+        return self.ActBus.Nodes
+
+    def bus_kv_base(self):
+        return self.ActBus.kVbase
+
+    def bus_voltages(self):
+        return self.ActBus.Voltages
+
+    def bus_seq_voltages(self):
+        return self.ActBus.SeqVoltages
+
+    def bus_vll(self):
+        return self.ActBus.VLL
+
+    def bus_zsc_matrix(self):
+        return self.ActBus.ZscMatrix
+
+    ## ACTIVE ELEMENT
+    def elmt_bus_names(self):
+        return self.ActElmt.BusNames
+
+    def elmt_currents(self):
+        return self.ActElmt.Currents
+
+    def elmt_seq_currents(self):
+        return self.ActElmt.SeqCurrents
+
+    def elmt_seq_voltages(self):
+        return self.ActElmt.SeqVoltages
+
+    def elmt_yprim(self):
+        return self.ActElmt.Yprim
+
+    def elmt_node_order(self):
+        return self.ActElmt.NodeOrder
+
+    ## ELEMENT COLLECTIONS
+    def collection(self, cls):
+        self.check_class(cls)
+        return getattr(self.ckt, COM_CLASSES[cls])
+
+    def names(self, cls):
+        coll = self.collection(cls)
+        # COM returns ('NONE',) for an empty collection
+        if coll.Count == 0:
+            return []
+        return list(coll.AllNames)
+
+    def count(self, cls):
+        return self.collection(cls).Count
+
+    def first(self, cls):
+        return self.collection(cls).First
+
+    def next(self, cls):
+        return self.collection(cls).Next
+
+    def get(self, cls, prop):
+        return getattr(self.collection(cls), prop)
+
+    def set(self, cls, prop, val):
+        setattr(self.collection(cls), prop, val)
@@ -0,0 +1,162 @@
+import opendssdirect as dss
+import numpy as np
+from .engine_template import engine
+
+
+# interface of OpenDSSDirect for each element class
+DIRECT_CLASSES = {'lines': 'Lines', 'transformers': 'Transformers', 'loads': 'Loads',
+                  'generators': 'Generators', 'pvsystems': 'PVsystems',
+                  'capacitors': 'Capacitors', 'fuses': 'Fuses', 'vsources': 'Vsources',
+                  'regcontrols': 'RegControls'}
+
+# OpenDSSDirect names of COM properties that are spelled differently
+DIRECT_PROPS = {'kVArated': 'kVARated', 'pu': 'PU'}
+
+
+# OpenDSS engine running in-process through DSS C-API (OpenDSSDirect.py)
+# no marshaling cost per property access and runs headless on Linux
+# every engine has its own DSS context, so several cases can live in one process
+class DirectEngine(engine):
+    def __init__(self):
+        self.dss_handle = dss.NewContext()
+        self.classes = {cls: getattr(self.dss_handle, n) for cls, n in DIRECT_CLASSES.items()}
+
+    ## TEXT INTERFACE
+    def command(self, cmd):
+        try:
+            self.dss_handle.Text.Command(cmd)
+        except dss.DSSException as e:
+            # OpenDSS only warns on a duplicated 'New' and redefines the element,
+            # DSS C-API stops at the warning, so redefine it with an edit
+            if e.args[0] == 266 and cmd.lstrip().lower().startswith('new '):
+                self.dss_handle.Text.Command('Edit ' + cmd.lstrip()[4:])
+            else:
+                raise
+
+    # in one call, unless a 'New' needs the fallback of command
+    def commands(self, cmds):
+        cmds = list(cmds)
+        if any(cmd.lstrip().lower().startswith('new ') for cmd in cmds):
+            for cmd in cmds:
+                self.command(cmd)
+        else:
+            self.dss_handle.Text.Commands(cmds)
+
+    def clear(self):
+        self.dss_handle.Basic.ClearAll()
+
+    def result(self):
+        return self.dss_handle.Text.Result()
+
+    ## SOLUTION
+    def solve(self):
+        self.dss_handle.Solution.Solve()
+
+    def converged(self):
+        return self.dss_handle.Solution.Converged()
+
+    def seconds(self):
+        return self.dss_handle.Solution.Seconds()
+
+    def hour(self):
+        return self.dss_handle.Solution.Hour()
+
+    def control_queue_size(self):
+        return self.dss_handle.CtrlQueue.QueueSize()
+
+    def clear_control_queue(self):
+        self.dss_handle.CtrlQueue.ClearQueue()
+
+    def monitor_data(self, name):
+        mon = self.dss_handle.Monitors
+        mon.Name(name)
+        channels = [np.asarray(mon.Channel(k + 1)) for k in range(mon.NumChannels())]
+        return ['hour'] + list(mon.Header()), np.column_stack([mon.dblHour()] + channels)
+
+    ## CIRCUIT
+    def bus_names(self):
+        return self.dss_handle.Circuit.AllBusNames()
+
+    def set_active_bus(self, name):
+        self.dss_handle.Circuit.SetActiveBus(name)
+
+    def set_active_element(self, name):
+        self.dss_handle.Circuit.SetActiveElement(name)
+
+    def element_names(self):
+        return self.dss_handle.Circuit.AllElementNames()
+
+    def all_node_names(self):
+        return self.dss_handle.Circuit.AllNodeNames()
+
+    def all_bus_volts(self):
+        return self.dss_handle.Circuit.AllBusVolts()
+
+    def pd_names(self):
+        return self.dss_handle.PDElements.AllNames()
+
+    def all_pd_currents(self):
+        return self.dss_handle.PDElements.AllCurrents()
+
+    ## ACTIVE BUS
+    def bus_nodes(self):
+        return self.dss_handle.Bus.Nodes()
+
+    def bus_kv_base(self):
+        return self.dss_handle.Bus.kVBase()
+
+    def bus_voltages(self):
+        return self.dss_handle.Bus.Voltages()
+
+    def bus_seq_voltages(self):
+        return self.dss_handle.Bus.SeqVoltages()
+
+    def bus_vll(self):
+        return self.dss_handle.Bus.VLL()
+
+    def bus_zsc_matrix(self):
+        return self.dss_handle.Bus.ZscMatrix()
+
+    ## ACTIVE ELEMENT
+    def elmt_bus_names(self):
+        return self.dss_handle.CktElement.BusNames()
+
+    def elmt_currents(self):
+        return self.dss_handle.CktElement.Currents()
+
+    def elmt_seq_currents(self):
+        return self.dss_handle.CktElement.SeqCurrents()
+
+    def elmt_seq_voltages(self):
+        return self.dss_handle.CktElement.SeqVoltages()
+
+    def elmt_yprim(self):
+        return self.dss_handle.CktElement.YPrim()
+
+    def elmt_node_order(self):
+        return self.dss_handle.CktElement.NodeOrder()
+
+    ## ELEMENT COLLECTIONS
+    def collection(self, cls):
+        self.check_class(cls)
+        return self.classes[cls]
+
+    def names(self, cls):
+        if self.collection(cls).Count() == 0:
+            return []
+        return self.collection(cls).AllNames()
+
+    def count(self, cls):
+        return self.collection(cls).Count()
+
+    def first(self, cls):
+        return self.collection(cls).First()
+
+    def next(self, cls):
+        return self.collection(cls).Next()
+
+    def get(self, cls, prop):
+        return getattr(self.collection(cls), DIRECT_PROPS.get(prop, prop))()
+
+    def set(self, cls, prop, val):
+        getattr(self.collection(cls), DIRECT_PROPS.get(prop, prop))(val)
@@ -0,0 +1,207 @@
+# define an abstract class template of the OpenDSS solver engine
+# dssCase, env, the agents and the fault generator only talk to the solver
+# through this interface, so the backend can be swapped between the
+# OpenDSS COM server (Windows) and an in-process library (any platform)
+
+# element collections supported by the engine, names follow the COM interface
+ELEMENT_CLASSES = ['lines', 'transformers', 'loads', 'generators', 'pvsystems',
+                   'capacitors', 'fuses', 'vsources', 'regcontrols']
+
+
+class engine():
+    def __init__(self):
+        return
+
+    ## TEXT INTERFACE
+    # execute a DSS text command
+    def command(self, cmd):
+        raise NotImplementedError
+
+    # execute a list of DSS text commands, at once if the backend can, with
+    # the same results as one command() per item
+    def commands(self, cmds):
+        for cmd in cmds:
+            self.command(cmd)
+
+    # clean DSS memory
+    def clear(self):
+        raise NotImplementedError
+
+    # result string of the last command
+    def result(self):
+        raise NotImplementedError
+
+    # read a property of an element by full name through the text interface,
+    # e.g. get_property('Transformer.reg1a', 'taps') -> '[1, 1.0125, ]'
+    def get_property(self, name, prop):
+        self.command(f'? {name}.{prop}')
+        return self.result()
+
+    ## SOLUTION
+    # solve the circuit with the current solution mode
+    def solve(self):
+        raise NotImplementedError
+
+    # return True if the last solution converged
+    def converged(self):
+        raise NotImplementedError
+
+    # current simulation time (seconds within the hour)
+    def seconds(self):
+        raise NotImplementedError
+
+    # current simulation hour
+    def hour(self):
+        raise NotImplementedError
+
+    # number of control actions waiting in the control queue
+    def control_queue_size(self):
+        raise NotImplementedError
+
+    # drop all waiting control actions
+    def clear_control_queue(self):
+        raise NotImplementedError
+
+    # samples recorded by a monitor during the solutions since its last reset
+    # returns (channel names, samples x channels array), the first channel is
+    # the simulation time in hours
+    def monitor_data(self, name):
+        raise NotImplementedError
+
+    ## CIRCUIT
+    # list of all bus names in the circuit
+    def bus_names(self):
+        raise NotImplementedError
+
+    # activate a bus by name
+    def set_active_bus(self, name):
+        raise NotImplementedError
+
+    # activate a circuit element by full name, e.g. 'line.l1'
+    def set_active_element(self, name):
+        raise NotImplementedError
+
+    # full names of all circuit elements, e.g. ['Vsource.source', 'Line.l1', ...]
+    def element_names(self):
+        raise NotImplementedError
+
+    # list of all node names in the circuit, e.g. ['800.1', '800.2', ...]
+    def all_node_names(self):
+        raise NotImplementedError
+
+    # node voltages of the whole circuit in all_node_names order [Re1, Im1, ...]
+    def all_bus_volts(self):
+        raise NotImplementedError
+
+    # full names of all power delivery elements (lines, transformers, ...)
+    def pd_names(self):
+        raise NotImplementedError
+
+    # conductor currents of all power delivery elements in pd_names order,
+    # terminal by terminal [Re1, Im1, Re2, Im2, ...]
+    def all_pd_currents(self):
+        raise NotImplementedError
+
+    ## ACTIVE BUS
+    # node (phase) numbers of the active bus
+    def bus_nodes(self):
+        raise NotImplementedError
+
+    # line-to-neutral base voltage of the active bus in kV
+    def bus_kv_base(self):
+        raise NotImplementedError
+
+    # line-to-neutral voltages of the active bus [Re1, Im1, Re2, Im2, ...]
+    def bus_voltages(self):
+        raise NotImplementedError
+
+    # sequence voltage magnitudes of the active bus [V0, V1, V2]
+    def bus_seq_voltages(self):
+        raise NotImplementedError
+
+    # line-to-line voltages of the active bus [Re1, Im1, Re2, Im2, ...]
+    def bus_vll(self):
+        raise NotImplementedError
+
+    # short circuit impedance matrix of the active bus in ohms, node by node
+    # [Re11, Im11, Re12, Im12, ...], after a solution in faultstudy mode
+    def bus_zsc_matrix(self):
+        raise NotImplementedError
+
+    ## ACTIVE ELEMENT
+    # bus connections of the active element, one per terminal
+    def elmt_bus_names(self):
+        raise NotImplementedError
+
+    # conductor currents of the active element [Re1, Im1, Re2, Im2, ...]
+    def elmt_currents(self):
+        raise NotImplementedError
+
+    # sequence current magnitudes of the active element [I0, I1, I2, ...]
+    def elmt_seq_currents(self):
+        raise NotImplementedError
+
+    # sequence voltage magnitudes of the active element [V0, V1, V2, ...]
+    def elmt_seq_voltages(self):
+        raise NotImplementedError
+
+    # primitive admittance matrix of the active element [Re11, Im11, Re12, ...]
+    def elmt_yprim(self):
+        raise NotImplementedError
+
+    # node number of each conductor of the active element, terminal by terminal
+    def elmt_node_order(self):
+        raise NotImplementedError
+
+    ## ELEMENT COLLECTIONS
+    # cls is one of ELEMENT_CLASSES, prop uses the COM property name
+    # (e.g. 'kW', 'kvar', 'kV', 'kVArated', 'pu', 'IsDelta', 'MonitoredObj')
+
+    # names of all elements in a collection
+    def names(self, cls):
+        raise NotImplementedError
+
+    # number of elements in a collection
+    def count(self, cls):
+        raise NotImplementedError
+
+    # activate the first element of a collection, return 0 if empty
+    def first(self, cls):
+        raise NotImplementedError
+
+    # activate the next element of a collection, return 0 at the end
+    def next(self, cls):
+        raise NotImplementedError
+
+    # read a property of the active element of a collection
+    def get(self, cls, prop):
+        raise NotImplementedError
+
+    # write a property of the active element of a collection
+    def set(self, cls, prop, val):
+        raise NotImplementedError
+
+    # read a property of every element of a collection, in names() order
+    def get_all(self, cls, prop):
+        vals = []
+        self.first(cls)
+        for i in range(self.count(cls)):
+            vals.append(self.get(cls, prop))
+            self.next(cls)
+        return vals
+
+    # write a property of every element of a collection, values in names() order
+    def set_all(self, cls, prop, vals):
+        self.first(cls)
+        for v in vals:
+            self.set(cls, prop, float(v))
+            self.next(cls)
+
+    # check a collection name
+    def check_class(self, cls):
+        if cls not in ELEMENT_CLASSES:
+            raise ValueError(f'Element class {cls} is not supported by the solver engine!')
+
+
+# public methods of the engine interface
+ENGINE_METHODS = [n for n, v in vars(engine).items() if callable(v) and not n.startswith('_')]
@@ -0,0 +1,49 @@
+from .direct_engine import DirectEngine
+
+
+# stand-in engine for profiling, the in-process engine with the solver taken out
+# the circuit is solved once after it is compiled, later solutions only move the
+# simulation time forward and keep these voltages and currents. What is left is
+# the Python cost of env, dssCase and the agents and of reading the results
+class NoSolveEngine(DirectEngine):
+    def __init__(self):
+        super().__init__()
+        self.solved = False
+        self.solveNum = 0
+
+    ## TEXT INTERFACE
+    def command(self, cmd):
+        words = cmd.split(None, 1)
+        verb = words[0].lower() if len(words) > 0 else ''
+        if verb == 'solve':
+            # keep the solution options of the command, e.g. 'Solve mode=dynamics number=1'
+            if len(words) > 1:
+                super().command('set ' + words[1])
+            self.solve()
+            return
+        if verb in ['compile', 'redirect', 'clear']:
+            self.solved = False
+        super().command(cmd)
+
+    # one by one, the solutions are intercepted
+    def commands(self, cmds):
+        for cmd in cmds:
+            self.command(cmd)
+
+    def clear(self):
+        super().clear()
+        self.solved = False
+
+    ## SOLUTION
+    def solve(self):
+        self.solveNum += 1
+        sol = self.dss_handle.Solution
+        if not self.solved:
+            sol.Solve()
+            self.solved = True
+        # time stepping modes advance number x stepsize per solution
+        elif sol.Mode() != 0:
+            sol.Seconds(sol.Seconds() + sol.Number() * sol.StepSize())
+
+    def converged(self):
+        return True
@@ -0,0 +1,92 @@
+import pickle
+import numpy as np
+from .engine_template import engine, ENGINE_METHODS
+
+
+# version of the recording format
+REPLAY_VERSION = 1
+
+
+# arguments of a call in a comparable form
+def plain_args(args):
+    return tuple(a.tolist() if isinstance(a, np.ndarray) else a for a in args)
+
+
+# copy of a result, so the recording cannot be changed through it
+def copy_result(res):
+    if isinstance(res, np.ndarray):
+        return res.copy()
+    if isinstance(res, list):
+        return list(res)
+    return res
+
+
+# records every call made to a solver engine with its arguments and result
+# usage: eng = RecordEngine(DirectEngine()), run a session with it (e.g. pass it
+# as params['engine']), then eng.save(path) and replay it with ReplayEngine(path)
+class RecordEngine(engine):
+    def __init__(self, inner):
+        self.inner = inner
+        self.calls = []
+        for name in ENGINE_METHODS:
+            setattr(self, name, self.recorded(name, getattr(inner, name)))
+
+    def recorded(self, name, fn):
+        calls = self.calls
+
+        def wrapper(*args):
+            try:
+                res = fn(*args)
+            except Exception as e:
+                calls.append((name, plain_args(args), e))
+                raise
+            calls.append((name, plain_args(args), copy_result(res)))
+            return res
+
+        return wrapper
+
+    # write the recorded calls
+    def save(self, path):
+        with open(path, 'wb') as fh:
+            pickle.dump({'version': REPLAY_VERSION, 'engine': type(self.inner).__name__, 'calls': self.calls},
+                        fh, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+# stand-in engine answering from a recording of a real session, no solver needed
+# the same calls have to come in the same order, e.g. the same seeds for faults
+# and measurement noise. A call that differs from the recording raises an error
+# so a replay is also a regression test of everything above the engine
+# log: file written by RecordEngine.save, or its list of calls
+# strict: compare the arguments of every call, else only the method names
+class ReplayEngine(engine):
+    def __init__(self, log, strict=True):
+        if isinstance(log, str):
+            with open(log, 'rb') as fh:
+                rec = pickle.load(fh)
+            if rec['version'] != REPLAY_VERSION:
+                raise ValueError(f'Recording {log} has version {rec["version"]}, {REPLAY_VERSION} is needed!')
+            log = rec['calls']
+        self.calls = log
+        self.strict = strict
+        self.pos = 0
+        for name in ENGINE_METHODS:
+            setattr(self, name, self.replayed(name))
+
+    def replayed(self, name):
+        def wrapper(*args):
+            if self.pos >= len(self.calls):
+                raise ValueError(f'Recording ended before call {self.pos} {name}{plain_args(args)}!')
+            recName, recArgs, res = self.calls[self.pos]
+            if recName != name or (self.strict and recArgs != plain_args(args)):
+                raise ValueError(f'Replay diverged at call {self.pos}: recorded {recName}{recArgs}, '
+                                 f'got {name}{plain_args(args)}!')
+            self.pos += 1
+            if isinstance(res, Exception):
+                raise res
+            return copy_result(res)
+
+        return wrapper
+
+    # True when every recorded call was replayed
+    def finished(self):
+        return self.pos == len(self.calls)
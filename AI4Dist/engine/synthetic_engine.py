@@ -0,0 +1,649 @@
+import os, sys, json, re
+import numpy as np
+from .engine_template import engine, ELEMENT_CLASSES
+from ..case_cache import case_hash
+
+
+# version of the topology files
+TOPO_VERSION = 2
+
+# collection properties kept in a topology, with the element class of each collection
+TOPO_PROPS = {'lines': [], 'transformers': ['IsDelta'], 'loads': ['kW', 'kvar', 'IsDelta'],
+              'generators': ['kW', 'kvar', 'kV', 'kVArated'], 'pvsystems': ['kW', 'kvar', 'kVArated', 'pf'],
+              'capacitors': ['IsDelta'], 'fuses': ['MonitoredObj'], 'vsources': ['pu'],
+              'regcontrols': ['Transformer']}
+CLASS_NAMES = {'lines': 'Line', 'transformers': 'Transformer', 'loads': 'Load', 'generators': 'Generator',
+               'pvsystems': 'PVSystem', 'capacitors': 'Capacitor', 'fuses': 'Fuse', 'vsources': 'Vsource',
+               'regcontrols': 'RegControl'}
+# text interface properties kept in a topology, by element class
+TOPO_TEXT_PROPS = {'regcontrol': ['delay', 'tapdelay'], 'capcontrol': ['delay', 'delayoff'],
+                   'transformer': ['taps'], 'capacitor': ['states']}
+
+# 'key=value' pairs of a DSS command
+DSS_PAIRS = re.compile(r'(\w+)\s*=\s*("[^"]*"|\[[^\]]*\]|\([^)]*\)|\S+)')
+
+# synthetic electrical model: voltage drop at the end of the feeder under the
+# nominal load
+SYN_DROP = 0.05
+# smallest fault resistance in ohms (OpenDSS minimum)
+FAULT_MIN_R = 1e-4
+# phase angle of each node number
+NODE_ANGLE = {1: 0.0, 2: -2 * np.pi / 3, 3: 2 * np.pi / 3}
+SEQ_A = np.exp(2j * np.pi / 3)
+
+
+# file of the topology of a case, next to the case file
+def topology_path(case_path):
+    return os.path.splitext(case_path)[0] + '.topo.json'
+
+
+def plain(v):
+    return v.item() if hasattr(v, 'item') else v
+
+
+# read the topology of a compiled case from a real engine: buses, nodes, element
+# connections, collections with their setpoints, a few text properties and the
+# short circuit impedance matrix of every bus (from a fault study solution)
+def capture_topology(eng, case_path):
+    topo = {'version': TOPO_VERSION,
+            'hash': case_hash(case_path).hexdigest(),
+            'case': os.path.basename(case_path)}
+
+    topo['busNames'] = list(eng.bus_names())
+    topo['buses'] = {}
+    for b in topo['busNames']:
+        eng.set_active_bus(b)
+        topo['buses'][b.lower()] = {'nodes': [int(n) for n in eng.bus_nodes()], 'kVBase': eng.bus_kv_base()}
+    topo['nodeNames'] = list(eng.all_node_names())
+
+    topo['elementNames'] = list(eng.element_names())
+    topo['elements'] = {}
+    for n in topo['elementNames']:
+        eng.set_active_element(n)
+        topo['elements'][n.lower()] = {'buses': list(eng.elmt_bus_names()),
+                                       'nodeOrder': [int(k) for k in eng.elmt_node_order()]}
+    topo['pdNames'] = list(eng.pd_names())
+
+    topo['collections'] = {}
+    for cls in ELEMENT_CLASSES:
+        names = list(eng.names(cls))
+        topo['collections'][cls] = {'names': names,
+                                    'props': {p: [plain(v) for v in eng.get_all(cls, p)] for p in TOPO_PROPS[cls]}}
+
+    topo['text'] = {}
+    for n in topo['elementNames']:
+        for p in TOPO_TEXT_PROPS.get(n.split('.')[0].lower(), []):
+            topo['text'][f'{n.lower()}.{p}'] = eng.get_property(n, p)
+
+    eng.command('solve mode=faultstudy')
+    for b in topo['busNames']:
+        eng.set_active_bus(b)
+        topo['buses'][b.lower()]['zsc'] = [plain(v) for v in eng.bus_zsc_matrix()]
+    eng.command('set mode=snap')
+    eng.solve()
+
+    return topo
+
+
+# compile a case with a real engine and write its topology for SyntheticEngine
+def save_topology(case_path, eng=None, path=None):
+    if eng is None:
+        from .direct_engine import DirectEngine
+        eng = DirectEngine()
+    eng.command(f'compile [{case_path}]')
+    eng.solve()
+    topo = capture_topology(eng, case_path)
+    path = topology_path(case_path) if path is None else path
+    with open(path, 'w') as fh:
+        json.dump(topo, fh)
+    return path
+
+
+# stand-in engine with plausible values from the case topology, no solver needed
+# the topology is captured once with a real engine (save_topology) and stored
+# next to the case. Solutions are synthetic: voltages drop with the distance
+# from the source and the load, element currents carry the load downstream of
+# them, opened lines cut their downstream part. A fault after its ONtime is a
+# set of resistors on the short circuit impedance matrix of its bus (the
+# Thevenin equivalent of the real network), its currents flow from the source
+# and it lowers the voltages behind it. The clock
+# advances number x stepsize per solution outside the snapshot mode
+# topo_path: topology file, None for the one next to the compiled case
+class SyntheticEngine(engine):
+    def __init__(self, topo_path=None):
+        self.topoPath = topo_path
+        self.topo = None
+        self.textResult = ''
+        # changes of setpoints, switches and elements, a solution is only
+        # computed again after a change or when a fault starts
+        self.version = 0
+
+    ## CASE
+    # load the topology of a case and set up its model
+    def load_topology(self, case_path):
+        path = topology_path(case_path) if self.topoPath is None else self.topoPath
+        if not os.path.isfile(path):
+            raise ValueError(f'No topology of case {case_path}, run save_topology on it first!')
+        with open(path) as fh:
+            topo = json.load(fh)
+        if topo['version'] != TOPO_VERSION:
+            raise ValueError(f'Topology {path} has version {topo["version"]}, {TOPO_VERSION} is needed!')
+        if os.path.isfile(case_path) and case_hash(case_path).hexdigest() != topo['hash']:
+            print(f'Warning: topology {path} is older than case {case_path}, save it again!')
+
+        self.topo = topo
+        self.elements = {n: dict(e) for n, e in topo['elements'].items()}
+        self.elementNames = list(topo['elementNames'])
+        self.coll = {cls: {'names': list(c['names']), 'props': {p: list(v) for p, v in c['props'].items()}}
+                     for cls, c in topo['collections'].items()}
+        self.activeIdx = {cls: -1 for cls in ELEMENT_CLASSES}
+        self.text = dict(topo['text'])
+        self.disabled = set()
+        self.opened = set()
+        self.faults = {}
+        self.layouts = {}
+        self.solvedKey = None
+        self.activeBus = None
+        self.activeElmt = None
+        self.mode = 'snap'
+        self.hourNum = 0
+        self.sec = 0.0
+        self.number = 1
+        self.stepsize = 0.001
+
+        # nodes and their nominal voltages
+        self.nodeIdx = {n.lower(): i for i, n in enumerate(topo['nodeNames'])}
+        self.nodeBus = [n.split('.')[0].lower() for n in topo['nodeNames']]
+        self.nodeNum = [int(n.split('.')[1]) for n in topo['nodeNames']]
+        kv = np.array([topo['buses'][b]['kVBase'] for b in self.nodeBus])
+        ang = np.array([NODE_ANGLE.get(k, 0.0) for k in self.nodeNum])
+        self.Vbase = kv * 1000 * np.exp(1j * ang)
+
+        # short circuit impedances of the phase nodes of every bus
+        self.zsc = {}
+        for b, info in topo['buses'].items():
+            n = len(info['nodes'])
+            self.zsc[b] = np.array(info['zsc'], dtype=float).view(complex).reshape(n, n)
+
+        # radial tree of lines and transformers from the source bus
+        src = self.elements[f'vsource.{self.coll["vsources"]["names"][0].lower()}']
+        self.srcBus = self.bus_of(src['buses'][0])
+        adj = {}
+        for n in topo['pdNames']:
+            e = self.elements[n.lower()]
+            if n.split('.')[0].lower() not in ['line', 'transformer'] or len(e['buses']) < 2:
+                continue
+            a, b = self.bus_of(e['buses'][0]), self.bus_of(e['buses'][1])
+            adj.setdefault(a, []).append((n.lower(), b))
+            adj.setdefault(b, []).append((n.lower(), a))
+        self.depth = {self.srcBus: 0}
+        self.branches = []
+        queue = [self.srcBus]
+        for p in queue:
+            for n, c in adj.get(p, []):
+                if c not in self.depth:
+                    self.depth[c] = self.depth[p] + 1
+                    self.branches.append((n, p, c))
+                    queue.append(c)
+        self.maxDepth = max(max(self.depth.values()), 1)
+        self.nominalP = max(sum(abs(float(p)) for p in self.coll['loads']['props']['kW']), 1e-9)
+        self.solve()
+
+    def bus_of(self, spec):
+        return spec.split('.')[0].lower()
+
+    # phase nodes of the first terminal of an element
+    def phase_nodes(self, name):
+        e = self.elements[name]
+        cond = len(e['nodeOrder']) // max(len(e['buses']), 1)
+        nodes = [k for k in e['nodeOrder'][:cond] if k > 0]
+        if len(nodes) == 0:
+            nodes = [k for k in self.topo['buses'].get(self.bus_of(e['buses'][0]), {'nodes': []})['nodes'] if k > 0]
+        return nodes
+
+    ## SYNTHETIC SOLUTION
+    # node voltages and element currents of the present state
+    def solve_model(self):
+        topo = self.topo
+        energized = {self.srcBus}
+        for n, p, c in self.branches:
+            if p in energized and n not in self.opened and n not in self.disabled:
+                energized.add(c)
+        loadP = self.coll['loads']['props']['kW']
+        loading = sum(abs(float(p)) for p in loadP) / self.nominalP
+        pu = float(self.coll['vsources']['props']['pu'][0]) if len(self.coll['vsources']['names']) > 0 else 1.0
+
+        # voltages before faults
+        factor = {b: pu * (1 - SYN_DROP * loading * d / self.maxDepth) if b in energized else 0.0
+                  for b, d in self.depth.items()}
+        busFactor = np.array([factor.get(b, 0.0) for b in self.nodeBus])
+        Vpre = self.Vbase * busFactor
+
+        # complex power drawn at every bus node, loads minus generation
+        S = {}
+        def add_power(name, s):
+            bus = self.bus_of(self.elements[name]['buses'][0])
+            nodes = self.phase_nodes(name)
+            for k in nodes:
+                S.setdefault(bus, {})
+                S[bus][k] = S[bus].get(k, 0) + s / len(nodes)
+
+        props = self.coll['loads']['props']
+        for i, n in enumerate(self.coll['loads']['names']):
+            add_power(f'load.{n.lower()}', 1000 * (float(props['kW'][i]) + 1j * float(props['kvar'][i])))
+        props = self.coll['generators']['props']
+        for i, n in enumerate(self.coll['generators']['names']):
+            add_power(f'generator.{n.lower()}', -1000 * (float(props['kW'][i]) + 1j * float(props['kvar'][i])))
+        props = self.coll['pvsystems']['props']
+        for i, n in enumerate(self.coll['pvsystems']['names']):
+            kva, pf = float(props['kVArated'][i]), float(props['pf'][i])
+            add_power(f'pvsystem.{n.lower()}', -1000 * kva * (abs(pf) + 1j * np.sign(pf) * np.sqrt(max(1 - pf**2, 0))))
+
+        # faults after their onset draw their currents and pull down the voltages behind them
+        self.faultI = {}
+        depressed = {}
+        for name, f in self.faults.items():
+            bus = self.bus_of(self.elements[name]['buses'][0])
+            if name in self.disabled or bus not in energized or (self.mode != 'snap' and self.sec < f['ontime']):
+                continue
+            Ir, Inode, ratio = self.fault_currents(name, bus, f['r'], Vpre)
+            self.faultI[name] = Ir
+            for k, I, i in Inode:
+                S.setdefault(bus, {})
+                S[bus][k] = S[bus].get(k, 0) + Vpre[i] * np.conj(I)
+                depressed[(bus, k)] = ratio[k]
+
+        # voltages behind a fault stay low down the feeder
+        V = Vpre.copy()
+        if len(depressed) > 0:
+            low = {}
+            for (b, k), m in depressed.items():
+                low.setdefault(b, {})[k] = m
+            for n, p, c in self.branches:
+                if p in low:
+                    child = low.setdefault(c, {})
+                    for k, m in low[p].items():
+                        child[k] = min(child.get(k, 1.0), m)
+            for b, nodes in low.items():
+                for k, m in nodes.items():
+                    i = self.nodeIdx.get(f'{b}.{k}')
+                    if i is not None:
+                        V[i] *= m
+        self.V = V
+
+        # power through every branch, from the end of the feeder up
+        Sdown = {b: dict(s) for b, s in S.items()}
+        self.branchS = {}
+        for n, p, c in reversed(self.branches):
+            if c not in energized:
+                continue
+            s = Sdown.get(c, {})
+            self.branchS[n] = s
+            pNodes = [k for k in topo['buses'][p]['nodes'] if k > 0]
+            Sp = Sdown.setdefault(p, {})
+            for k, v in s.items():
+                if k in pNodes:
+                    Sp[k] = Sp.get(k, 0) + v
+                elif len(pNodes) > 0:
+                    for kp in pNodes:
+                        Sp[kp] = Sp.get(kp, 0) + v / len(pNodes)
+
+        # conductor currents of the power delivery elements, terminal by terminal
+        self.Vpre = Vpre
+        self.pdCurrents = {}
+        for n in self.pd_names():
+            self.pdCurrents[n.lower()] = self.elmt_current_model(n.lower())
+
+    # currents of a fault, one resistor R between the conductors of its two
+    # terminals each, on the short circuit impedance matrix Z of its bus:
+    # V = Vpre - Z If, If = Yf V. Returns the resistor currents, the current
+    # drawn from every node of the bus as (node, current, node index) and the
+    # ratio of the faulted to the prefault voltage magnitude by node
+    def fault_currents(self, name, bus, r, Vpre):
+        e = self.elements[name]
+        cond = len(e['nodeOrder']) // 2
+        busNodes = self.topo['buses'][bus]['nodes']
+        phase = [j for j, k in enumerate(busNodes) if k > 0]
+        nodes = [busNodes[j] for j in phase]
+        Z = self.zsc[bus][np.ix_(phase, phase)]
+        idx = [self.nodeIdx[f'{bus}.{k}'] for k in nodes]
+        pos = {k: j for j, k in enumerate(nodes)}
+
+        # admittance matrix of the resistors between the nodes, ground dropped
+        g = 1 / max(r, FAULT_MIN_R)
+        Yf = np.zeros((len(nodes), len(nodes)))
+        pairs = list(zip(e['nodeOrder'][:cond], e['nodeOrder'][cond:]))
+        for a, b in pairs:
+            ends = [pos[k] for k in (a, b) if k in pos]
+            for j in ends:
+                Yf[j, j] += g
+            if len(ends) == 2:
+                Yf[ends[0], ends[1]] -= g
+                Yf[ends[1], ends[0]] -= g
+
+        Vp = Vpre[idx]
+        V = np.linalg.solve(np.eye(len(nodes)) + Z @ Yf, Vp)
+        Inode = Yf @ V
+        Vnode = dict(zip(nodes, V))
+        Ir = np.array([g * (Vnode.get(a, 0) - Vnode.get(b, 0)) for a, b in pairs], dtype=complex)
+        ratio = {k: abs(V[j] / Vp[j]) if Vp[j] != 0 else 1.0 for j, k in enumerate(nodes)}
+        return Ir, list(zip(nodes, Inode, idx)), ratio
+
+    # conductors of an element by terminal, cached: [(sign, [(position, node,
+    # node index)], position of the neutral)], the current flows in (sign 1) at
+    # the terminal nearer the source
+    def elmt_layout(self, name):
+        if name not in self.layouts:
+            e = self.elements[name]
+            termNum = len(e['buses'])
+            cond = len(e['nodeOrder']) // max(termNum, 1)
+            depths = [self.depth.get(self.bus_of(b), 0) for b in e['buses']]
+            terms = []
+            for t in range(termNum):
+                bus = self.bus_of(e['buses'][t])
+                conds = []
+                neutral = None
+                for j, k in enumerate(e['nodeOrder'][t*cond:(t + 1)*cond]):
+                    if k == 0:
+                        neutral = t*cond + j if neutral is None else neutral
+                    else:
+                        conds.append((t*cond + j, k, self.nodeIdx.get(f'{bus}.{k}')))
+                terms.append((1 if depths[t] <= min(depths) else -1, conds, neutral))
+            self.layouts[name] = terms
+        return self.layouts[name]
+
+    # conductor currents of an element
+    def elmt_current_model(self, name):
+        e = self.elements[name]
+        I = np.zeros(len(e['nodeOrder']), dtype=complex)
+        layout = self.elmt_layout(name)
+        if name in self.faultI:
+            Ir = self.faultI[name]
+            cond = len(I) // 2
+            I[:len(Ir)] = Ir
+            I[cond:cond + len(Ir)] = -Ir
+            return I
+        if name not in self.branchS or name in self.opened:
+            return I
+
+        s = self.branchS[name]
+        for sign, conds, neutral in layout:
+            phases = 0
+            for j, k, i in conds:
+                if i is not None and k in s and self.Vpre[i] != 0:
+                    I[j] = sign * np.conj(s[k] / self.Vpre[i])
+                    phases += I[j]
+            if neutral is not None:
+                I[neutral] = -phases
+        return I
+
+    ## TEXT INTERFACE
+    def command(self, cmd):
+        words = cmd.split(None, 1)
+        if len(words) == 0:
+            return
+        verb = words[0].lower()
+        rest = words[1] if len(words) > 1 else ''
+        self.version += 1
+        if verb in ['compile', 'redirect']:
+            self.load_topology(rest.strip().strip('[]"\''))
+        elif verb == 'clear':
+            self.topo = None
+        elif verb == 'set':
+            self.set_options(rest)
+        elif verb == 'solve':
+            self.set_options(rest)
+            self.solve()
+        elif verb in ['new', 'edit']:
+            self.edit_element(rest, verb == 'new')
+        elif verb in ['open', 'close']:
+            name = rest.split()[0].lower()
+            if verb == 'open':
+                self.opened.add(name)
+            else:
+                self.opened.discard(name)
+        elif verb == '?':
+            name, prop = rest.strip().lower().rsplit('.', 1)
+            self.textResult = self.text.get(f'{name}.{prop}', '')
+        # other commands do not change the synthetic model
+
+    def set_options(self, s):
+        for k, v in DSS_PAIRS.findall(s):
+            k = k.lower()
+            if k == 'mode':
+                self.mode = 'snap' if v.lower().startswith('snap') else v.lower()
+            elif k == 'hour':
+                self.hourNum = int(float(v))
+            elif k in ['sec', 'seconds']:
+                self.sec = float(v)
+            elif k == 'number':
+                self.number = int(float(v))
+            elif k in ['stepsize', 'h']:
+                self.stepsize = float(v)
+
+    # New/Edit of an element, faults, generators and pvsystems are modeled
+    def edit_element(self, s, new):
+        words = s.split(None, 1)
+        name = words[0].lower()
+        pairs = {k.lower(): v for k, v in DSS_PAIRS.findall(words[1] if len(words) > 1 else '')}
+        cls = name.split('.')[0]
+
+        isNew = name not in self.elements
+        if isNew and not new:
+            raise ValueError(f'Element {name} is not in the synthetic case!')
+
+        # connection of a new element, or of a fault moved to another bus
+        if isNew or (cls == 'fault' and 'bus1' in pairs):
+            bus1 = pairs.get('bus1', '')
+            nodes = [int(k) for k in bus1.split('.')[1:]]
+            if len(nodes) == 0:
+                nodes = [k for k in self.topo['buses'].get(self.bus_of(bus1), {'nodes': []})['nodes'] if k > 0]
+            if cls == 'fault':
+                bus2 = pairs.get('bus2', self.bus_of(bus1) + '.0' * len(nodes))
+                nodes2 = [int(k) for k in bus2.split('.')[1:]]
+                self.elements[name] = {'buses': [bus1, bus2], 'nodeOrder': nodes + nodes2}
+            else:
+                self.elements[name] = {'buses': [bus1], 'nodeOrder': nodes}
+            self.layouts.pop(name, None)
+
+        if isNew:
+            self.elementNames.append(words[0])
+            if cls in ['generator', 'pvsystem']:
+                c = self.coll[cls + 's']
+                c['names'].append(name.split('.', 1)[1])
+                kva = float(pairs.get('kva', pairs.get('kw', 0)))
+                vals = {'kW': float(pairs.get('kw', 0)), 'kvar': 0.0, 'kV': float(pairs.get('kv', 0)),
+                        'kVArated': kva, 'pf': float(pairs.get('pf', 1))}
+                for p in c['props']:
+                    c['props'][p].append(vals.get(p))
+
+        if cls == 'fault':
+            f = self.faults.setdefault(name, {'r': 0.0001, 'ontime': 0.0})
+            f['r'] = float(pairs.get('r', f['r']))
+            f['ontime'] = float(pairs.get('ontime', f['ontime']))
+        if 'enabled' in pairs:
+            if pairs['enabled'].lower() in ['no', 'n', 'false', 'f']:
+                self.disabled.add(name)
+            else:
+                self.disabled.discard(name)
+        for k, v in pairs.items():
+            self.text[f'{name}.{k}'] = v
+
+    def clear(self):
+        self.topo = None
+
+    def result(self):
+        return self.textResult
+
+    ## SOLUTION
+    def solve(self):
+        if self.mode != 'snap':
+            self.sec += self.number * self.stepsize
+        onset = tuple(n for n, f in self.faults.items() if self.mode == 'snap' or self.sec >= f['ontime'])
+        if (self.version, onset) != self.solvedKey:
+            self.solve_model()
+            self.solvedKey = (self.version, onset)
+
+    def converged(self):
+        return True
+
+    def seconds(self):
+        return self.sec
+
+    def hour(self):
+        return self.hourNum
+
+    def control_queue_size(self):
+        return 0
+
+    def clear_control_queue(self):
+        return
+
+    ## CIRCUIT
+    def bus_names(self):
+        return list(self.topo['busNames'])
+
+    def set_active_bus(self, name):
+        self.activeBus = name.lower()
+
+    def set_active_element(self, name):
+        self.activeElmt = name.lower()
+
+    def element_names(self):
+        return list(self.elementNames)
+
+    def all_node_names(self):
+        return list(self.topo['nodeNames'])
+
+    def all_bus_volts(self):
+        return self.V.view(float).copy()
+
+    def pd_names(self):
+        return self.topo['pdNames'] + [n for n in self.elementNames if n.lower() in self.faults and n.lower() not in self.disabled]
+
+    def all_pd_currents(self):
+        return np.concatenate([self.pdCurrents[n.lower()] for n in self.pd_names()]).view(float)
+
+    ## ACTIVE BUS
+    def bus_node_idx(self):
+        return [self.nodeIdx[f'{self.activeBus}.{k}'] for k in self.bus_nodes()]
+
+    def bus_nodes(self):
+        return list(self.topo['buses'][self.activeBus]['nodes'])
+
+    def bus_kv_base(self):
+        return self.topo['buses'][self.activeBus]['kVBase']
+
+    def bus_voltages(self):
+        return self.V[self.bus_node_idx()].view(float).copy()
+
+    def bus_seq_voltages(self):
+        return list(seq_magnitudes(self.V[self.bus_node_idx()]))
+
+    def bus_vll(self):
+        V = self.V[self.bus_node_idx()]
+        if len(V) >= 3:
+            V = V[[0, 1, 2]] - V[[1, 2, 0]]
+        elif len(V) == 2:
+            V = V[[0]] - V[[1]]
+        return V.view(float).copy()
+
+    ## ACTIVE ELEMENT
+    def elmt_bus_names(self):
+        return list(self.elements[self.activeElmt]['buses'])
+
+    def elmt_node_order(self):
+        return list(self.elements[self.activeElmt]['nodeOrder'])
+
+    def elmt_currents(self):
+        I = self.pdCurrents.get(self.activeElmt)
+        if I is None:
+            I = np.zeros(len(self.elements[self.activeElmt]['nodeOrder']), dtype=complex)
+        return I.view(float).copy()
+
+    def elmt_seq_currents(self):
+        I = np.asarray(self.elmt_currents()).view(complex)
+        return self.terminal_seq(I)
+
+    def elmt_seq_voltages(self):
+        e = self.elements[self.activeElmt]
+        V = []
+        for t, b in enumerate(e['buses']):
+            cond = len(e['nodeOrder']) // len(e['buses'])
+            for k in e['nodeOrder'][t*cond:(t + 1)*cond]:
+                i = self.nodeIdx.get(f'{self.bus_of(b)}.{k}')
+                V.append(self.V[i] if i is not None else 0)
+        return self.terminal_seq(np.array(V, dtype=complex))
+
+    # sequence magnitudes of the first three conductors of every terminal
+    def terminal_seq(self, X):
+        e = self.elements[self.activeElmt]
+        cond = len(e['nodeOrder']) // len(e['buses'])
+        res = []
+        for t in range(len(e['buses'])):
+            res += list(seq_magnitudes(X[t*cond:t*cond + min(cond, 3)]))
+        return res
+
+    ## ELEMENT COLLECTIONS
+    def names(self, cls):
+        self.check_class(cls)
+        return list(self.coll[cls]['names'])
+
+    def count(self, cls):
+        self.check_class(cls)
+        return len(self.coll[cls]['names'])
+
+    def activate(self, cls, i):
+        self.activeIdx[cls] = i
+        if 0 <= i < self.count(cls):
+            self.activeElmt = f'{CLASS_NAMES[cls]}.{self.coll[cls]["names"][i]}'.lower()
+            return 1
+        return 0
+
+    def first(self, cls):
+        return self.activate(cls, 0)
+
+    def next(self, cls):
+        return self.activate(cls, self.activeIdx[cls] + 1)
+
+    def get(self, cls, prop):
+        self.check_class(cls)
+        i = self.activeIdx[cls]
+        if prop == 'Name':
+            return self.coll[cls]['names'][i]
+        if prop not in self.coll[cls]['props']:
+            raise ValueError(f'Property {prop} of {cls} is not in the synthetic case!')
+        return self.coll[cls]['props'][prop][i]
+
+    def set(self, cls, prop, val):
+        self.check_class(cls)
+        self.version += 1
+        if prop == 'Name':
+            names = [n.lower() for n in self.coll[cls]['names']]
+            self.activate(cls, names.index(str(val).lower()))
+            return
+        props = self.coll[cls]['props']
+        if prop not in props:
+            props[prop] = [None] * self.count(cls)
+        props[prop][self.activeIdx[cls]] = val
+
+
+# sequence magnitudes [0, 1, 2] of up to three phase values, a single phase
+# value is taken as positive sequence
+def seq_magnitudes(X):
+    if len(X) >= 3:
+        a = SEQ_A
+        return np.abs(np.array([X[0] + X[1] + X[2],
+                                X[0] + a*X[1] + a*a*X[2],
+                                X[0] + a*a*X[1] + a*X[2]]) / 3)
+    if len(X) == 0:
+        return np.zeros(3)
+    return np.array([0.0, np.abs(X).max(), 0.0])
+
+
+# capture the topologies of cases with the in-process engine
+# python -m AI4Dist.engine.synthetic_engine case/IEEE34/ieee34Mod1.dss ...
+if __name__ == '__main__':
+    # compiling changes the working folder, resolve the paths first
+    for p in [os.path.abspath(p) for p in sys.argv[1:]]:
+        print(save_topology(p))
@@ -1,4 +1,3 @@
-import win32com.client
 import networkx as nx
 import matplotlib.pyplot as plt
 import csv, os
@@ -6,6 +5,12 @@ import numpy as np
 import pandas as pd
 import random
 from .dss_tools import *
+from .profile_store import get_store
+from .instrument import get_stats
+from .recorder import waveRecorder
+from .trajectory import trajectoryWriter
+from .surrogate import pfSurrogate, load_surrogate
+from .agent.AgentTemplate import make_groups
 from rl.core import Env
 
 
@@ -15,8 +20,24 @@ class env(Env):
         # unpack configuration dic
         self.ts = params['time_step']
         self.maxStep = params['max_step']
-        self.case = dssCase(case_path, self.ts)
-        self.caseName = case_path.split('\\')[-1].split('.')[0]
+        # adaptive stepping of dynamic events, see steps_to_next_event
+        self.adaptive = params.get('adaptive', False)
+        # opt-in timing and engine call counts, see instrument.get_stats
+        self.stats = get_stats(params.get('instrument'))
+        # waveforms of the agents, one sample per observation of an episode and
+        # written in chunks of episodes if a folder is given, see recorder.waveReader
+        self.recorder = waveRecorder(self.maxStep + 1, params.get('waveform_path'), params.get('waveform_chunk', 64))
+        self.fault = None
+        # random numbers of the agents by step, drawn again at every reset, see step_random
+        self.randomSeed = 0
+        self.randomStep = None
+        self.randomValues = None
+        self.trajectoryPath = params.get('trajectory_path')
+        self.trajectoryChunk = params.get('trajectory_chunk', 100000)
+        self.case = dssCase(case_path, self.ts, params.get('engine', 'com'), params.get('case_cache'), self.stats)
+        # clean circuit restored at every reset
+        self.baseState = self.case.checkpoint()
+        self.caseName = os.path.splitext(os.path.basename(case_path.replace('\\', '/')))[0]
 
         self.loadProfile = None
         self.pvProfile = None
@@ -25,15 +46,13 @@ class env(Env):
         self.hourNum = None
         self.DEREnable = params['DEREnable']
         
-        # load load and DER profiles if supplied
-        if not params['load_profile'] == None:
-            self.loadProfile = pd.read_csv(params['load_profile'], index_col='date_time', parse_dates=True)
-
-        if not params['pv_profile'] == None:
-            self.pvProfile = pd.read_csv(params['pv_profile'], index_col='date_time', parse_dates=True)
-
-        if not params['wind_profile'] == None:
-            self.windProfile = pd.read_csv(params['wind_profile'], index_col='date_time', parse_dates=True)
+        # load load and DER profiles if supplied, from csv files (or DataFrames)
+        # or by name from a compiled profile store
+        self.profileStore = None
+        if params.get('profile_store') is not None:
+            self.read_profile_store(params)
+        else:
+            self.read_profile_csv(params)
 
         # required fields for gym
         self.svNum = None
@@ -47,7 +66,8 @@ class env(Env):
         # properties of agents
         self.agents = agents
         self.agentNum = len(self.agents)
-        self.trainingAgentIdx = 0
+        # no agent under training when the env only runs the case (e.g. QSTS)
+        self.trainingAgentIdx = 0 if self.agentNum > 0 else None
         self.marketAgentIdx = []
         self.ssAgentIdx = []
         self.dynamicAgentIdx = []
@@ -65,19 +85,120 @@ class env(Env):
         self.ssAgentNum = len(self.ssAgentIdx)
         self.dynamicAgentNum = len(self.dynamicAgentIdx)
 
+        # steady state steps predicted from voltage sensitivities, e.g.
+        # {'bound': 0.01, 'errBound': 0.001}, see sensitivity.voltSensitivity
+        # steady state only, envs with dynamic agents always solve
+        if params.get('sensitivity') is not None:
+            if self.dynamicAgentNum > 0:
+                raise ValueError(f'Sensitivity predictions are for steady state steps, the env has {self.dynamicAgentNum} dynamic agents!')
+            self.case.use_sensitivity(**params['sensitivity'])
+
+        # steady state snapshots served by a power flow surrogate (a pfSurrogate
+        # or the file of a saved one) with a ground truth solution every
+        # 'surrogate_check' snapshots, see surrogate.pfSurrogate
+        # steady state only, envs with dynamic agents always solve
+        self.surrogate = None
+        if params.get('surrogate') is not None:
+            if self.dynamicAgentNum > 0:
+                raise ValueError(f'Surrogate snapshots are for steady state steps, the env has {self.dynamicAgentNum} dynamic agents!')
+            self.surrogate = params['surrogate']
+            if not isinstance(self.surrogate, pfSurrogate):
+                self.surrogate = load_surrogate(self.surrogate)
+            if 'surrogate_check' in params:
+                self.surrogate.checkEvery = params['surrogate_check']
+        # network changes undone by the last rollback
+        self.cleanChanges = self.case.changeCount
+
+        # agents of one class and model observe and act together, as one batch
+        # where their class supports it ('group_agents': False steps them one
+        # by one in their order)
+        merge = params.get('group_agents', True)
+        self.marketGroups = make_groups([self.agents[a] for a in self.marketAgentIdx], merge)
+        self.ssGroups = make_groups([self.agents[a] for a in self.ssAgentIdx], merge)
+        self.dynamicGroups = make_groups([self.agents[a] for a in self.dynamicAgentIdx], merge)
+
         # initialize agents
-        for a in self.agents:
-            a.reset(self)
+        self.reset_agents()
+
+        # offline RL dataset of the trajectories of all agents, see trajectory.trajectoryLoader
+        self.trajectory = None
+        if self.trajectoryPath is not None:
+            self.trajectory = trajectoryWriter(self.trajectoryPath, self.agents, self.trajectoryChunk)
+
+    # read a profile csv indexed by date_time, DataFrames are used as they are
+    def read_profile(self, profile):
+        if isinstance(profile, pd.DataFrame):
+            return profile
+        return pd.read_csv(profile, index_col='date_time', parse_dates=True)
+
+    # read profiles from csv files and align them on their shared hours once
+    def read_profile_csv(self, params):
+        if params['load_profile'] is not None:
+            self.loadProfile = self.read_profile(params['load_profile'])
+
+        if params['pv_profile'] is not None:
+            self.pvProfile = self.read_profile(params['pv_profile'])
+
+        if params['wind_profile'] is not None:
+            self.windProfile = self.read_profile(params['wind_profile'])
+
+        if self.loadProfile is None:
+            return
+
+        # shared hours in the profiles
+        if self.DEREnable:
+            self.commonIndex = self.loadProfile.index.intersection(self.pvProfile.index).intersection(self.windProfile.index)
+        else:
+            self.commonIndex = self.loadProfile.index
+        self.profileRows = np.arange(self.commonIndex.size)
+
+        # a load profile with one column per load (instead of 'value') scales
+        # every load separately, keep it as a (time x loads) matrix
+        if 'value' in self.loadProfile.columns:
+            self.loadValues = self.loadProfile.loc[self.commonIndex, 'value'].to_numpy(dtype=float)
+        else:
+            missing = [n for n in self.case.loadNames if n not in self.loadProfile.columns]
+            if len(missing) > 0:
+                raise ValueError(f'Loads {missing} are missing in the load profile!')
+            self.loadValues = self.loadProfile.loc[self.commonIndex, self.case.loadNames].to_numpy(dtype=float)
+
+        if self.DEREnable:
+            self.pvValues = self.pvProfile.loc[self.commonIndex, 'value'].to_numpy(dtype=float)
+            self.windValues = self.windProfile.loc[self.commonIndex, 'value'].to_numpy(dtype=float)
+
+    # use memory mapped profiles of a compiled store, profiles are given by name
+    # (e.g. 'ercot_houston_load'), see profile_store.compile_profiles
+    def read_profile_store(self, params):
+        self.profileStore = get_store(params['profile_store'])
+        self.loadProfile = params['load_profile']
+        self.pvProfile = params['pv_profile']
+        self.windProfile = params['wind_profile']
+
+        # shared hours in the profiles, cached by the store
+        columns = [self.loadProfile]
+        if self.DEREnable:
+            columns += [self.pvProfile, self.windProfile]
+        self.profileRows = self.profileStore.common_rows(columns)
+        self.commonIndex = self.profileStore.timestamps(self.profileRows)
+
+        self.loadValues = self.profileStore.data[self.loadProfile]
+        if self.DEREnable:
+            self.pvValues = self.profileStore.data[self.pvProfile]
+            self.windValues = self.profileStore.data[self.windProfile]
 
     # get measurements needed for an agent, specified in the fields of the agent class
+    # read from the snapshot taken after the last solution
     def take_sample(self, idx):
         all_sample = {}
         for i in self.agents[idx].obs:
             if i in ['Vseq', 'VLN', 'VLL']:
-                ob = self.case.get_bus_V(self.agents[idx].bus1, i, self.agents[idx].phases)
+                ob = self.case.snap_bus_V(self.agents[idx].bus1, i, self.agents[idx].phases)
             elif i in ['Iseq', 'Iph']:
-                lineName = self.case.lineNames[self.agentsLineIndex[idx]]
-                ob = self.case.get_line_I(lineName, i, self.agents[idx].phases)
+                line = self.case.registry.line_between(self.agents[idx].bus1, self.agents[idx].bus2)
+                if line is None:
+                    raise ValueError(f'No line between bus {self.agents[idx].bus1} and {self.agents[idx].bus2} for agent {idx}!')
+                lineName = self.case.lineNames[line]
+                ob = self.case.snap_line_I(lineName, i, self.agents[idx].phases)
             else:
                 raise ValueError(f'Observation type not supported for agent{i}!')
                 
@@ -86,87 +207,142 @@ class env(Env):
         return all_sample
 
     # scale renewable generator and demands based on profile
-    def apply_profile(self, rowIndex = None):
+    # rowIndex: an hour of the shared profile index, or its timestamp
+    # push: write the loads and generators to the engine now, otherwise at the
+    # next solution (surrogate mode)
+    def apply_profile(self, rowIndex = None, push = True):
+        if not isinstance(rowIndex, (int, np.integer)):
+            rowIndex = self.commonIndex.get_loc(rowIndex)
+        row = self.profileRows[rowIndex]
         
-        # apply load changes
-        loadC = self.loadProfile.at[rowIndex, 'value']
-        loads = self.case.ckt.Loads
-        loadNum = loads.Count
-        
-        # start from the first load
-        loads.First
-        for i in range(loadNum):
-            loadP = loads.kW
-            loadQ = loads.kvar
-            loads.kW = loadP * loadC
-            loads.kvar = loadQ * loadC
-            loads.Next
+        # apply load changes, always from the nominal demand of each load
+        self.case.scale_loads(self.loadValues[row], push)
 
         # DERs
         if self.DEREnable:
             # profiles percentage
-            pvC = self.pvProfile.at[rowIndex, 'value']
-            windC = self.windProfile.at[rowIndex, 'value']
+            pvC = self.pvValues[row]
+            windC = self.windValues[row]
 
-            # set the generator dataframe
-            self.case.genDF.loc[self.case.genDF["fuel"]=="pv", "Pmax"] = self.case.genDF.loc[self.case.genDF["fuel"]=="pv", "kVAbase"] * pvC
-            self.case.genDF.loc[self.case.genDF["fuel"]=="wind", "Pmax"] = self.case.genDF.loc[self.case.genDF["fuel"]=="wind", "kVAbase"] * windC
+            # set the generator table
+            gens = self.case.genTable
+            pv = gens.fuel_rows('pv')
+            wind = gens.fuel_rows('wind')
+            gens['Pmax'][pv] = gens['kVAbase'][pv] * pvC
+            gens['Pmax'][wind] = gens['kVAbase'][wind] * windC
 
             # put into model
-            self.case.sync_gen_df()
+            if push:
+                self.case.sync_gen_df()
             
         
+    # reset the agents and then their groups, at the start of every episode
+    def reset_agents(self):
+        for a in self.agents:
+            a.reset(self)
+        for g in self.marketGroups + self.ssGroups + self.dynamicGroups:
+            g.reset(self)
+
+    # uniform random numbers of every agent at the current step (e.g. for their
+    # measurement noise), from a generator seeded by the episode and the step.
+    # Adaptive stepping skips observations without changing the numbers of the
+    # steps it does observe
+    def step_random(self):
+        if self.randomStep != self.currStep:
+            self.randomStep = self.currStep
+            self.randomValues = np.random.default_rng([self.randomSeed, self.currStep]).random(self.agentNum)
+        return self.randomValues
+
+    # internal states of the agents into their groups, at the start of an episode
+    def load_groups(self):
+        for g in self.marketGroups + self.ssGroups + self.dynamicGroups:
+            g.load_members()
+
     # reset the environment and start a market interval
-    def new_timestamp(self, marketFlag = True, row_idx = None):
+    # event: fault of the dynamic event, random if None
+    def new_timestamp(self, marketFlag = True, row_idx = None, event = None):
+        # first step of the episode
+        self.currStep = 1
+        self.load_groups()
+
         # set demand DER max power (if there are DERs)
-        self.apply_profile(row_idx)
+        with self.stats.phase('apply_profile'):
+            self.apply_profile(row_idx, self.surrogate is None)
 
         # if this timestep is a market clearance step
         if marketFlag:
-            # use market to determine generator dispatch
-            self.market.update_case(self.case)
-            self.market.get_dispatch()
-
-            # set generators in model
-            self.case.sync_gen_df()
-
-        # solve the model
-        self.case.txt.Command = "set maxcontroliter=100"
-        self.case.txt.Command = "set mode=snap"
-        self.case.txt.Command = "Solve"
-
-        assert self.case.sol.Converged, "Steady-state PF Failed!"
+            with self.stats.phase('market'):
+                # use market to determine generator dispatch
+                self.market.update_case(self.case)
+                self.market.get_dispatch()
+
+                # set generators in model
+                if self.surrogate is None:
+                    self.case.sync_gen_df()
+        else:
+            # the last dispatch holds until the next clearing
+            with self.stats.phase('market'):
+                self.market.apply_dispatch()
+                if self.surrogate is None:
+                    self.case.sync_gen_df()
+
+        # solve the model, or predict it with the surrogate
+        if self.surrogate is not None:
+            solved = self.surrogate_snapshot(reset=True)
+        else:
+            with self.stats.phase('solve'):
+                self.case.engine.command("set maxcontroliter=100")
+                self.case.engine.command("set mode=snap")
+                self.case.engine.command("Solve")
+
+            assert self.case.engine.converged(), "Steady-state PF Failed!"
+            with self.stats.phase('snapshot'):
+                self.case.snapshot()
+            solved = True
+        if marketFlag and solved:
+            with self.stats.phase('market'):
+                self.market.observe_solution()
 
         # market agents can still observe even not taking actions
-        for a in self.marketAgentIdx:
-            self.agents[a].observe()
+        with self.stats.phase('observe'):
+            for g in self.marketGroups:
+                g.observe()
 
         # steady state agents
-        for a in self.ssAgentIdx:
-            self.agents[a].observe()
-            self.agents[a].getAction()
-            self.agents[a].setAction()
+        for g in self.ssGroups:
+            with self.stats.phase('observe'):
+                g.observe()
+            with self.stats.phase('act'):
+                g.getAction()
+                g.setAction()
 
         # do dynamic simulation if there are dynamic agents
         if self.dynamicAgentNum > 0:
-            self.reset_dynamic_event()            
+            self.reset_dynamic_event(event)
 
 
     # initialize an episode of dynamic event simulation
-    def reset_dynamic_event(self):
-        # model is already initialized, get a random event
-        self.fault = self.case.random_fault()
-        self.case.txt.Command = self.fault.cmd
+    def reset_dynamic_event(self, event = None):
+        # model is already initialized, get a random event if none is given
+        if event is None:
+            self.fault = self.case.random_fault()
+        else:
+            self.fault = event
+        self.case.engine.command(self.fault.cmd)
 
         self.currStep = 1
 
         # set dynamic mode
-        self.case.txt.Command = "Solve mode=dynamics number=1 stepsize=" + str(self.ts)
-        assert self.case.sol.Converged, "Dynamic PF Failed!"
+        with self.stats.phase('solve'):
+            self.case.engine.command("Solve mode=dynamics number=1 stepsize=" + str(self.ts))
+        assert self.case.engine.converged(), "Dynamic PF Failed!"
+        with self.stats.phase('snapshot'):
+            self.case.snapshot()
 
         # get new observation for agents 
-        for a in self.dynamicAgentIdx:
-            self.agents[a].observe()
+        with self.stats.phase('observe'):
+            for g in self.dynamicGroups:
+                g.observe()
         
 
     # step through a dynamic event
@@ -177,24 +353,58 @@ class env(Env):
             done = 1
 
         # actions of agents
-        for a in self.dynamicAgentIdx:
-            self.agents[a].getAction()
-            self.agents[a].setAction()
-
-        # solve this timestep
-        self.currStep += 1
-        self.case.solve_case()
+        changes = self.case.changeCount
+        with self.stats.phase('act'):
+            for g in self.dynamicGroups:
+                g.getAction()
+                g.setAction()
+
+        # solve this timestep, or all timesteps until the next event in adaptive
+        # mode unless the agents just changed the network
+        if self.adaptive and self.case.changeCount == changes:
+            k = self.steps_to_next_event()
+        else:
+            k = 1
+        self.currStep += k
+        with self.stats.phase('solve'):
+            if k == 1:
+                self.case.solve_case()
+            else:
+                self.case.solve_steps(k)
+        with self.stats.phase('snapshot'):
+            self.case.snapshot()
 
         # rewards
-        for a in self.dynamicAgentIdx:
-            self.agents[a].getReward()
+        with self.stats.phase('reward'):
+            for g in self.dynamicGroups:
+                g.getReward()
 
         # get new observation for agents 
-        for a in self.dynamicAgentIdx:
-            self.agents[a].observe()
+        with self.stats.phase('observe'):
+            for g in self.dynamicGroups:
+                g.observe()
 
         return done
 
+    # number of timesteps that can be solved at once before the next event: the
+    # fault onset or the wake up time of an agent. Stops one step short of the
+    # event so that the event itself is reached with a single step, as in the
+    # fixed step mode, and the relay trip times stay the same
+    def steps_to_next_event(self):
+        t = self.case.engine.seconds()
+        events = []
+        if self.fault.T > t:
+            events.append(self.fault.T)
+        for g in self.dynamicGroups:
+            w = g.wake_time()
+            if w is None:
+                return 1
+            events.append(w)
+
+        tNext = min(events) if len(events) > 0 else np.inf
+        k = min(np.ceil((tNext - t) / self.ts - 1e-9) - 1, self.maxStep - self.currStep)
+        return int(max(k, 1))
+
     # step through the profile
     def step_ss_snapshots(self):
         done = 0
@@ -203,54 +413,191 @@ class env(Env):
             done = 1
 
         # action of agents
-        for a in self.ssAgentIdx:
-            self.agents[a].getAction()
-            self.agents[a].setAction()
+        with self.stats.phase('act'):
+            for g in self.ssGroups:
+                g.getAction()
+                g.setAction()
 
-        # solve time step
+        # solve time step, unless the surrogate or the sensitivities can predict it
         self.currStep += 1
-        self.case.solve_case()
+        predicted = False
+        if self.surrogate is not None:
+            self.surrogate_snapshot()
+            predicted = True
+        elif self.case.sensitivity is not None:
+            with self.stats.phase('predict'):
+                predicted = self.case.sensitivity.predict()
+        if not predicted:
+            with self.stats.phase('solve'):
+                self.case.solve_case()
+            with self.stats.phase('snapshot'):
+                self.case.snapshot()
 
         # rewards
-        for a in self.ssAgentIdx:
-            self.agents[a].getReward()
+        with self.stats.phase('reward'):
+            for g in self.ssGroups:
+                g.getReward()
 
-        for a in self.ssAgentIdx:
-            self.agents[a].observe()
+        with self.stats.phase('observe'):
+            for g in self.ssGroups:
+                g.observe()
 
         return done
 
+    # steady state snapshot from the surrogate, or solved by the engine at the
+    # spot checks and after network changes, with the loads and generators
+    # pushed first. Returns True if the engine solved
+    # reset: first snapshot of an episode, solved from the clean taps and
+    #        capacitor states as after a full rollback
+    def surrogate_snapshot(self, reset=False):
+        with self.stats.phase('surrogate'):
+            if self.surrogate.serve(self.case):
+                return False
+
+        with self.stats.phase('solve'):
+            if reset:
+                self.case.restore_states(self.baseState)
+            self.case.push_loads()
+            self.case.sync_gen_df()
+            self.case.engine.command("set maxcontroliter=100")
+            self.case.engine.command("set mode=snap")
+            self.case.solve_case()
+        assert self.case.engine.converged(), "Steady-state PF Failed!"
+        with self.stats.phase('snapshot'):
+            self.case.snapshot()
+        self.surrogate.check(self.case)
+        return True
+
+    # quasi-static time series of a profile window, solved by the engine
+    # the profiles of the window become loadshapes and the window is solved in
+    # the yearly mode with one call per control interval instead of one
+    # apply_profile and snap solution per hour. Renewables produce all their
+    # available power and the market is not cleared inside the window
+    # start: first hour of the shared profile index, or its timestamp
+    # hours: length of the window, until the end of the profiles if None
+    # interval: hours between two observations and actions of the steady state
+    #           agents, the whole window in one call if None
+    # monitors: elements recorded every hour, names or (name, DSS monitor mode)
+    # returns {'time': timestamps of the interval ends, 'Vpu': positive
+    # sequence voltages (intervals x busSeqRow buses), 'converged': per interval,
+    # 'monitors': {element: DataFrame indexed by timestamps}}
+    # call reset afterwards to go back to the snapshot episodes
+    def run_qsts(self, start=0, hours=None, interval=None, monitors=None):
+        if not isinstance(start, (int, np.integer)):
+            start = self.commonIndex.get_loc(start)
+        if hours is None:
+            hours = self.commonIndex.size - start
+        hours = min(hours, self.commonIndex.size - start)
+        if hours <= 0:
+            raise ValueError(f'Empty QSTS window at hour {start}!')
+        if interval is None:
+            interval = hours
+        times = self.commonIndex[start:start + hours]
+        if (np.diff(times.values) != np.timedelta64(1, 'h')).any():
+            print(f'Warning: the profiles have gaps between {times[0]} and {times[-1]}, the loadshapes are hourly')
+        rows = self.profileRows[start:start + hours]
+
+        # the sensitivities are of snapshot solutions, not anchored in the window
+        sensitivity = self.case.sensitivity
+        self.case.sensitivity = None
+        try:
+            with self.stats.phase('rollback'):
+                self.case.rollback(self.baseState, solve=False)
+            # loadshapes and monitors stay in the engine, the next reset rolls back fully
+            self.cleanChanges = None
+            self.load_groups()
+            with self.stats.phase('apply_profile'):
+                if self.DEREnable:
+                    self.case.set_loadshapes(self.loadValues[rows], self.pvValues[rows], self.windValues[rows])
+                else:
+                    self.case.set_loadshapes(self.loadValues[rows])
+                monitors = [(m, 0) if isinstance(m, str) else m for m in (monitors or [])]
+                monNames = [self.case.add_monitor(m, mode) for m, mode in monitors]
+                self.case.start_qsts()
+
+            res = {'time': [], 'Vpu': [], 'converged': []}
+            done = 0
+            while done < hours:
+                k = min(interval, hours - done)
+                with self.stats.phase('solve'):
+                    self.case.solve_qsts(k)
+                done += k
+                with self.stats.phase('snapshot'):
+                    self.case.snapshot()
+                res['time'].append(times[done - 1])
+                res['Vpu'].append(self.case.snapVpuseq[:, 1].copy())
+                res['converged'].append(self.case.engine.converged())
+
+                # steady state agents at the control intervals
+                for g in self.ssGroups:
+                    with self.stats.phase('observe'):
+                        g.observe()
+                    with self.stats.phase('act'):
+                        g.getAction()
+                        g.setAction()
+
+            res['time'] = pd.DatetimeIndex(res['time'], name='date_time')
+            res['Vpu'] = np.array(res['Vpu'])
+            res['converged'] = np.array(res['converged'])
+            res['monitors'] = {}
+            for (m, _), n in zip(monitors, monNames):
+                df = self.case.read_monitor(n)
+                if len(df) == hours:
+                    df.index = times
+                res['monitors'][m] = df
+        finally:
+            self.case.sensitivity = sensitivity
+        return res
+
     # select a row from profiles
-    def set_profile_row(self, mode):
-        # shared hours in the profiles
-        if self.DEREnable:
-            common_index = self.loadProfile.index.intersection(self.pvProfile.index).intersection(self.windProfile.index)
-        else:
-            common_index = self.loadProfile.index
-            
-        # choose an hour
+    def set_profile_row(self, mode, hourNum = None):
+        # choose an hour of the shared profile index
         if mode == 'sequential':
             if self.hourNum == None:
                 self.hourNum = 0
             else:
                 self.hourNum += 1
         elif mode == 'random':
-            self.hourNum = np.random.choice(range(common_index.size))
+            self.hourNum = np.random.choice(self.commonIndex.size)
+        elif mode == 'fixed':
+            self.hourNum = hourNum
         else:
             raise ValueError(f'Undefined profile indexing mode!')
 
-        self.profileIndex = common_index[self.hourNum]
+        self.profileIndex = self.commonIndex[self.hourNum]
                 
 
     ## Gym standard functions
     # reset a simulation and provide training agent state
-    # mode: sequential/random
-    def reset(self, mode='sequential'):
+    # mode: sequential/random/fixed (hourNum given)
+    # event: fault of the dynamic event, random if None
+    def reset(self, mode='sequential', hourNum=None, event=None):
+        self.stats.new_episode()
+        self.recorder.end_episode(self.episode_info())
+
+        # undo faults, trips and edits of the previous episode, in surrogate
+        # mode only the generators unless the network was changed
+        with self.stats.phase('rollback'):
+            if self.surrogate is not None and self.case.changeCount == self.cleanChanges:
+                self.case.rollback_gens(self.baseState)
+            else:
+                self.case.rollback(self.baseState, solve=False)
+                self.cleanChanges = self.case.changeCount
+                # the surrogate inputs are the setpoints of the table, push
+                # them even where the case file sets the powers differently
+                if self.surrogate is not None:
+                    self.case.genTable.mark_unsynced(['Pg', 'Qg'])
+
+        # trips, timers and observations of the previous episode
+        self.reset_agents()
+        self.randomSeed = np.random.randint(2 ** 31)
+        self.randomStep = None
 
         # get a row number in profile
-        self.set_profile_row(mode)
+        self.set_profile_row(mode, hourNum)
 
         # determine if need to run market
+        marketFlag = 0
         if mode == 'sequential':
             if self.market.isMarketStep():
                 marketFlag = 1
@@ -258,8 +605,10 @@ class env(Env):
                 marketFlag = 0
 
         # simulate the current profile
-        self.new_timestamp(marketFlag, self.profileIndex)
-        
+        self.new_timestamp(marketFlag, self.hourNum, event)
+        if self.trajectory is not None:
+            self.trajectory.new_episode(self.episode_info())
+            self.record_trajectory(0, reset=True)
 
         # return the observation of the agent under training
         if not self.trainingAgentIdx == None:
@@ -281,11 +630,45 @@ class env(Env):
         else:
             done = self.step_ss_snapshots()
 
-        ob_act = self.agents[self.trainingAgentIdx].state
-        R = self.agents[self.trainingAgentIdx].reward
-            
+        if not self.trainingAgentIdx == None:
+            ob_act = self.agents[self.trainingAgentIdx].state
+            R = self.agents[self.trainingAgentIdx].reward
+        else:
+            ob_act = None
+        if self.trajectory is not None:
+            self.record_trajectory(done)
+        self.stats.step()
 
         return ob_act, R, done, {"Agent":self.trainingAgentIdx}
-        
-        
-        
+
+    # timing and engine call statistics of the run, see instrument.runStats
+    def get_stats(self):
+        return self.stats.summary()
+
+    # write the statistics to the export files now, e.g. at the end of a run
+    def export_stats(self):
+        self.stats.new_episode()
+        self.stats.export()
+
+    # profile hour and fault of the current episode, kept with its waveforms
+    def episode_info(self):
+        return {'hour': None if self.hourNum is None else int(self.hourNum),
+                'fault': None if self.fault is None else self.fault.cmd}
+
+    # add the observations, actions and rewards of all agents to the trajectories
+    def record_trajectory(self, done, reset=False):
+        obs = [getattr(a, 'state', None) for a in self.agents]
+        if reset:
+            acts = rews = [None] * self.agentNum
+        else:
+            acts = [a.last_action() for a in self.agents]
+            rews = [getattr(a, 'reward', None) for a in self.agents]
+        timestamp = np.datetime64(self.profileIndex, 'ns').astype(np.int64)
+        self.trajectory.record(self.currStep - 1, self.case.engine.seconds(), timestamp, done, obs, acts, rews)
+
+    # write the recorded waveforms, trajectories and statistics left at the end of a run
+    def close(self):
+        self.recorder.close(self.episode_info())
+        if self.trajectory is not None:
+            self.trajectory.close()
+        self.export_stats()
@@ -0,0 +1,194 @@
+import numpy as np
+import pandas as pd
+
+
+# columns of the generator table
+GEN_FIELDS = ["name", "fuel", "bus", "Pg", "Qg", "Vg", "kVAbase", "Pmin", "Pmax", "Qmin", "Qmax", "Pcost"]
+# columns holding strings, the others are float
+GEN_TEXT = ["name", "fuel", "bus"]
+# columns pushed to the engine by dssCase.sync_gen_df
+GEN_SYNC = ["Pg", "Qg", "Vg"]
+
+
+# struct-of-arrays generator registry
+# one numpy column per field and a name index. The values last pushed to the
+# engine are kept, so only changed rows are synced. Columns are read and
+# written as views, e.g. table['Pmax'][rows] = ..., except the text columns
+# (name, fuel, bus): their views are read-only and they are written with
+# table[field] = ... or set_rows, which keep the name index and the fuel rows
+class genTable():
+    def __init__(self, cols=None, capacity=16):
+        self.num = 0
+        self.cols = {f: np.empty(capacity, dtype=object if f in GEN_TEXT else float) for f in GEN_FIELDS}
+        self.synced = {f: np.empty(capacity) for f in GEN_SYNC}
+        self.nameIdx = {}
+        self.fuelRows = {}
+
+        # initial rows are what the engine already has
+        if cols is not None:
+            for i in range(len(cols['name'])):
+                self.append(synced=True, **{f: cols[f][i] for f in GEN_FIELDS})
+
+    def __len__(self):
+        return self.num
+
+    # view of a column
+    def __getitem__(self, field):
+        col = self.cols[field][:self.num]
+        if field in GEN_TEXT:
+            col = col.view()
+            col.flags.writeable = False
+        return col
+
+    # write a column
+    def __setitem__(self, field, vals):
+        self.set_rows(field, slice(None), vals)
+
+    # write some rows of a column
+    def set_rows(self, field, rows, vals):
+        col = self.cols[field][:self.num]
+        if field in GEN_TEXT:
+            old = col.copy()
+            col[rows] = vals
+            if not np.array_equal(old, col):
+                self.reindex()
+        else:
+            col[rows] = vals
+
+    # name index and fuel rows after a change of the text columns
+    def reindex(self):
+        names = self['name']
+        if len(set(names)) < self.num:
+            raise ValueError(f'Generator names are not unique!')
+        self.nameIdx = {n: i for i, n in enumerate(names)}
+        self.fuelRows = {}
+
+    # double the storage when full, appending stays O(1) on average
+    def grow(self):
+        cap = 2 * max(len(self.cols['name']), 1)
+        for cols in [self.cols, self.synced]:
+            for f, c in cols.items():
+                new = np.empty(cap, dtype=c.dtype)
+                new[:self.num] = c[:self.num]
+                cols[f] = new
+
+    # add a generator, missing fields are 0
+    # synced: the engine already has these values (e.g. parsed or just created)
+    def append(self, synced=False, **kwargs):
+        if kwargs.get('name') in self.nameIdx:
+            raise ValueError(f'Generator {kwargs["name"]} already exists!')
+        if self.num == len(self.cols['name']):
+            self.grow()
+
+        i = self.num
+        for f in GEN_FIELDS:
+            self.cols[f][i] = kwargs.get(f, 0)
+        for f in GEN_SYNC:
+            self.synced[f][i] = self.cols[f][i] if synced else np.nan
+        self.nameIdx[self.cols['name'][i]] = i
+        self.fuelRows = {}
+        self.num += 1
+
+        return i
+
+    # row of a generator
+    def index(self, name):
+        return self.nameIdx[name]
+
+    # rows of a fuel type, cached
+    def fuel_rows(self, fuel):
+        if fuel not in self.fuelRows:
+            self.fuelRows[fuel] = np.flatnonzero(self['fuel'] == fuel)
+        return self.fuelRows[fuel]
+
+    # rows whose synced fields changed since they were last pushed
+    def dirty_rows(self):
+        dirty = np.zeros(self.num, dtype=bool)
+        for f in GEN_SYNC:
+            dirty |= self[f] != self.synced[f][:self.num]
+        return np.flatnonzero(dirty)
+
+    # changed fields of a row
+    def dirty_fields(self, i):
+        return [f for f in GEN_SYNC if self.cols[f][i] != self.synced[f][i]]
+
+    # record rows as pushed to the engine
+    def mark_synced(self, rows):
+        for f in GEN_SYNC:
+            self.synced[f][rows] = self.cols[f][rows]
+
+    # record the fields of every row as unknown to the engine, pushed by the next sync
+    def mark_unsynced(self, fields=GEN_SYNC):
+        for f in fields:
+            self.synced[f][:] = np.nan
+
+    # DataFrame copy of the table
+    def to_frame(self):
+        return pd.DataFrame({f: self[f].copy() for f in GEN_FIELDS})
+
+
+# DataFrame-like view of a generator table, reads and writes go to the table
+# columns, e.g. gens.loc[gens['fuel'] == 'pv', 'Pmax'] = ...
+# rows are positions, to_frame() gives a real (detached) DataFrame
+class genFrame():
+    def __init__(self, table):
+        self.table = table
+        self.loc = genLoc(table)
+
+    def __len__(self):
+        return len(self.table)
+
+    @property
+    def shape(self):
+        return (len(self.table), len(GEN_FIELDS))
+
+    @property
+    def columns(self):
+        return list(GEN_FIELDS)
+
+    def __getitem__(self, field):
+        return self.table[check_field(field)]
+
+    def __setitem__(self, field, vals):
+        self.table[check_field(field)] = vals
+
+    def to_frame(self):
+        return self.table.to_frame()
+
+
+# .loc of a genFrame, indexed by [rows] or [rows, field(s)]
+class genLoc():
+    def __init__(self, table):
+        self.table = table
+
+    @staticmethod
+    def split(key):
+        if isinstance(key, tuple):
+            return key[0], key[1]
+        return key, slice(None)
+
+    @staticmethod
+    def rows(rows):
+        # boolean masks and positions, pandas Series are taken by value
+        return np.asarray(rows) if isinstance(rows, (pd.Series, list)) else rows
+
+    def __getitem__(self, key):
+        rows, fields = self.split(key)
+        if isinstance(fields, str):
+            return self.table[check_field(fields)][self.rows(rows)]
+        fields = GEN_FIELDS if isinstance(fields, slice) else [check_field(f) for f in fields]
+        return pd.DataFrame({f: self.table[f] for f in fields}).iloc[self.rows(rows)]
+
+    def __setitem__(self, key, vals):
+        rows, fields = self.split(key)
+        if not isinstance(fields, str):
+            raise ValueError('Generator table writes take one column, e.g. loc[rows, "Pmax"]!')
+        if isinstance(vals, pd.Series):
+            vals = vals.to_numpy()
+        self.table.set_rows(check_field(fields), self.rows(rows), vals)
+
+
+def check_field(field):
+    if field not in GEN_FIELDS:
+        raise ValueError(f'Unknown generator field {field}!')
+    return field
@@ -0,0 +1,230 @@
+import os, json, time, bisect, collections
+import numpy as np
+from .engine.engine_template import ENGINE_METHODS
+
+
+# upper bounds of the wall time histogram buckets in seconds, 1 us to 10 s
+HIST_BOUNDS = list(10 ** np.arange(-6, 1.5, 0.5))
+
+
+# create the statistics of a run from the 'instrument' parameter of env
+# None/False: disabled, True: enabled without export
+# dict: enabled, {'jsonl': file of one json record per episode,
+#                 'openmetrics': text file of the totals, rewritten,
+#                 'every': episodes between two exports (default 1)}
+def get_stats(opts=None):
+    if opts is None or opts is False:
+        return runStats(enabled=False)
+    if opts is True:
+        return runStats()
+    return runStats(jsonl=opts.get('jsonl'), openmetrics=opts.get('openmetrics'), every=opts.get('every', 1))
+
+
+# timer of a phase, used as 'with stats.phase(name):'
+class phaseTimer():
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.stats.add_time(self.name, time.perf_counter() - self.start)
+        return False
+
+
+# timer of a disabled runStats, does nothing
+class nullTimer():
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+NULL_TIMER = nullTimer()
+
+
+# opt-in run statistics of an env and its dssCase
+# wall time histograms of the phases of a step (apply_profile, market, solve,
+# observe, ...), count and time of every engine call and text commands by verb,
+# totals and per episode. A disabled instance only hands out a no-op timer
+class runStats():
+    def __init__(self, enabled=True, jsonl=None, openmetrics=None, every=1):
+        self.enabled = enabled
+        self.jsonl = jsonl
+        self.openmetrics = openmetrics
+        self.every = every
+
+        # name -> [count, total seconds, bucket counts]
+        self.phases = {}
+        self.timers = {}
+        self.engineCalls = collections.Counter()
+        self.engineTime = collections.Counter()
+        self.commands = collections.Counter()
+        self.stepNum = 0
+        self.episodeNum = 0
+
+        # totals at the start of the current episode and finished episodes
+        self.episodeStart = None
+        self.episodes = collections.deque(maxlen=1000)
+        self.pending = []
+
+    ## RECORDING
+    # timer of a phase
+    def phase(self, name):
+        if not self.enabled:
+            return NULL_TIMER
+        if name not in self.timers:
+            self.timers[name] = phaseTimer(self, name)
+        return self.timers[name]
+
+    def add_time(self, name, dt):
+        if name not in self.phases:
+            self.phases[name] = [0, 0.0, [0] * (len(HIST_BOUNDS) + 1)]
+        p = self.phases[name]
+        p[0] += 1
+        p[1] += dt
+        p[2][bisect.bisect_left(HIST_BOUNDS, dt)] += 1
+
+    # count and time every call to the methods of an engine, the methods are
+    # replaced on the engine object, nothing changes for a disabled runStats
+    def count_engine(self, eng):
+        if not self.enabled:
+            return eng
+        for name in ENGINE_METHODS:
+            setattr(eng, name, self.counted(name, getattr(eng, name)))
+        return eng
+
+    def counted(self, name, fn):
+        calls = self.engineCalls
+        times = self.engineTime
+        commands = self.commands
+
+        def wrapper(*args, **kwargs):
+            t = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                times[name] += time.perf_counter() - t
+                calls[name] += 1
+                if name == 'command':
+                    words = args[0].split(None, 1)
+                    commands[words[0].lower() if len(words) > 0 else ''] += 1
+
+        return wrapper
+
+    # end of an env step
+    def step(self):
+        if self.enabled:
+            self.stepNum += 1
+
+    # start of a new episode, closes the previous one unless nothing happened
+    # since it started
+    def new_episode(self):
+        if not self.enabled:
+            return
+        if self.episodeStart is not None and (self.stepNum > self.episodeStart['steps']
+                                              or dict(self.engineCalls) != self.episodeStart['engine_calls']):
+            self.episodes.append(self.episode_record())
+            self.pending.append(self.episodes[-1])
+            self.episodeNum += 1
+            if self.episodeNum % self.every == 0:
+                self.export()
+        self.episodeStart = self.totals()
+
+    ## STATISTICS
+    def totals(self):
+        return {'time': time.perf_counter(),
+                'steps': self.stepNum,
+                'phases': {n: p[1] for n, p in self.phases.items()},
+                'engine_calls': dict(self.engineCalls),
+                'commands': dict(self.commands)}
+
+    # changes since the start of the episode
+    def episode_record(self):
+        start = self.episodeStart
+        now = self.totals()
+        steps = now['steps'] - start['steps']
+        calls = {n: c - start['engine_calls'].get(n, 0) for n, c in now['engine_calls'].items()}
+        calls = {n: c for n, c in calls.items() if c > 0}
+        commands = {n: c - start['commands'].get(n, 0) for n, c in now['commands'].items()}
+        commands = {n: c for n, c in commands.items() if c > 0}
+        callNum = sum(calls.values())
+        commandNum = sum(commands.values())
+        return {'episode': self.episodeNum,
+                'wall_s': now['time'] - start['time'],
+                'steps': steps,
+                'phases_s': {n: t - start['phases'].get(n, 0.0) for n, t in now['phases'].items()},
+                'engine_calls': callNum,
+                'commands': commandNum,
+                'engine_calls_per_step': callNum / steps if steps > 0 else None,
+                'commands_per_step': commandNum / steps if steps > 0 else None,
+                'engine_calls_by_method': calls,
+                'commands_by_verb': commands}
+
+    # all statistics so far
+    def summary(self):
+        phases = {}
+        for n, (count, total, hist) in self.phases.items():
+            phases[n] = {'count': count,
+                         'total_s': total,
+                         'mean_s': total / count,
+                         'hist': {f'{b:.3g}': c for b, c in zip(HIST_BOUNDS + [np.inf], hist)}}
+        engine = {n: {'count': c, 'total_s': self.engineTime[n]} for n, c in self.engineCalls.items()}
+        callNum = sum(self.engineCalls.values())
+        commandNum = sum(self.commands.values())
+        return {'enabled': self.enabled,
+                'steps': self.stepNum,
+                'episodes': self.episodeNum,
+                'phases': phases,
+                'engine': engine,
+                'commands': dict(self.commands),
+                'engine_calls_per_step': callNum / self.stepNum if self.stepNum > 0 else None,
+                'commands_per_step': commandNum / self.stepNum if self.stepNum > 0 else None,
+                'last_episode': self.episodes[-1] if len(self.episodes) > 0 else None}
+
+    ## EXPORT
+    def export(self):
+        if self.jsonl is not None and len(self.pending) > 0:
+            with open(self.jsonl, 'a') as fh:
+                for r in self.pending:
+                    fh.write(json.dumps(r) + '\n')
+        self.pending = []
+        if self.openmetrics is not None:
+            tmp = self.openmetrics + f'.tmp{os.getpid()}'
+            with open(tmp, 'w') as fh:
+                fh.write(self.openmetrics_text())
+            os.replace(tmp, self.openmetrics)
+
+    # totals in the OpenMetrics text format
+    def openmetrics_text(self):
+        lines = ['# TYPE ai4dist_phase_seconds histogram',
+                 '# HELP ai4dist_phase_seconds Wall time of the phases of env steps.']
+        for n, (count, total, hist) in self.phases.items():
+            cum = 0
+            for b, c in zip(HIST_BOUNDS, hist):
+                cum += c
+                lines.append(f'ai4dist_phase_seconds_bucket{{phase="{n}",le="{b:.3g}"}} {cum}')
+            lines.append(f'ai4dist_phase_seconds_bucket{{phase="{n}",le="+Inf"}} {count}')
+            lines.append(f'ai4dist_phase_seconds_sum{{phase="{n}"}} {total}')
+            lines.append(f'ai4dist_phase_seconds_count{{phase="{n}"}} {count}')
+
+        lines += ['# TYPE ai4dist_engine_calls counter',
+                  '# HELP ai4dist_engine_calls Calls to the solver engine.']
+        lines += [f'ai4dist_engine_calls_total{{method="{n}"}} {c}' for n, c in self.engineCalls.items()]
+        lines += ['# TYPE ai4dist_engine_seconds counter',
+                  '# HELP ai4dist_engine_seconds Wall time spent in the solver engine.']
+        lines += [f'ai4dist_engine_seconds_total{{method="{n}"}} {t}' for n, t in self.engineTime.items()]
+        lines += ['# TYPE ai4dist_commands counter',
+                  '# HELP ai4dist_commands DSS text commands by verb.']
+        lines += [f'ai4dist_commands_total{{verb="{n}"}} {c}' for n, c in self.commands.items()]
+        lines += ['# TYPE ai4dist_steps counter',
+                  f'ai4dist_steps_total {self.stepNum}',
+                  '# TYPE ai4dist_episodes counter',
+                  f'ai4dist_episodes_total {self.episodeNum}',
+                  '# EOF']
+        return '\n'.join(lines) + '\n'
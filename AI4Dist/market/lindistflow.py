@@ -0,0 +1,99 @@
+import numpy as np
+import scipy.sparse as sp
+
+
+# convert a flat [Re1, Im1, Re2, Im2, ...] array from the engine to complex
+def to_complex(arr):
+    arr = np.asarray(arr, dtype=float)
+    return arr[0::2] + 1j * arr[1::2]
+
+
+# positive sequence series impedance (ohm) of the active element, from the
+# self admittance block of its first terminal (phase conductors only)
+def series_impedance(engine):
+    nodes = np.array(engine.elmt_node_order())
+    termNum = len(engine.elmt_bus_names())
+    cond = len(nodes) // termNum
+    Y = to_complex(engine.elmt_yprim()).reshape(len(nodes), len(nodes))
+    idx = [k for k in range(cond) if nodes[k] in (1, 2, 3)]
+    if len(idx) == 0:
+        return 0j, 1
+    Y = Y[np.ix_(idx, idx)]
+    n = len(idx)
+    if n == 1:
+        y = Y[0, 0]
+    else:
+        y = np.trace(Y) / n - (Y.sum() - np.trace(Y)) / (n * (n - 1))
+    return 1 / y if abs(y) > 0 else 0j, n
+
+
+# linearized (LinDistFlow) model of the radial tree of a case in per unit
+# squared bus voltages are v = v0 - 2 M^T (r * (M p) + x * (M q)) with p, q the
+# net demand of every bus, r, x the impedance of the branch above every bus
+# and M the sparse subtree incidence (branch above bus i carries the demand of
+# the subtree of i). Built once per case from the topology index and the
+# primitive admittances of lines and transformers, single and two phase
+# branches are scaled to the three phase equivalent
+# Sbase: kVA, powers are given in kW/kvar
+class linDistFlow():
+    def __init__(self, case, Sbase=1000):
+        self.case = case
+        self.Sbase = Sbase
+        self.busNum = case.busNum
+        topo = case.topo
+        engine = case.engine
+        reg = case.registry
+
+        # series admittance between every bus and its parent, parallel elements add up
+        y = np.zeros(self.busNum, dtype=complex)
+        self.kVbase = np.zeros(self.busNum)
+        for i, b in enumerate(case.busNames):
+            engine.set_active_bus(b)
+            self.kVbase[i] = engine.bus_kv_base()
+        for name in case.pdNames:
+            if name.split('.')[0] not in ['line', 'transformer']:
+                continue
+            engine.set_active_element(name)
+            buses = engine.elmt_bus_names()
+            F, T = reg.bus(buses[0]), reg.bus(buses[1])
+            child = T if topo.parent[T] == F else F if topo.parent[F] == T else -1
+            if child < 0:
+                continue
+            z, n = series_impedance(engine)
+            Zbase = (self.kVbase[F] * 1000) ** 2 / (Sbase * 1000 / 3)
+            if abs(z) > 0:
+                y[child] += 1 / (z / Zbase * 3 / n)
+        z = np.divide(1, y, out=np.zeros_like(y), where=np.abs(y) > 0)
+        self.r = z.real
+        self.x = z.imag
+
+        # subtree incidence, row e has the buses below the branch above e
+        # (the source has no branch above, r[0] = x[0] = 0)
+        rows = np.repeat(np.arange(self.busNum), topo.tout - np.minimum(topo.tin, topo.tout))
+        cols = np.concatenate([topo.subtree(e) for e in range(self.busNum)])
+        self.M = sp.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(self.busNum, self.busNum))
+        self.MT = self.M.T.tocsr()
+
+        # bus of every load
+        self.loadBus = np.zeros(case.loadNum, dtype=int)
+        for i, n in enumerate(case.loadNames):
+            engine.set_active_element(f'load.{n}')
+            self.loadBus[i] = reg.bus(engine.elmt_bus_names()[0])
+
+    # net demand (kW/kvar) per bus of the loads
+    def bus_demand(self, loadP, loadQ):
+        p = np.bincount(self.loadBus, weights=loadP, minlength=self.busNum)
+        q = np.bincount(self.loadBus, weights=loadQ, minlength=self.busNum)
+        return p, q
+
+    # squared voltages (pu) for the net demand p, q (kW/kvar per bus)
+    def voltages(self, p, q, v0=1.0):
+        P = self.M @ (p / self.Sbase)
+        Q = self.M @ (q / self.Sbase)
+        return v0 ** 2 - 2 * (self.MT @ (self.r * P + self.x * Q))
+
+    # change of the squared voltages per kW and kvar injected at the buses
+    # (busNum x len(buses) each)
+    def sensitivities(self, buses):
+        cols = self.M[:, buses].toarray() / self.Sbase
+        return 2 * (self.MT @ (self.r[:, None] * cols)), 2 * (self.MT @ (self.x[:, None] * cols))
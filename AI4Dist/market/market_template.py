@@ -1,3 +1,4 @@
+import numpy as np
 
 
 # basic template of a market
@@ -18,8 +19,271 @@ class market():
         return 0
 
 
+    # write the dispatch of the last clearing into the generator table again,
+    # on steps that do not clear (the table may have been rolled back)
+    def apply_dispatch(self):
+        return
+
+
+    # called by the environment after the power flow of a cleared interval
+    def observe_solution(self):
+        return
+
+
 
 # do nothing market
 class DoNothingMarket(market):
     pass
 
+
+
+# cost of reactive power in the market dispatch, per kvar
+Q_COST = 1e-6
+
+
+# economic dispatch over the generator table on a LinDistFlow model of the case
+# every market step dispatches the cheapest generation within Pmin/Pmax
+# (clipped to the kVA rating, at least 0) and Qmin/Qmax (none for pv), that
+# keeps the bus voltages within [Vmin, Vmax]. The source supplies the rest of
+# the demand at sourcePrice. Voltage limits are soft (penalty per pu^2 of violation)
+# Intervals are cleared incrementally:
+#   - demand and renewable availability within tol (fraction of the total
+#     demand) of the last cleared interval: the dispatch is kept
+#   - merit order dispatch, kept if it meets every limit
+#   - the optimal basis of the last LP, only the right hand sides (demand,
+#     bounds) change between intervals so it stays optimal while it is feasible
+#   - otherwise an LP (scipy, HiGHS) starting with the voltage limits binding
+#     in the last interval, violated limits are added until none is left
+# model voltages are corrected by their gap to the power flow of the last dispatch
+# interval: number of market steps (isMarketStep calls) between clearings
+class OPFMarket(market):
+    def __init__(self, interval=1, sourcePrice=0.05, Vmin=0.95, Vmax=1.05, tol=0.01, penalty=1e6, Sbase=1000):
+        self.interval = interval
+        self.sourcePrice = sourcePrice
+        self.Vmin = Vmin
+        self.Vmax = Vmax
+        self.tol = tol
+        self.penalty = penalty
+        self.Sbase = Sbase
+        self.case = None
+        self.model = None
+        self.stepCount = 0
+        # number of clearings by the way they were solved
+        self.counts = {'skip': 0, 'merit': 0, 'warm': 0, 'lp': 0}
+
+    def update_case(self, dssCase):
+        if self.model is None or self.model.case is not dssCase:
+            from .lindistflow import linDistFlow
+            self.model = linDistFlow(dssCase, self.Sbase)
+            self.genNum = 0
+        self.case = dssCase
+
+    def isMarketStep(self):
+        self.stepCount += 1
+        return (self.stepCount - 1) % self.interval == 0
+
+    # generators of the case and their sensitivities, again when generators are added
+    def build_gens(self):
+        gens = self.case.genTable
+        self.genNum = len(gens)
+        self.srcRow = gens.fuel_rows('source')[0]
+        self.rows = np.flatnonzero(gens['fuel'] != 'source')
+        self.genBus = self.case.registry.ids_of('bus', gens['bus'][self.rows])
+        self.Sp, self.Sq = self.model.sensitivities(self.genBus)
+        self.renewable = np.isin(gens['fuel'][self.rows], ['pv', 'wind'])
+        # buses whose voltage the dispatch can change
+        self.controllable = (np.abs(self.Sp).sum(axis=1) + np.abs(self.Sq).sum(axis=1)) > 0
+        self.last = None
+        self.basis = {'low': np.zeros(0, dtype=int), 'high': np.zeros(0, dtype=int)}
+        self.bias = np.zeros(self.model.busNum)
+
+        # node to bus of the snapshot, for the voltages of the last solution
+        nodeBus = np.zeros(self.case.nodeNum, dtype=int)
+        for b, s in self.case.busNodeSlice.items():
+            nodeBus[s] = self.case.registry.bus(b)
+        self.nodeBus = nodeBus
+        self.nodeCount = np.bincount(nodeBus, minlength=self.model.busNum)
+
+    # dispatch bounds of the generators, generators do not draw power
+    def bounds(self):
+        gens = self.case.genTable
+        rows = self.rows
+        S = gens['kVAbase'][rows]
+        lo = np.maximum(gens['Pmin'][rows], 0)
+        hi = np.maximum(np.minimum(gens['Pmax'][rows], S), lo)
+        qlo = np.maximum(gens['Qmin'][rows], -S)
+        qhi = np.maximum(np.minimum(gens['Qmax'][rows], S), qlo)
+        # pv systems are synced as a rating and a power factor, no reactive dispatch
+        qlo[self.renewable] = 0
+        qhi[self.renewable] = 0
+        return lo, hi, qlo, qhi
+
+    # buses with a voltage limit violated at the dispatch pg, qg
+    def violations(self, vBase, pg, qg):
+        v = vBase + self.Sp @ pg + self.Sq @ qg
+        low = np.flatnonzero(self.controllable & (v < self.Vmin ** 2 - 1e-9))
+        high = np.flatnonzero(self.controllable & (v > self.Vmax ** 2 + 1e-9))
+        return low, high
+
+    # clear the market and write Pg/Qg into the generator table
+    def get_dispatch(self):
+        gens = self.case.genTable
+        if len(gens) != self.genNum:
+            self.build_gens()
+        pd, qd = self.model.bus_demand(self.case.loadKW, self.case.loadKvar)
+        lo, hi, qlo, qhi = self.bounds()
+
+        # skip if the interval barely changed
+        if self.last is not None:
+            change = sum(np.abs(a - b).sum() for a, b in zip((pd, qd, lo, hi), self.last['inputs']))
+            if change <= self.tol * max(np.abs(pd).sum(), 1):
+                self.counts['skip'] += 1
+                self.apply_dispatch()
+                return
+
+        lp = {'cost': gens['Pcost'][self.rows] - self.sourcePrice, 'lo': lo, 'hi': hi, 'qlo': qlo, 'qhi': qhi,
+              'D': pd.sum(), 'srcLo': gens['Pmin'][self.srcRow], 'srcHi': gens['Pmax'][self.srcRow],
+              'vBase': self.model.voltages(pd, qd, gens['Vg'][self.srcRow]) + self.bias}
+
+        # merit order: generators cheaper than the source at their maximum
+        pg = np.where(lp['cost'] < 0, hi, lo)
+        qg = np.clip(self.last['qg'] if self.last is not None else np.zeros(len(self.rows)), qlo, qhi)
+        low, high = self.violations(lp['vBase'], pg, qg)
+        res = None
+        if len(low) == 0 and len(high) == 0 and lp['srcLo'] <= lp['D'] - pg.sum() <= lp['srcHi']:
+            self.counts['merit'] += 1
+        else:
+            # optimal basis of the last interval, only the right hand sides changed
+            res = self.warm_start(lp)
+            if res is not None:
+                self.counts['warm'] += 1
+            else:
+                res = self.solve_lp(lp)
+                self.counts['lp'] += 1
+            pg, qg = res
+
+        gens['Pg'][self.rows] = pg
+        gens['Qg'][self.rows] = qg
+        gens['Pg'][self.srcRow] = lp['D'] - pg.sum()
+        self.last = {'inputs': (pd, qd, lo, hi), 'pd': pd, 'qd': qd, 'pg': pg, 'qg': qg}
+
+    # last dispatch within the current bounds, the source supplies the rest of
+    # the current demand
+    def apply_dispatch(self):
+        if self.last is None or len(self.case.genTable) != self.genNum:
+            return
+        gens = self.case.genTable
+        lo, hi, qlo, qhi = self.bounds()
+        pg = np.clip(self.last['pg'], lo, hi)
+        gens['Pg'][self.rows] = pg
+        gens['Qg'][self.rows] = np.clip(self.last['qg'], qlo, qhi)
+        gens['Pg'][self.srcRow] = self.case.loadKW.sum() - pg.sum()
+
+    # dispatch LP with the voltage limits of the buses low and high
+    # variables: pg, qg as injection and absorption (qp - qn, with a tiny cost
+    # so that reactive power is only used against a voltage limit), one slack
+    # per voltage limit
+    # rows: lower voltage limits, upper voltage limits, source limits
+    def lp_rows(self, lp, low, high):
+        k = len(self.rows)
+        m = len(low) + len(high)
+        A = np.zeros((m + 2, 3 * k + m))
+        b = np.zeros(m + 2)
+        A[:len(low), :k] = -self.Sp[low]
+        A[:len(low), k:2 * k] = -self.Sq[low]
+        A[:len(low), 2 * k:3 * k] = self.Sq[low]
+        b[:len(low)] = lp['vBase'][low] - self.Vmin ** 2
+        A[len(low):m, :k] = self.Sp[high]
+        A[len(low):m, k:2 * k] = self.Sq[high]
+        A[len(low):m, 2 * k:3 * k] = -self.Sq[high]
+        b[len(low):m] = self.Vmax ** 2 - lp['vBase'][high]
+        A[np.arange(m), 3 * k + np.arange(m)] = -1
+        A[m, :k] = -1
+        b[m] = lp['srcHi'] - lp['D']
+        A[m + 1, :k] = 1
+        b[m + 1] = lp['D'] - lp['srcLo']
+        L = np.concatenate([lp['lo'], np.maximum(lp['qlo'], 0), np.maximum(-lp['qhi'], 0), np.zeros(m)])
+        U = np.concatenate([lp['hi'], np.maximum(lp['qhi'], 0), np.maximum(-lp['qlo'], 0), np.full(m, np.inf)])
+        c = np.concatenate([lp['cost'], np.full(2 * k, Q_COST), np.full(m, self.penalty)])
+        return A, b, L, U, c
+
+    # solve the LP, starting with the voltage limits binding in the last
+    # interval and adding the violated ones until none is left
+    def solve_lp(self, lp):
+        from scipy.optimize import linprog
+
+        k = len(self.rows)
+        low, high = self.basis['low'], self.basis['high']
+        for it in range(20):
+            A, b, L, U, c = self.lp_rows(lp, low, high)
+            m = len(low) + len(high)
+            res = linprog(c, A_ub=A, b_ub=b, bounds=np.stack([L, np.where(np.isinf(U), None, U)], axis=1),
+                          method='highs')
+            if res.status != 0:
+                print(f'Warning: market dispatch LP failed ({res.message}), the dispatch is not changed')
+                return self.case.genTable['Pg'][self.rows].copy(), self.case.genTable['Qg'][self.rows].copy()
+            pg, qg = res.x[:k], res.x[k:2 * k] - res.x[2 * k:3 * k]
+
+            newLow, newHigh = self.violations(lp['vBase'], pg, qg)
+            newLow, newHigh = np.setdiff1d(newLow, low), np.setdiff1d(newHigh, high)
+            if len(newLow) == 0 and len(newHigh) == 0:
+                break
+            low = np.union1d(low, newLow)
+            high = np.union1d(high, newHigh)
+
+        # keep the optimal basis: binding rows, variables held at a bound by
+        # their reduced cost, the other variables are given by the binding rows.
+        # Variables without reduced cost sitting at a bound complete the basis
+        x = res.x
+        binding = np.abs(res.ineqlin.marginals) > 1e-12
+        atLo = np.abs(res.lower.marginals) > 1e-12
+        atHi = np.abs(res.upper.marginals) > 1e-12
+        free = np.flatnonzero(~(atLo | atHi))
+        extra = len(free) - binding.sum()
+        if extra > 0:
+            onLo = free[np.abs(x[free] - L[free]) <= 1e-9 * np.maximum(np.abs(L[free]), 1)]
+            onHi = free[np.isfinite(U[free]) & (np.abs(x[free] - U[free]) <= 1e-9 * np.maximum(np.abs(U[free]), 1))]
+            onHi = np.setdiff1d(onHi, onLo)
+            atLo[onLo[:extra]] = True
+            atHi[onHi[:max(extra - len(onLo), 0)]] = True
+        keep = binding[:m]
+        self.basis = {'low': low[keep[:len(low)]], 'high': high[keep[len(low):]], 'cost': lp['cost'].copy()}
+        if (~(atLo | atHi)).sum() == binding.sum():
+            self.basis.update({'lowAll': low, 'highAll': high, 'atLo': atLo, 'atHi': atHi, 'binding': binding})
+        return pg, qg
+
+    # dispatch of the last optimal basis at the new demand and bounds, None if
+    # the basis is not optimal anymore (a bound or a limit is violated)
+    def warm_start(self, lp):
+        basis = self.basis
+        if 'atLo' not in basis or not np.array_equal(basis['cost'], lp['cost']):
+            return None
+        A, b, L, U, _ = self.lp_rows(lp, basis['lowAll'], basis['highAll'])
+        x = np.where(basis['atLo'], L, np.where(basis['atHi'], U, 0))
+        free = ~(basis['atLo'] | basis['atHi'])
+        B = basis['binding']
+        if free.any():
+            try:
+                x[free] = np.linalg.solve(A[np.ix_(B, free)], b[B] - A[B][:, ~free] @ x[~free])
+            except np.linalg.LinAlgError:
+                return None
+        if (x < L - 1e-7).any() or (x > U + 1e-7).any() or (A @ x > b + 1e-7).any():
+            return None
+
+        k = len(self.rows)
+        pg, qg = x[:k], x[k:2 * k] - x[2 * k:3 * k]
+        low, high = self.violations(lp['vBase'], pg, qg)
+        if len(np.setdiff1d(low, basis['lowAll'])) > 0 or len(np.setdiff1d(high, basis['highAll'])) > 0:
+            return None
+        return pg, qg
+
+    # correct the model voltages by their gap to the power flow of the last dispatch
+    def observe_solution(self):
+        if self.last is None or self.case.snapVmag.size != len(self.nodeBus):
+            return
+        Vpu = np.bincount(self.nodeBus, weights=self.case.snapVmag, minlength=self.model.busNum)
+        Vpu = Vpu / np.maximum(self.nodeCount, 1) / (self.model.kVbase * 1000)
+        gens = self.case.genTable
+        v = self.model.voltages(self.last['pd'], self.last['qd'], gens['Vg'][self.srcRow])
+        v += self.Sp @ gens['Pg'][self.rows] + self.Sq @ gens['Qg'][self.rows]
+        self.bias = np.where(self.nodeCount > 0, Vpu ** 2 - v, 0)
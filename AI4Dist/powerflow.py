@@ -0,0 +1,460 @@
+import numpy as np
+
+
+# element classes that form the network admittance of the sweep solver
+# (loads, generators and PV are handled as nonlinear current injections,
+# faults and control elements are ignored)
+PD_CLASSES = ['line', 'transformer', 'capacitor', 'reactor']
+
+# OpenDSS load models understood by the sweep solver, anything else is constant PQ
+# 1: constant PQ, 2: constant Z, 4: CVR (exponential), 5: constant current magnitude
+LOAD_MODELS = [1, 2, 4, 5]
+
+# OpenDSS generator models understood by the sweep solver, anything else is
+# constant PQ with a warning
+# 1: constant PQ, 2: constant Z, 3: PV bus (kvar holds the positive sequence
+# voltage at Vpu within Minkvar/Maxkvar)
+GEN_MODELS = [1, 2, 3]
+
+# per unit voltage below which every load is constant Z (OpenDSS Vlowpu default)
+VLOW = 0.5
+
+
+# convert a flat [Re1, Im1, Re2, Im2, ...] array from the engine to complex
+def to_complex(arr):
+    arr = np.asarray(arr, dtype=float)
+    return arr[0::2] + 1j * arr[1::2]
+
+
+# Three-phase backward/forward sweep power flow on the radial ordering of a dssCase
+# The admittances of lines, transformers and capacitors are read from the engine
+# once and reduced bus by bus from the leaves to the source along the reversed DFS
+# edge order (backward sweep). Voltages are then recovered from the source down to
+# the leaves (forward sweep). Loads, generators and PV are current injections that
+# are updated between sweeps until the voltages settle, the kvar of PV bus
+# generators along with them.
+# Every injection carries a trailing snapshot axis, so N load/DER snapshots are
+# solved together in one vectorized call. Regulator taps are frozen at the
+# operating point of the case when the solver is built.
+# PV bus generators hold their voltage target exactly, OpenDSS stops adjusting
+# their kvar at its own solution tolerance. Between the kvar limits the two
+# solutions can differ by that remaining voltage mismatch.
+class sweepSolver():
+    def __init__(self, case, tol=1e-6, max_iter=50):
+        self.case = case
+        self.engine = case.engine
+        self.tol = tol
+        self.max_iter = max_iter
+
+        # pull the network from the engine once
+        self.build_nodes()
+        self.build_tree()
+        self.build_network()
+        self.build_injections()
+
+        # reduce the network along the radial ordering
+        self.factorize()
+        self.build_pv_gens()
+
+    ## NETWORK DATA
+    # index every node as (bus, slot), each bus padded to the same number of slots
+    def build_nodes(self):
+        self.busNum = self.case.busNum
+        self.busIdx = self.case.registry.ids['bus']
+        self.slotNum = max(len(p) for p in self.case.busPhases)
+        self.groundIdx = self.busNum * self.slotNum
+
+        # map (bus, node) to the flat slot index
+        self.slotIdx = {}
+        self.nodeNames = []
+        self.nodeSlots = []
+        self.Vbase = []
+        for i, n in enumerate(self.case.busNames):
+            self.engine.set_active_bus(n)
+            baseV = self.engine.bus_kv_base() * 1000
+            for j, p in enumerate(self.case.busPhases[i]):
+                self.slotIdx[(i, p)] = i * self.slotNum + j
+                self.nodeNames.append(f'{n}.{p}')
+                self.nodeSlots.append(i * self.slotNum + j)
+                self.Vbase.append(baseV)
+        self.nodeSlots = np.array(self.nodeSlots)
+        self.nodeNum = len(self.nodeNames)
+        self.Vbase = np.array(self.Vbase)
+
+    # parent and depth of every bus from the topology index of the case
+    def build_tree(self):
+        self.parent = self.case.topo.parent.copy()
+        self.depth = self.case.topo.depth.copy()
+
+        orphans = [self.case.busNames[i] for i in range(1, self.busNum) if self.parent[i] < 0]
+        if len(orphans) > 0:
+            raise ValueError(f'Buses {orphans} are not connected to the source!')
+
+        # buses grouped by depth and sorted by parent, the sweeps go through one
+        # level at a time and sum the children of each parent with reduceat
+        self.levels = []
+        for d in range(1, self.depth.max() + 1):
+            idx = np.where(self.depth == d)[0]
+            idx = idx[np.argsort(self.parent[idx], kind='stable')]
+            par, start = np.unique(self.parent[idx], return_index=True)
+            self.levels.append((idx, self.parent[idx], par, start))
+
+    # flat slot index of every conductor of the active element (groundIdx for node 0)
+    def element_slots(self):
+        buses = self.engine.elmt_bus_names()
+        nodes = self.engine.elmt_node_order()
+        condNum = int(len(nodes) / len(buses))
+        slots = []
+        for c, n in enumerate(nodes):
+            if n == 0:
+                slots.append(self.groundIdx)
+            else:
+                bus = self.busIdx[buses[c // condNum].split('.')[0].lower()]
+                slots.append(self.slotIdx[(bus, n)])
+        return np.array(slots)
+
+    # stamp the primitive admittances into diagonal (bus) and off-diagonal (branch) blocks
+    def build_network(self):
+        m = self.slotNum
+        self.Ydiag = np.zeros((self.busNum, m, m), dtype=complex)
+        Yoff = {}
+        self.Jsrc = np.zeros(self.groundIdx + 1, dtype=complex)
+
+        for name in self.engine.element_names():
+            cls = name.split('.')[0].lower()
+            if cls not in PD_CLASSES and cls != 'vsource':
+                continue
+            self.engine.set_active_element(name)
+            slots = self.element_slots()
+            Y = to_complex(self.engine.elmt_yprim()).reshape(len(slots), len(slots))
+
+            # equivalent source current of the voltage source (Norton)
+            if cls == 'vsource':
+                self.Jsrc[slots] += Y @ self.source_emf(len(slots))
+
+            for a in range(len(slots)):
+                if slots[a] == self.groundIdx:
+                    continue
+                ba, sa = divmod(slots[a], m)
+                for b in range(len(slots)):
+                    if slots[b] == self.groundIdx:
+                        continue
+                    bb, sb = divmod(slots[b], m)
+                    if ba == bb:
+                        self.Ydiag[ba, sa, sb] += Y[a, b]
+                    else:
+                        Yoff.setdefault((ba, bb), np.zeros((m, m), dtype=complex))[sa, sb] += Y[a, b]
+        self.Jsrc = self.Jsrc[:-1]
+
+        # unused slots get a unit admittance so that their voltage stays zero
+        for i in range(self.busNum):
+            for j in range(len(self.case.busPhases[i]), m):
+                self.Ydiag[i, j, j] = 1
+
+        # off-diagonal blocks must be between a bus and its parent
+        self.Yup = np.zeros((self.busNum, m, m), dtype=complex)
+        self.Ydown = np.zeros((self.busNum, m, m), dtype=complex)
+        for (a, b), Y in Yoff.items():
+            if self.parent[b] == a:
+                self.Yup[b] = Y
+            elif self.parent[a] == b:
+                self.Ydown[a] = Y
+            else:
+                raise ValueError(f'Sweep solver requires a radial network, buses {self.case.busNames[a]} and {self.case.busNames[b]} form a loop!')
+
+    # internal EMF of the active voltage source, conductor by conductor
+    def source_emf(self, condNum):
+        self.engine.first('vsources')
+        phases = self.engine.get('vsources', 'Phases')
+        Vmag = self.engine.get('vsources', 'pu') * self.engine.get('vsources', 'BasekV') * 1000
+        if phases > 1:
+            Vmag = Vmag / np.sqrt(3)
+        angle = np.deg2rad(self.engine.get('vsources', 'AngleDeg') - 120 * np.arange(phases))
+        E = np.zeros(condNum, dtype=complex)
+        E[:phases] = Vmag * np.exp(1j * angle)
+        return E
+
+    # load, generator and PV branches as (from slot, to slot) current injections
+    def build_injections(self):
+        fields = ['na', 'nb', 'S', 'Vnom', 'model', 'vmin', 'vmax', 'cvrw', 'cvrv', 'owner']
+        br = {key: [] for key in fields}
+
+        # loads
+        self.loadNames = self.engine.names('loads')
+        self.loadNum = len(self.loadNames)
+        self.engine.first('loads')
+        for i in range(self.loadNum):
+            self.engine.set_active_element(f'load.{self.loadNames[i]}')
+            slots = self.element_slots()
+            phases = self.engine.get('loads', 'Phases')
+            kV = self.engine.get('loads', 'kV')
+            if self.engine.get('loads', 'IsDelta'):
+                pairs = [(slots[0], slots[1])] if phases == 1 else [(slots[k], slots[(k+1) % phases]) for k in range(phases)]
+                Vnom = kV * 1000
+            else:
+                neutral = slots[phases] if len(slots) > phases else self.groundIdx
+                pairs = [(slots[k], neutral) for k in range(phases)]
+                Vnom = kV * 1000 / (np.sqrt(3) if phases > 1 else 1)
+
+            S = (self.engine.get('loads', 'kW') + 1j * self.engine.get('loads', 'kvar')) * 1000 / phases
+            model = self.engine.get('loads', 'Model')
+            for a, b in pairs:
+                br['na'].append(a)
+                br['nb'].append(b)
+                br['S'].append(S)
+                br['Vnom'].append(Vnom)
+                br['model'].append(model if model in LOAD_MODELS else 1)
+                br['vmin'].append(self.engine.get('loads', 'Vminpu'))
+                br['vmax'].append(self.engine.get('loads', 'Vmaxpu'))
+                br['cvrw'].append(self.engine.get('loads', 'CVRwatts'))
+                br['cvrv'].append(self.engine.get('loads', 'CVRvars'))
+                br['owner'].append(i)
+            self.engine.next('loads')
+        self.loadBranchNum = len(br['na'])
+
+        # generators and PV as negative loads, same order as genDF
+        self.genNames = []
+        # PV bus generators: generator index, slots of the phases, voltage target, kvar limits
+        pv = {key: [] for key in ['gen', 'slots', 'Vtarget', 'Qmin', 'Qmax']}
+        for cls, prefix in [('generators', 'generator'), ('pvsystems', 'pvsystem')]:
+            self.engine.first(cls)
+            for i in range(self.engine.count(cls)):
+                name = self.engine.get(cls, 'Name')
+                S = -(self.engine.get(cls, 'kW') + 1j * self.engine.get(cls, 'kvar')) * 1000
+                model = self.engine.get(cls, 'Model') if cls == 'generators' else 1
+                if model not in GEN_MODELS:
+                    print(f'Warning: generator {name} model {model} is solved as constant PQ!')
+                    model = 1
+                elmt = f'{prefix}.{name}'
+                self.engine.set_active_element(elmt)
+                slots = self.element_slots()
+                phases = int(self.engine.get_property(elmt, 'phases'))
+                S = S / phases
+                # connected like the loads, delta between the phases or wye to the neutral
+                kV = float(self.engine.get_property(elmt, 'kV'))
+                Vln = kV * 1000 / (np.sqrt(3) if phases > 1 else 1)
+                if self.engine.get_property(elmt, 'conn').lower().startswith('d'):
+                    pairs = [(slots[0], slots[1])] if phases == 1 else [(slots[k], slots[(k+1) % phases]) for k in range(phases)]
+                    Vnom = kV * 1000
+                else:
+                    neutral = slots[phases] if len(slots) > phases else self.groundIdx
+                    pairs = [(slots[k], neutral) for k in range(phases)]
+                    Vnom = Vln
+                if model == 3:
+                    pv['gen'].append(len(self.genNames))
+                    pv['slots'].append(slots[:phases])
+                    pv['Vtarget'].append(float(self.engine.get_property(elmt, 'Vpu')) * Vln)
+                    pv['Qmin'].append(float(self.engine.get_property(elmt, 'Minkvar')) * 1000)
+                    pv['Qmax'].append(float(self.engine.get_property(elmt, 'Maxkvar')) * 1000)
+                for a, b in pairs:
+                    br['na'].append(a)
+                    br['nb'].append(b)
+                    br['S'].append(S)
+                    br['Vnom'].append(Vnom)
+                    br['model'].append(2 if model == 2 else 1)
+                    br['vmin'].append(float(self.engine.get_property(elmt, 'Vminpu')))
+                    br['vmax'].append(float(self.engine.get_property(elmt, 'Vmaxpu')))
+                    br['cvrw'].append(1)
+                    br['cvrv'].append(2)
+                    br['owner'].append(len(self.genNames))
+                self.genNames.append(name)
+                self.engine.next(cls)
+        self.genNum = len(self.genNames)
+        self.pv = pv
+
+        for key in fields:
+            setattr(self, 'br_' + key, np.array(br[key]))
+        self.br_S = self.br_S.astype(complex)
+        self.br_Vnom = self.br_Vnom.astype(float)
+
+        # every branch draws its current from na and returns it to nb, sort both
+        # ends by slot so the injections are gathered with one reduceat
+        ends = np.concatenate([self.br_na, self.br_nb])
+        self.injOrder = np.argsort(ends, kind='stable')
+        self.injSign = np.concatenate([-np.ones(len(self.br_na)), np.ones(len(self.br_nb))])[self.injOrder, None]
+        self.injSlots, self.injStart = np.unique(ends[self.injOrder], return_index=True)
+
+    # PV bus generators and the sensitivity of their positive sequence voltage
+    # to their own kvar, from the no load solution of the network
+    def build_pv_gens(self):
+        pv = self.pv
+        self.pvNum = len(pv['gen'])
+        self.pvGen = np.array(pv['gen'], dtype=int)
+        self.pvVtarget = np.array(pv['Vtarget'], dtype=float)
+        self.pvQmin = np.array(pv['Qmin'], dtype=float)
+        self.pvQmax = np.array(pv['Qmax'], dtype=float)
+        # branches of every PV bus generator
+        genRows = self.br_owner[self.loadBranchNum:]
+        self.pvRows = [self.loadBranchNum + np.flatnonzero(genRows == g) for g in self.pvGen]
+
+        # positive sequence voltage as a weighted sum of the phase voltages,
+        # single phase generators hold their phase voltage
+        self.pvSlots = np.full((self.pvNum, 3), self.groundIdx)
+        self.pvWeight = np.zeros((self.pvNum, 3), dtype=complex)
+        a = np.exp(2j * np.pi / 3)
+        for p, slots in enumerate(pv['slots']):
+            if len(slots) >= 3:
+                self.pvSlots[p] = slots[:3]
+                self.pvWeight[p] = np.array([1, a, a ** 2]) / 3
+            else:
+                self.pvSlots[p, 0] = slots[0]
+                self.pvWeight[p, 0] = 1
+
+        m = self.slotNum
+        Vext = np.zeros(self.groundIdx + 1, dtype=complex)
+        Vext[:-1] = self.sweep(self.Jsrc.reshape(self.busNum, m, 1)).reshape(-1)
+        self.pvDVDQ = np.ones(self.pvNum)
+        for p in range(self.pvNum):
+            # 1 var of generation shared by the phases
+            rows = self.pvRows[p]
+            I = np.conj(-1j / len(rows) / (Vext[self.br_na[rows]] - Vext[self.br_nb[rows]]))
+            J = np.zeros(self.groundIdx + 1, dtype=complex)
+            np.add.at(J, self.br_na[rows], -I)
+            np.add.at(J, self.br_nb[rows], I)
+            dV = np.zeros(self.groundIdx + 1, dtype=complex)
+            dV[:-1] = self.sweep(J[:-1].reshape(self.busNum, m, 1)).reshape(-1)
+            V1 = self.pvWeight[p] @ Vext[self.pvSlots[p]]
+            dV1 = self.pvWeight[p] @ dV[self.pvSlots[p]]
+            self.pvDVDQ[p] = np.real(dV1 * np.conj(V1)) / np.abs(V1)
+
+    # positive sequence voltage magnitude of the PV bus generators (pv x snapshot)
+    def pv_voltages(self, Vext):
+        return np.abs(np.einsum('pk,pkn->pn', self.pvWeight, Vext[self.pvSlots]))
+
+    ## SWEEPS
+    # eliminate the buses from the leaves to the source, level by level
+    def factorize(self):
+        D = self.Ydiag.copy()
+        self.K = np.zeros_like(D)
+        self.L = np.zeros_like(D)
+        self.U = np.zeros_like(D)
+        for idx, _, par, start in reversed(self.levels):
+            self.K[idx] = np.linalg.inv(D[idx])
+            self.L[idx] = self.Yup[idx] @ self.K[idx]
+            self.U[idx] = self.K[idx] @ self.Ydown[idx]
+            D[par] -= np.add.reduceat(self.L[idx] @ self.Ydown[idx], start, axis=0)
+        self.K[0] = np.linalg.inv(D[0])
+
+    # solve Y V = J for a batch of injections J (bus x slot x snapshot)
+    def sweep(self, J):
+        J = J.copy()
+        # backward sweep: push the injections of each subtree to its parent
+        for idx, _, par, start in reversed(self.levels):
+            J[par] -= np.add.reduceat(self.L[idx] @ J[idx], start, axis=0)
+
+        # forward sweep: voltages from the source down to the leaves
+        V = np.empty_like(J)
+        V[0] = self.K[0] @ J[0]
+        for idx, par, _, _ in self.levels:
+            V[idx] = self.K[idx] @ J[idx] - self.U[idx] @ V[par]
+        return V
+
+    # current drawn by every load/generator branch (branch x snapshot)
+    def branch_currents(self, Vext, S):
+        Vab = Vext[self.br_na] - Vext[self.br_nb]
+        Vmag = np.abs(Vab)
+        Vmag[Vmag == 0] = 1e-9
+        Vnom = self.br_Vnom[:, None]
+        Vpu = Vmag / Vnom
+        model = self.br_model[:, None]
+        vmin = self.br_vmin[:, None]
+        vmax = self.br_vmax[:, None]
+        Yeq = np.conj(S) / Vnom ** 2
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # constant Z at nominal voltage
+            I = Yeq * Vab
+            # constant PQ
+            I = np.where(model == 1, np.conj(S / Vab), I)
+            # CVR loads, exponential in voltage magnitude
+            Scvr = S.real * Vpu ** self.br_cvrw[:, None] + 1j * S.imag * Vpu ** self.br_cvrv[:, None]
+            I = np.where(model == 4, np.conj(Scvr / Vab), I)
+            # constant current magnitude following the voltage angle
+            I = np.where(model == 5, np.conj(S) / Vnom * Vab / Vmag, I)
+
+            # out of the voltage band the loads become constant Z, matching OpenDSS:
+            # the current at the band limit is kept above vmax, and interpolated
+            # down to the nominal constant Z current at VLOW below vmin
+            constI = model == 5
+            Imin = np.where(constI, np.conj(S) / Vnom, np.conj(S) / (vmin * Vnom))
+            Imax = np.where(constI, np.conj(S) / Vnom, np.conj(S) / (vmax * Vnom))
+            Ilow = Yeq * VLOW * Vnom
+            Yint = (Ilow + (Imin - Ilow) * (Vpu - VLOW) / (vmin - VLOW)) / Vmag
+            band = model != 2
+            I = np.where(band & (Vpu <= vmin), np.where(Vpu <= VLOW, Yeq, Yint) * Vab, I)
+            I = np.where(band & (Vpu > vmax), Imax / (vmax * Vnom) * Vab, I)
+        return I
+
+    # broadcast a multiplier to (snapshot x element)
+    def expand_mult(self, mult, num):
+        mult = np.asarray(mult, dtype=float)
+        if mult.ndim == 0:
+            mult = mult.reshape(1, 1)
+        elif mult.ndim == 1:
+            mult = mult[:, None]
+        return np.broadcast_to(mult, (mult.shape[0], num))
+
+    # solve a batch of snapshots
+    # loadMult/genMult: scalar, (N,) one factor per snapshot, or (N x loads)/(N x gens)
+    # returns complex node voltages (N x nodes) in nodeNames order
+    def solve(self, loadMult=1.0, genMult=1.0):
+        loadMult = self.expand_mult(loadMult, self.loadNum)
+        genMult = self.expand_mult(genMult, self.genNum)
+        N = max(loadMult.shape[0], genMult.shape[0])
+        loadMult = np.broadcast_to(loadMult, (N, self.loadNum))
+        genMult = np.broadcast_to(genMult, (N, self.genNum))
+
+        # nominal power of every branch in every snapshot
+        mult = np.concatenate([loadMult, genMult], axis=1).T
+        S = self.br_S[:, None] * mult[np.concatenate([self.br_owner[:self.loadBranchNum],
+                                                      self.br_owner[self.loadBranchNum:] + self.loadNum])]
+
+        m = self.slotNum
+        Jsrc = np.repeat(self.Jsrc.reshape(self.busNum, m, 1), N, axis=2)
+        Vext = np.zeros((self.groundIdx + 1, N), dtype=complex)
+        Vext[:-1] = self.sweep(Jsrc).reshape(-1, N)
+
+        # kvar of the PV bus generators, from the case setpoint
+        Qpv = np.array([-self.br_S[r].imag.sum() for r in self.pvRows]).reshape(-1, 1) * np.ones((1, N))
+        Qpv = np.clip(Qpv, self.pvQmin[:, None], self.pvQmax[:, None])
+
+        self.converged = np.zeros(N, dtype=bool)
+        for self.iterations in range(1, self.max_iter + 1):
+            # PV bus generators move their kvar toward the voltage target
+            if self.pvNum > 0:
+                if self.iterations > 1:
+                    dV = self.pvVtarget[:, None] - self.pv_voltages(Vext)
+                    Qpv = np.clip(Qpv + dV / self.pvDVDQ[:, None], self.pvQmin[:, None], self.pvQmax[:, None])
+                for p, rows in enumerate(self.pvRows):
+                    S[rows] = S[rows].real - 1j * Qpv[p] / len(rows)
+
+            # injections of the loads and generators at the current voltages
+            I = self.branch_currents(Vext, S)
+            I = np.concatenate([I, I])[self.injOrder] * self.injSign
+            J = np.zeros((self.groundIdx + 1, N), dtype=complex)
+            J[self.injSlots] = np.add.reduceat(I, self.injStart, axis=0)
+            J = J[:-1].reshape(self.busNum, m, N) + Jsrc
+
+            V = self.sweep(J).reshape(-1, N)
+            err = np.max(np.abs(V[self.nodeSlots] - Vext[self.nodeSlots]) / self.Vbase[:, None], axis=0)
+            Vext[:-1] = V
+            self.converged = err < self.tol
+            if self.converged.all():
+                break
+
+        # kvar of the PV bus generators in the solution (pv x snapshot)
+        self.pvQ = Qpv
+        return Vext[self.nodeSlots].T
+
+    # node voltage magnitudes in per unit of the bus base voltage
+    def voltage_pu(self, V):
+        return np.abs(V) / self.Vbase
+
+    # compare the sweep solution with the engine at the current operating point
+    # returns the largest node voltage mismatch in per unit
+    def check_engine(self):
+        V = self.solve()[0]
+        engineV = dict(zip([n.lower() for n in self.engine.all_node_names()],
+                           to_complex(self.engine.all_bus_volts())))
+        ref = np.array([engineV[n.lower()] for n in self.nodeNames])
+        return np.max(np.abs(V - ref) / self.Vbase)
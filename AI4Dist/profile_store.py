@@ -0,0 +1,116 @@
+import os, json, glob, shutil, argparse
+import numpy as np
+import pandas as pd
+
+
+# profile folders that are compiled into a store, relative to the repository
+PROFILE_SOURCES = ['profiles', os.path.join('AI4Dist', 'data')]
+
+# stores opened in this process, keyed by path
+STORES = {}
+
+
+# compile the profile csv files into one aligned binary columnar store
+# every csv under a *_profile folder of the sources becomes a column named after
+# the file (e.g. 'ercot_houston_load'), aligned on the union of all hours and
+# NaN where a profile has no data. The first source wins for duplicated names.
+def compile_profiles(store_path, sources=None):
+    if sources is None:
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        sources = [os.path.join(root, s) for s in PROFILE_SOURCES]
+
+    # collect profile files
+    files = {}
+    for src in sources:
+        for fp in sorted(glob.glob(os.path.join(src, '*_profile', '*.csv'))):
+            name = os.path.splitext(os.path.basename(fp))[0]
+            files.setdefault(name, fp)
+
+    # read the profiles
+    series = {}
+    for name, fp in files.items():
+        df = pd.read_csv(fp)
+        idx = pd.to_datetime(df['date_time']).to_numpy(dtype='datetime64[ns]').astype(np.int64)
+        series[name] = pd.Series(df['value'].to_numpy(dtype=float), index=idx)
+
+    return write_store(store_path, series, files)
+
+
+# write profiles into a store, aligned on the union of their hours
+# series: {name: Series of values indexed by int64 ns timestamps}
+# sources: {name: file the profile came from}
+def write_store(store_path, series, sources):
+    series = {n: s[~s.index.duplicated()] for n, s in series.items()}
+    index = np.unique(np.concatenate([s.index.to_numpy() for s in series.values()])) if series else np.zeros(0, np.int64)
+
+    # write into a temporary folder and move it in place at the end, so that
+    # workers never see a half written store
+    tmp_path = store_path.rstrip(os.sep) + f'.tmp{os.getpid()}'
+    os.makedirs(tmp_path, exist_ok=True)
+    np.save(os.path.join(tmp_path, 'index.npy'), index)
+    for name, s in series.items():
+        np.save(os.path.join(tmp_path, f'{name}.npy'), s.reindex(index).to_numpy(dtype=float))
+    with open(os.path.join(tmp_path, 'meta.json'), 'w') as fh:
+        json.dump({'columns': list(series.keys()), 'sources': sources}, fh, indent=1)
+    if os.path.isdir(store_path):
+        shutil.rmtree(store_path)
+    os.replace(tmp_path, store_path)
+
+    return store_path
+
+
+# open a compiled store, once per process
+def get_store(store_path):
+    store_path = os.path.abspath(store_path)
+    if store_path not in STORES:
+        STORES[store_path] = profileStore(store_path)
+    return STORES[store_path]
+
+
+# memory mapped profile store
+# the columns are mapped read-only, so all worker processes on a node share
+# the same pages instead of holding their own pandas copies
+class profileStore():
+    def __init__(self, store_path):
+        if not os.path.isfile(os.path.join(store_path, 'meta.json')):
+            raise ValueError(f'No compiled profile store at {store_path}, run compile_profiles first!')
+        self.path = store_path
+        with open(os.path.join(store_path, 'meta.json')) as fh:
+            meta = json.load(fh)
+        self.columns = meta['columns']
+        self.sources = meta['sources']
+        self.index = np.load(os.path.join(store_path, 'index.npy'), mmap_mode='r')
+        self.data = {c: np.load(os.path.join(store_path, f'{c}.npy'), mmap_mode='r') for c in self.columns}
+        self.commonRows = {}
+
+    # check a column name
+    def check_column(self, column):
+        if column not in self.data:
+            raise ValueError(f'Profile {column} is not in the store at {self.path}!')
+
+    # store rows where all the given columns have data, computed once per column set
+    def common_rows(self, columns):
+        key = tuple(columns)
+        if key not in self.commonRows:
+            mask = np.ones(len(self.index), dtype=bool)
+            for c in columns:
+                self.check_column(c)
+                mask &= ~np.isnan(self.data[c])
+            self.commonRows[key] = np.flatnonzero(mask)
+        return self.commonRows[key]
+
+    # timestamps of store rows
+    def timestamps(self, rows):
+        return pd.DatetimeIndex(np.asarray(self.index[rows]).astype('datetime64[ns]'), name='date_time')
+
+    # value of a column at a store row
+    def value(self, column, row):
+        return self.data[column][row]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compile profile csv files into a memory mapped store')
+    parser.add_argument('store_path', help='output folder of the store')
+    parser.add_argument('sources', nargs='*', default=None, help='folders containing *_profile/*.csv')
+    args = parser.parse_args()
+    compile_profiles(args.store_path, args.sources or None)
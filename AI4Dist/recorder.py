@@ -0,0 +1,177 @@
+import os, json, glob
+import numpy as np
+
+
+# streaming recorder of agent waveforms
+# agents register named channels once and write one sample per observation
+# into preallocated per-episode ring buffers (stepNum rows, the oldest samples
+# are overwritten past that). Finished episodes are kept in memory and written
+# every chunk episodes as a compressed chunk-<k>.npz, one array per channel, so
+# that waveReader loads only the chunks and channels it is asked for
+# path: folder of the chunks, None to keep only the current episode
+class waveRecorder():
+    def __init__(self, stepNum, path=None, chunk=64, dtype=np.float32):
+        self.stepNum = stepNum
+        self.path = path
+        self.chunk = chunk
+        self.dtype = dtype
+
+        self.channels = []
+        self.channelIdx = {}
+        self.alloc(4)
+        self.episodeNum = 0
+        self.done = []
+
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+            # continue after the chunks already in the folder
+            self.chunkNum = len(glob.glob(os.path.join(path, 'chunk-*[0-9].npz')))
+            if self.chunkNum > 0:
+                self.episodeNum = sum(len(m['episodes']) for m in read_chunk_index(path))
+
+    # buffers of the current episode for capacity channels
+    def alloc(self, capacity):
+        values = np.zeros((self.stepNum, capacity), dtype=self.dtype)
+        times = np.zeros((self.stepNum, capacity))
+        count = np.zeros(capacity, dtype=np.int64)
+        if hasattr(self, 'values'):
+            n = self.values.shape[1]
+            values[:, :n] = self.values
+            times[:, :n] = self.times
+            count[:n] = self.count
+        self.values, self.times, self.count = values, times, count
+
+    # channel number of a name, registered on first use
+    def register(self, name):
+        if name not in self.channelIdx:
+            if len(self.channels) == self.values.shape[1]:
+                self.alloc(2 * self.values.shape[1])
+            self.channelIdx[name] = len(self.channels)
+            self.channels.append(name)
+        return self.channelIdx[name]
+
+    # write a sample of a channel at simulation time t, or the samples of an
+    # array of distinct channels
+    def record(self, ch, t, value):
+        row = self.count[ch] % self.stepNum
+        self.values[row, ch] = value
+        self.times[row, ch] = t
+        self.count[ch] += 1
+
+    # samples of the current episode of a channel in time order, (times, values)
+    def current(self, ch):
+        n = self.count[ch]
+        if n <= self.stepNum:
+            return self.times[:n, ch], self.values[:n, ch]
+        order = np.roll(np.arange(self.stepNum), -(n % self.stepNum))
+        return self.times[order, ch], self.values[order, ch]
+
+    # close the current episode, meta: json-able info kept with it (hour, fault, ...)
+    def end_episode(self, meta=None):
+        if self.count.sum() == 0:
+            return
+        C = len(self.channels)
+        if self.path is not None:
+            lengths = np.minimum(self.count[:C], self.stepNum)
+            self.done.append((self.episodeNum, self.values[:, :C].copy(), self.times[:, :C].copy(),
+                              lengths, self.count[:C] % self.stepNum, meta))
+            if len(self.done) >= self.chunk:
+                self.flush()
+        self.episodeNum += 1
+        self.count[:] = 0
+
+    # write the finished episodes as a chunk
+    def flush(self):
+        if self.path is None or len(self.done) == 0:
+            return
+        arrays = {'episodes': np.array([d[0] for d in self.done], dtype=np.int64),
+                  'lengths': np.stack([d[3] for d in self.done]),
+                  'meta': np.array([json.dumps(d[5]) for d in self.done])}
+        for c, name in enumerate(self.channels):
+            # unroll the ring buffers into time order
+            V = np.zeros((len(self.done), self.stepNum), dtype=self.dtype)
+            T = np.zeros((len(self.done), self.stepNum))
+            for i, d in enumerate(self.done):
+                order = np.roll(np.arange(self.stepNum), -d[4][c]) if d[3][c] == self.stepNum else slice(None)
+                V[i] = d[1][order, c]
+                T[i] = d[2][order, c]
+            arrays[f'v:{name}'] = V
+            arrays[f't:{name}'] = T
+
+        fp = os.path.join(self.path, f'chunk-{self.chunkNum:06d}.npz')
+        tmp = os.path.join(self.path, f'chunk-{self.chunkNum:06d}.tmp.npz')
+        np.savez_compressed(tmp, **arrays)
+        os.replace(tmp, fp)
+        with open(os.path.join(self.path, 'channels.json'), 'w') as fh:
+            json.dump({'channels': self.channels, 'stepNum': self.stepNum}, fh)
+        self.chunkNum += 1
+        self.done = []
+
+    # write what is left, including the current episode
+    def close(self, meta=None):
+        self.end_episode(meta)
+        self.flush()
+
+
+# episode numbers of every chunk of a recording
+def read_chunk_index(path):
+    index = []
+    for fp in sorted(glob.glob(os.path.join(path, 'chunk-*[0-9].npz'))):
+        with np.load(fp) as data:
+            index.append({'file': fp, 'episodes': data['episodes']})
+    return index
+
+
+# lazy reader of a recording, chunks are opened and channels decompressed only
+# when a slice needs them
+# reader.waveform(episode, channel) -> (times, values)
+# reader.channel(channel, episodes) -> list of (times, values)
+class waveReader():
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'channels.json')) as fh:
+            info = json.load(fh)
+        self.channels = info['channels']
+        self.index = read_chunk_index(path)
+        self.episodeChunk = {}
+        for k, c in enumerate(self.index):
+            for i, ep in enumerate(c['episodes']):
+                self.episodeChunk[int(ep)] = (k, i)
+        self.episodes = np.array(sorted(self.episodeChunk), dtype=np.int64)
+        # last opened chunk and its decompressed channels
+        self.openChunk = None
+        self.cache = {}
+
+    def __len__(self):
+        return len(self.episodes)
+
+    def load(self, k, key):
+        if self.openChunk != k:
+            self.openChunk = k
+            self.cache = {}
+            self.data = np.load(self.index[k]['file'])
+        if key not in self.cache:
+            self.cache[key] = self.data[key]
+        return self.cache[key]
+
+    # samples of a channel in an episode, (times, values)
+    def waveform(self, episode, channel):
+        k, i = self.episodeChunk[int(episode)]
+        c = self.channels.index(channel)
+        lengths = self.load(k, 'lengths')
+        # channel registered after this chunk was written
+        if c >= lengths.shape[1]:
+            return np.zeros(0), np.zeros(0, dtype=np.float32)
+        n = lengths[i, c]
+        return self.load(k, f't:{channel}')[i, :n], self.load(k, f'v:{channel}')[i, :n]
+
+    # samples of a channel in a list of episodes (all if None)
+    def channel(self, channel, episodes=None):
+        if episodes is None:
+            episodes = self.episodes
+        return [self.waveform(ep, channel) for ep in episodes]
+
+    # info kept with an episode by end_episode
+    def meta(self, episode):
+        k, i = self.episodeChunk[int(episode)]
+        return json.loads(str(self.load(k, 'meta')[i]))
@@ -0,0 +1,115 @@
+import numpy as np
+
+
+# kinds of elements interned by a case
+ELEMENT_KINDS = ['bus', 'node', 'line', 'transformer', 'load', 'generator']
+
+
+# interned names of the elements of a case
+# every bus, node, line, transformer, load and generator gets an integer id in
+# the order it was added (the order of the engine collections), names are
+# looked up through one dict per kind, case insensitive as in DSS
+# nodes are packed bus by bus in CSR form: the nodes of bus b are
+# nodePtr[b]:nodePtr[b+1], with their phase numbers in nodePhase
+class elementRegistry():
+    def __init__(self):
+        self.names = {k: [] for k in ELEMENT_KINDS}
+        self.ids = {k: {} for k in ELEMENT_KINDS}
+        self.nodePtr = np.zeros(1, dtype=int)
+        self.nodePhase = np.zeros(0, dtype=int)
+        self.nodeBus = np.zeros(0, dtype=int)
+        # bus pair (F, T) of every line, and line id by bus pair
+        self.lineBuses = np.zeros((0, 2), dtype=int)
+        self.lineByBuses = {}
+
+    # intern names of a kind, names already in the registry keep their id
+    # returns the ids of the names
+    def add(self, kind, names):
+        ids = self.ids[kind]
+        allNames = self.names[kind]
+        res = []
+        for n in names:
+            key = n.lower()
+            if key not in ids:
+                ids[key] = len(allNames)
+                allNames.append(n)
+            res.append(ids[key])
+        return np.array(res, dtype=int)
+
+    # drop the names of a kind from id num on, e.g. generators added after a
+    # checkpoint that a rollback removed. Buses, nodes and lines are not trimmed
+    def trim(self, kind, num):
+        if kind in ['bus', 'node', 'line']:
+            raise ValueError(f'Cannot trim {kind} names of a registry!')
+        for n in self.names[kind][num:]:
+            del self.ids[kind][n.lower()]
+        del self.names[kind][num:]
+
+    # buses with their phases, also interns the nodes as 'bus.phase'
+    def add_buses(self, names, phases):
+        ids = self.add('bus', names)
+        new = ids >= len(self.nodePtr) - 1
+        counts = [len(p) for i, p in zip(new, phases) if i]
+        self.nodePtr = np.concatenate([self.nodePtr, self.nodePtr[-1] + np.cumsum(counts, dtype=int)])
+        self.nodePhase = np.concatenate([self.nodePhase, np.array([q for i, p in zip(new, phases) if i for q in p], dtype=int)])
+        self.nodeBus = np.concatenate([self.nodeBus, np.repeat(ids[new], counts)])
+        self.add('node', [f'{n}.{q}' for i, n, p in zip(new, names, phases) if i for q in p])
+        return ids
+
+    # lines with the bus ids at both ends, (-1, -1) if not known
+    def add_lines(self, names, pairs):
+        ids = self.add('line', names)
+        pairs = np.array(pairs, dtype=int).reshape(-1, 2)
+        self.lineBuses = np.concatenate([self.lineBuses, pairs[ids >= len(self.lineBuses)]])
+        for l, (F, T) in zip(ids, pairs):
+            if F < 0:
+                continue
+            self.lineByBuses.setdefault((int(F), int(T)), int(l))
+            self.lineByBuses.setdefault((int(T), int(F)), int(l))
+        return ids
+
+    ## LOOKUPS
+    # id of a name, bus names may carry node suffixes ('bus.1.2')
+    def id(self, kind, name):
+        key = name.lower()
+        if kind == 'bus':
+            key = key.split('.')[0]
+        try:
+            return self.ids[kind][key]
+        except KeyError:
+            raise ValueError(f'{kind.capitalize()} {name} is not in the case!')
+
+    # ids of several names
+    def ids_of(self, kind, names):
+        return np.array([self.id(kind, n) for n in names], dtype=int)
+
+    def has(self, kind, name):
+        key = name.lower()
+        return (key.split('.')[0] if kind == 'bus' else key) in self.ids[kind]
+
+    def name(self, kind, i):
+        return self.names[kind][i]
+
+    def count(self, kind):
+        return len(self.names[kind])
+
+    def bus(self, name):
+        return self.id('bus', name)
+
+    def line(self, name):
+        if name.lower().startswith('line.'):
+            name = name[5:]
+        return self.id('line', name)
+
+    # phases of bus i and their node ids
+    def phases(self, i):
+        return self.nodePhase[self.nodePtr[i]:self.nodePtr[i + 1]]
+
+    def bus_nodes(self, i):
+        return np.arange(self.nodePtr[i], self.nodePtr[i + 1])
+
+    # line connecting two buses (either direction), None if there is none
+    def line_between(self, bus1, bus2):
+        if isinstance(bus1, str):
+            bus1, bus2 = self.bus(bus1), self.bus(bus2)
+        return self.lineByBuses.get((bus1, bus2))
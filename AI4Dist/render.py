@@ -0,0 +1,245 @@
+import os
+import multiprocessing as mp
+import numpy as np
+import matplotlib.colors as mcolors
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection
+
+
+# default look of the feeder maps, as in dssCase.draw_graph
+NODE_COLOR = 'sandybrown'
+NODE_SIZE = 10
+EDGE_COLOR = 'grey'
+EDGE_WIDTH = 1.0
+FAULT_COLOR = 'red'
+FAULT_SIZE = 75
+FUSE_COLOR = 'blue'
+FUSE_SIZE = 50
+# zlib level of the png files, encoding dominates the rendering time of a map
+PNG_COMPRESSION = 1
+
+# map renderer of a worker process
+WORKER = {}
+
+
+# positions of the buses in a tree layout: x is the middle of the subtree in
+# the Euler tour order (leaves are spread evenly), y is minus the depth
+def tree_layout(topo):
+    pos = np.zeros((topo.busNum, 2))
+    pos[:, 0] = (topo.tin + topo.tout - 1) / 2
+    pos[:, 1] = -np.maximum(topo.depth, 0)
+    # buses not connected to the source in a row below the tree
+    orphans = topo.parent < 0
+    orphans[0] = False
+    pos[orphans, 0] = np.arange(orphans.sum())
+    pos[orphans, 1] = pos[:, 1].min() - 1
+    return pos
+
+
+# everything a map needs from a case, computed once and picklable so that
+# render workers do not need the case: bus names, positions (from the bus
+# coordinates read by read_bus_coords, a tree layout for the buses without),
+# edges (lines then transformers) and the buses at the end of fused lines
+def case_layout(case):
+    pos = tree_layout(case.topo)
+    posDict = getattr(case, 'posDict', {})
+    if len(posDict) > 0:
+        known = np.array(list(posDict.keys()), dtype=int)
+        xy = np.array(list(posDict.values()), dtype=float)
+        # scale the tree layout of the remaining buses to the coordinates
+        rest = np.setdiff1d(np.arange(case.busNum), known)
+        if len(rest) > 0:
+            span = np.ptp(xy, axis=0) / np.maximum(np.ptp(pos, axis=0), 1)
+            pos[rest] = xy.min(axis=0) + (pos[rest] - pos.min(axis=0)) * span
+        pos[known] = xy
+
+    edges = np.concatenate([np.array(case.lineT, dtype=int).reshape(-1, 2),
+                            np.array(case.xfmrT, dtype=int).reshape(-1, 2)])
+    return {'busNames': list(case.busNames), 'pos': pos, 'edges': edges,
+            'lineNum': len(case.lineT), 'fuseBuses': case.fuse_buses()}
+
+
+# feeder map with its artists built once: the buses are one scatter collection
+# and the edges one line collection, a new map only writes the color and size
+# arrays and redraws (or blits) the two collections
+# layout: see case_layout
+# live: draw in a pyplot window refreshed in place by blitting (dashboards),
+#       otherwise an Agg canvas without any GUI, for rendering to files
+class feederMap():
+    def __init__(self, layout, figsize=(8, 6), dpi=100, live=False):
+        self.busNames = layout['busNames']
+        self.busIdx = {n.lower(): i for i, n in enumerate(self.busNames)}
+        self.pos = np.asarray(layout['pos'], dtype=float)
+        self.edges = np.asarray(layout['edges'], dtype=int)
+        self.lineNum = layout['lineNum']
+        self.fuseBuses = np.asarray(layout['fuseBuses'], dtype=int)
+        self.busNum = len(self.pos)
+        self.edgeNum = len(self.edges)
+        self.live = live
+
+        # style arrays, written by the mark_* methods
+        self.nodeColor = np.zeros((self.busNum, 4))
+        self.nodeSize = np.zeros(self.busNum)
+        self.edgeColor = np.zeros((self.edgeNum, 4))
+        self.edgeWidth = np.zeros(self.edgeNum)
+        self.reset_style()
+
+        if live:
+            import matplotlib.pyplot as plt
+            self.fig = plt.figure(figsize=figsize, dpi=dpi)
+        else:
+            self.fig = Figure(figsize=figsize, dpi=dpi)
+            FigureCanvasAgg(self.fig)
+        self.ax = self.fig.add_axes([0, 0, 1, 0.94])
+        self.ax.set_axis_off()
+        self.edgeArtist = LineCollection(self.pos[self.edges], colors=self.edgeColor,
+                                         linewidths=self.edgeWidth, zorder=1, animated=live)
+        self.ax.add_collection(self.edgeArtist)
+        self.nodeArtist = self.ax.scatter(self.pos[:, 0], self.pos[:, 1], s=self.nodeSize,
+                                          c=self.nodeColor, zorder=2, animated=live)
+        self.title = self.ax.set_title('', animated=live)
+        self.ax.autoscale_view()
+        self.background = None
+
+        if live:
+            self.fig.canvas.mpl_connect('draw_event', self.on_draw)
+            plt.show(block=False)
+            plt.pause(0.01)
+
+    ## STYLE
+    # default colors and sizes of every bus and edge
+    def reset_style(self):
+        self.nodeColor[:] = mcolors.to_rgba(NODE_COLOR)
+        self.nodeSize[:] = NODE_SIZE
+        self.edgeColor[:] = mcolors.to_rgba(EDGE_COLOR)
+        self.edgeWidth[:] = EDGE_WIDTH
+
+    # bus ids of bus names (or ids)
+    def bus_ids(self, buses):
+        return np.array([b if isinstance(b, (int, np.integer)) else self.busIdx[b.lower()] for b in buses], dtype=int)
+
+    # paint buses, by name or id
+    def mark_buses(self, buses, color=FAULT_COLOR, size=FAULT_SIZE):
+        idx = self.bus_ids(buses)
+        self.nodeColor[idx] = mcolors.to_rgba(color)
+        self.nodeSize[idx] = size
+
+    # paint edges by index (lines first, then transformers) or a boolean mask
+    def mark_edges(self, edges, color, width=2 * EDGE_WIDTH):
+        self.edgeColor[edges] = mcolors.to_rgba(color)
+        self.edgeWidth[edges] = width
+
+    # buses at the end of fused lines
+    def mark_fuses(self, color=FUSE_COLOR, size=FUSE_SIZE):
+        self.nodeColor[self.fuseBuses] = mcolors.to_rgba(color)
+        self.nodeSize[self.fuseBuses] = size
+
+    # style of a map cell: buses to paint in red, fuses, title
+    def set_cell(self, cell):
+        self.reset_style()
+        if cell.get('fuses', False):
+            self.mark_fuses()
+        for key, color in [('buses', FAULT_COLOR), ('cleared', 'green')]:
+            if len(cell.get(key, [])) > 0:
+                self.mark_buses(cell[key], color)
+        self.title.set_text(cell.get('title', ''))
+
+    ## DRAWING
+    # push the style arrays to the artists
+    def update(self):
+        self.nodeArtist.set_facecolors(self.nodeColor)
+        self.nodeArtist.set_sizes(self.nodeSize)
+        self.edgeArtist.set_colors(self.edgeColor)
+        self.edgeArtist.set_linewidths(self.edgeWidth)
+
+    # render the map to an image file
+    def save(self, fp):
+        self.update()
+        if fp.lower().endswith('.png'):
+            self.fig.savefig(fp, pil_kwargs={'compress_level': PNG_COMPRESSION})
+        else:
+            self.fig.savefig(fp)
+
+    # RGBA pixels of the map
+    def to_array(self):
+        self.update()
+        self.fig.canvas.draw()
+        return np.asarray(self.fig.canvas.buffer_rgba()).copy()
+
+    # background of a live map without the changing artists, kept for blitting
+    def on_draw(self, event):
+        self.background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+        self.draw_artists()
+
+    def draw_artists(self):
+        self.ax.draw_artist(self.edgeArtist)
+        self.ax.draw_artist(self.nodeArtist)
+        self.ax.draw_artist(self.title)
+
+    # refresh a live map in place, only the two collections and the title are
+    # redrawn over the saved background
+    def refresh(self):
+        self.update()
+        canvas = self.fig.canvas
+        if self.background is None:
+            canvas.draw()
+        else:
+            canvas.restore_region(self.background)
+            self.draw_artists()
+            canvas.blit(self.fig.bbox)
+        canvas.flush_events()
+
+
+# build the map renderer of a worker once
+def render_init(layout, figsize, dpi):
+    WORKER['map'] = feederMap(layout, figsize, dpi)
+
+
+# render a chunk of map cells in a worker, returns the written files
+def render_chunk(task):
+    out_path, cells, fmt = task
+    m = WORKER['map']
+    files = []
+    for cell in cells:
+        fp = os.path.join(out_path, f'{cell["name"]}.{fmt}')
+        m.set_cell(cell)
+        m.save(fp)
+        files.append(fp)
+    return files
+
+
+# render many maps to files in parallel worker processes, each worker builds
+# the artists once and restyles them for every map
+# cells: list of {'name': file name, 'buses': buses in red, 'cleared': buses
+#        in green, 'fuses': True to mark the fused lines, 'title': text}
+def render_maps(layout, cells, out_path, fmt='png', workers=None, chunk=64, figsize=(8, 6), dpi=100,
+                start_method='spawn'):
+    os.makedirs(out_path, exist_ok=True)
+    tasks = [(out_path, cells[i:i + chunk], fmt) for i in range(0, len(cells), chunk)]
+    files = []
+    if workers == 0:
+        render_init(layout, figsize, dpi)
+        for t in tasks:
+            files += render_chunk(t)
+        return files
+
+    ctx = mp.get_context(start_method)
+    with ctx.Pool(workers, initializer=render_init, initargs=(layout, figsize, dpi)) as pool:
+        for f in pool.imap_unordered(render_chunk, tasks):
+            files += f
+    return sorted(files)
+
+
+# map cells of the results of a fault campaign (see campaign.read_campaign):
+# one map per value of the column by ('scenario' for a map per scenario),
+# fault buses where every relay missed the fault in red, cleared ones in green
+def campaign_cells(results, by='scenario', fuses=True):
+    cells = []
+    for key, rows in results.groupby(by, sort=True):
+        missed = rows['missed'].to_numpy(dtype=bool)
+        buses = rows['bus'].to_numpy()
+        cells.append({'name': f'{by}-{key}', 'buses': list(np.unique(buses[missed])),
+                      'cleared': list(np.setdiff1d(np.unique(buses[~missed]), buses[missed])),
+                      'fuses': fuses, 'title': f'{by} {key}: {missed.sum()} of {len(rows)} faults missed'})
+    return cells
@@ -0,0 +1,263 @@
+import numpy as np
+
+
+# cached sensitivities of the node voltages and element currents to the
+# generator setpoints, around the last solution of a case (the anchor)
+# steady state actions of the agents change the Pg/Qg of the generator table
+# and push them with sync_gen_df, the snapshot after such an action is then
+# predicted as V = V0 + dV/dP dP + dV/dQ dQ (same for the currents) instead of
+# solved, unless the prediction goes too far from the anchor:
+# - the largest predicted voltage change exceeds bound (pu)
+# - the estimated linearization error exceeds errBound (pu), the error grows
+#   with the square of the change, its rate is measured at every solution
+#   that follows predictions (errors beyond errBound rebuild the matrices)
+# - the network was changed (trips, edits, new elements), the loads were
+#   scaled or a setpoint without a sensitivity changed (kV, Qg of pv systems,
+#   setpoints whose finite difference did not converge)
+# - the predicted control voltage of a regulator leaves its band, the taps
+#   (and capacitor states) are fixed in the predictions
+# the matrices are finite differences of engine solutions with the controls
+# off, one per generator and power (kW for every generator, kvar except for
+# pv systems, whose reactive power only follows from their rating and pf)
+# delta: finite difference step (kW/kvar), 1 % of kVAbase (at least 1) if None
+class voltSensitivity():
+    def __init__(self, case, bound=0.01, errBound=0.001, delta=None):
+        self.case = case
+        self.bound = bound
+        self.errBound = errBound
+        self.delta = delta
+        self.counts = {'predict': 0, 'solve': 0, 'build': 0}
+
+        # matrices, rows and context of the last build
+        self.JV = None
+        self.JI = None
+        self.rowsP = None
+        self.rowsQ = None
+        # setpoints with a column (flat index into the setpoints), setpoints
+        # whose changes are ignored (the source)
+        self.cols = None
+        self.tracked = None
+        self.nodeScale = None
+        self.built = None
+        # regulated node and winding conductor, PT ratio, line drop
+        # compensation (ohm / CT primary) and band of the regulators, and the
+        # sensitivities of their control voltage phasors
+        self.regNode = None
+        self.regCond = None
+        self.regPT = None
+        self.regZ = None
+        self.regLo = None
+        self.regHi = None
+        self.regJ = None
+        # control voltage phasors at the anchor, regulators within their band
+        # there (checked in predictions) and whether a prediction expected a
+        # tap change since the anchor
+        self.regC0 = None
+        self.regCheck = None
+        self.regMoved = False
+        # anchor: solution, setpoints and context
+        self.V0 = None
+        self.I0 = None
+        self.gen0 = None
+        self.context = None
+        # measured rate of the linearization error (pu per pu^2)
+        self.errRate = 0.0
+
+    # state the matrices depend on (the network and its generators), the anchor
+    # also depends on the loads
+    def get_context(self, loads=True):
+        case = self.case
+        context = (case.changeCount, case.nodeNum, case.condNum, len(case.genTable))
+        return context + (id(case.loadKW),) if loads else context
+
+    # setpoint columns of the generator table, (Pg, Qg, Vg) x generators
+    def setpoints(self):
+        gens = self.case.genTable
+        return np.array([gens['Pg'], gens['Qg'], gens['Vg']])
+
+    ## MATRICES
+    # finite differences around the current solution, the engine and the
+    # generator table are left at the current setpoints (the solution of the
+    # engine is the last perturbed one, the snapshot arrays are not touched)
+    def build(self):
+        case = self.case
+        engine = case.engine
+        gens = case.genTable
+        fuel = gens['fuel']
+        self.rowsP = np.flatnonzero(fuel != 'source')
+        self.rowsQ = np.flatnonzero((fuel != 'source') & (fuel != 'pv'))
+        cols = [('Pg', i) for i in self.rowsP] + [('Qg', i) for i in self.rowsQ]
+        genNum = len(gens)
+        self.cols = np.concatenate([self.rowsP, genNum + self.rowsQ])
+        self.tracked = np.zeros((3, genNum), dtype=bool)
+        self.tracked.flat[self.cols] = True
+        self.tracked[:, fuel == 'source'] = True
+
+        # per unit scale of every node
+        nodeBase = np.ones(case.nodeNum)
+        for b, s in case.busNodeSlice.items():
+            engine.set_active_bus(b)
+            nodeBase[s] = max(engine.bus_kv_base() * 1000, 1)
+        self.nodeScale = 1 / nodeBase
+
+        self.find_regulators()
+
+        engine.command('get controlmode')
+        mode = engine.result()
+        engine.command('set controlmode=off')
+        V0 = case.snapV.copy()
+        I0 = case.snapI.copy()
+        self.JV = np.zeros((case.nodeNum, len(cols)), dtype=complex)
+        self.JI = np.zeros((case.condNum, len(cols)), dtype=complex)
+        ok = np.ones(len(cols), dtype=bool)
+        for k, (f, i) in enumerate(cols):
+            old = gens[f][i]
+            d = self.delta if self.delta is not None else max(0.01 * gens['kVAbase'][i], 1)
+            # lower the power of a generator that may be at its limit
+            if f == 'Pg' and old >= d:
+                d = -d
+            gens[f][i] = old + d
+            case.sync_gen_df()
+            case.solve_case()
+            if engine.converged():
+                self.JV[:, k] = (np.asarray(engine.all_bus_volts(), dtype=float).view(complex) - V0) / d
+                self.JI[:, k] = (np.asarray(engine.all_pd_currents(), dtype=float).view(complex) - I0) / d
+            else:
+                print(f'Warning: no sensitivity to {f} of generator {gens["name"][i]}, the solution did not converge!')
+                ok[k] = False
+            gens[f][i] = old
+        case.sync_gen_df()
+        if mode != '':
+            engine.command(f'set controlmode={mode}')
+
+        # setpoints without a sensitivity are solved when they change
+        self.tracked.flat[self.cols[~ok]] = False
+        self.cols = self.cols[ok]
+        self.JV = self.JV[:, ok]
+        self.JI = self.JI[:, ok]
+
+        self.regJ = self.control_phasor(self.JV, self.JI)
+        self.built = self.get_context(loads=False)
+        self.counts['build'] += 1
+
+    # voltage regulators and the nodes and conductors they measure, regulators
+    # whose settings cannot be read are not checked
+    def find_regulators(self):
+        case = self.case
+        engine = case.engine
+        nodeIdx = {n.lower(): i for i, n in enumerate(engine.all_node_names())}
+        regs = []
+        for r in engine.names('regcontrols'):
+            prop = lambda p: engine.get_property(f'RegControl.{r}', p)
+            try:
+                xfmr = f'transformer.{prop("transformer")}'.lower()
+                w = int(prop('winding'))
+                vreg, band = float(prop('vreg')), float(prop('band'))
+                pt, ct = float(prop('ptratio')), float(prop('ctprim'))
+                Z = complex(float(prop('R')), float(prop('X')))
+            except ValueError:
+                continue
+            bus = prop('bus')
+            engine.set_active_element(xfmr)
+            cond = case.elmtCond.get(xfmr)
+            if cond is None:
+                continue
+            order = list(engine.elmt_node_order()[(w - 1) * cond:w * cond])
+            node = (bus or engine.elmt_bus_names()[w - 1]).lower().split('.')
+            phase = int(node[1]) if len(node) > 1 else order[0]
+            key = f'{node[0]}.{phase}'
+            if key not in nodeIdx:
+                continue
+            k = order.index(phase) if phase in order else 0
+            regs.append((nodeIdx[key], case.elmtSlice[xfmr].start + (w - 1) * cond + k, pt, Z / ct,
+                         vreg - band / 2, vreg + band / 2))
+
+        regs = np.array(regs, dtype=complex).reshape(-1, 6)
+        self.regNode = regs[:, 0].real.astype(int)
+        self.regCond = regs[:, 1].real.astype(int)
+        self.regPT = regs[:, 2].real
+        self.regZ = regs[:, 3]
+        self.regLo = regs[:, 4].real
+        self.regHi = regs[:, 5].real
+
+    # control voltage phasors (V on the PT secondary) of the regulators for node
+    # voltages V and conductor currents I (or their sensitivities), the current
+    # into the regulated winding is the opposite of the compensated load current
+    def control_phasor(self, V, I):
+        V, I = V[self.regNode], I[self.regCond]
+        if V.ndim == 2:
+            return V / self.regPT[:, None] + self.regZ[:, None] * I
+        return V / self.regPT + self.regZ * I
+
+    # True for the regulators outside their band
+    def out_of_band(self, C):
+        Vc = np.abs(C)
+        return (Vc < self.regLo) | (Vc > self.regHi)
+
+    # setpoint changes since the anchor on the columns of the matrices
+    def changes(self, gen):
+        return gen.take(self.cols) - self.gen0.take(self.cols)
+
+    # setpoint changes without a sensitivity
+    def untracked(self, gen):
+        return np.any((gen != self.gen0) & ~self.tracked)
+
+    ## ANCHOR
+    # new solution of the case, called by dssCase.snapshot. The error of the
+    # prediction of this solution from the previous anchor is measured (unless
+    # the taps were expected to move), and the matrices are rebuilt around it
+    # if they are missing, stale or wrong
+    def anchor(self):
+        case = self.case
+        context = self.get_context()
+        gen = self.setpoints()
+        rebuild = self.JV is None or self.built != context[:-1]
+        if not rebuild and self.context == context and not self.untracked(gen) and not self.regMoved:
+            dx = self.changes(gen)
+            if np.any(dx != 0):
+                dV = self.JV @ dx
+                dist = np.max(np.abs(dV) * self.nodeScale)
+                err = np.max(np.abs(self.V0 + dV - case.snapV) * self.nodeScale)
+                if dist > 0:
+                    self.errRate = err / dist ** 2
+                rebuild = err > self.errBound
+
+        self.V0 = case.snapV.copy()
+        self.I0 = case.snapI.copy()
+        self.gen0 = gen
+        self.context = context
+        self.regMoved = False
+        if rebuild:
+            self.build()
+        self.regC0 = self.control_phasor(self.V0, self.I0)
+        self.regCheck = ~self.out_of_band(self.regC0)
+
+    ## PREDICTION
+    # predict the snapshot after the setpoint changes since the anchor
+    # returns False without changing the snapshot if a solution is needed
+    def predict(self):
+        if self.V0 is None or self.get_context() != self.context:
+            self.counts['solve'] += 1
+            return False
+        gen = self.setpoints()
+        if self.untracked(gen):
+            self.counts['solve'] += 1
+            return False
+
+        dx = self.changes(gen)
+        dV = self.JV @ dx
+        dist = np.max(np.abs(dV) * self.nodeScale)
+        if dist > self.bound or self.errRate * dist ** 2 > self.errBound:
+            self.counts['solve'] += 1
+            return False
+        if np.any(self.regCheck & self.out_of_band(self.regC0 + self.regJ @ dx)):
+            self.regMoved = True
+            self.counts['solve'] += 1
+            return False
+
+        case = self.case
+        np.add(self.V0, dV, out=case.snapV)
+        np.add(self.I0, self.JI @ dx, out=case.snapI)
+        case.update_snapshot()
+        self.counts['predict'] += 1
+        return True
@@ -0,0 +1,244 @@
+import multiprocessing as mp
+import numpy as np
+
+
+# environment of a dataset worker process
+WORKER = {}
+
+
+# inputs of the surrogate: demand of every load (kW, kvar) and setpoints of
+# every generator but the source (Pg, Qg), as set on the case
+def injections(case):
+    gens = case.genTable
+    rows = gens['fuel'] != 'source'
+    return np.concatenate([case.loadKW, case.loadKvar, gens['Pg'][rows], gens['Qg'][rows]])
+
+
+# outputs of the surrogate: node voltages and element currents of the last
+# snapshot, as complex phasors
+def snapshot_phasors(case):
+    return np.concatenate([case.snapV, case.snapI])
+
+
+## DATASET
+# build the environment of a worker once
+def dataset_init(env_fn, seed, jitter):
+    WORKER['env'] = env_fn()
+    WORKER['seed'] = seed
+    WORKER['jitter'] = jitter
+
+
+# solve one sample: the loads and renewables of a random profile hour, the
+# base setpoints (episodes without a clearing) or the dispatch of the market
+# (half of the samples each), moved by jitter * kVAbase (normal) within the
+# generator limits (or up to the starting setpoint beyond them), as the
+# steady state agents would
+def solve_sample(e, rng, jitter):
+    case = e.case
+    case.rollback(e.baseState, solve=False)
+    # the case file may not set the parsed powers (e.g. kvar of a pf or a
+    # voltage controlled generator), push them so that they are the inputs
+    case.genTable.mark_unsynced(['Pg', 'Qg'])
+    e.apply_profile(int(rng.integers(e.commonIndex.size)))
+    if e.market is not None and rng.random() < 0.5:
+        e.market.update_case(case)
+        e.market.get_dispatch()
+
+    gens = case.genTable
+    rows = np.flatnonzero(gens['fuel'] != 'source')
+    if jitter > 0 and len(rows) > 0:
+        Pg = gens['Pg'][rows]
+        Pmax = np.maximum(np.minimum(gens['Pmax'][rows], gens['kVAbase'][rows]), Pg)
+        gens['Pg'][rows] = np.clip(Pg + jitter * gens['kVAbase'][rows] * rng.normal(size=len(rows)),
+                                   0, np.maximum(Pmax, 0))
+        dg = rows[gens['fuel'][rows] != 'pv']
+        Qg = gens['Qg'][dg]
+        gens['Qg'][dg] = np.clip(Qg + jitter * gens['kVAbase'][dg] * rng.normal(size=len(dg)),
+                                 np.minimum(gens['Qmin'][dg], Qg), np.maximum(gens['Qmax'][dg], Qg))
+    case.sync_gen_df()
+
+    case.engine.command('set maxcontroliter=100')
+    case.engine.command('set mode=snap')
+    case.solve_case()
+    if not case.engine.converged():
+        return None
+    case.snapshot()
+    return injections(case), snapshot_phasors(case)
+
+
+# solve a chunk of samples in a worker, samples that did not converge are left out
+def dataset_chunk(task):
+    start, stop = task
+    e = WORKER['env']
+    X, Y = [], []
+    for sid in range(start, stop):
+        rng = np.random.default_rng([WORKER['seed'], sid])
+        res = solve_sample(e, rng, WORKER['jitter'])
+        if res is not None:
+            X.append(res[0])
+            Y.append(res[1])
+    return start, X, Y
+
+
+# supervised dataset of power flow solutions, solved in parallel workers
+# env_fn: picklable function (defined at module level) that builds the env
+#         (case, profiles, market), every worker builds its own
+# sampleNum: number of samples, sample i always gets the same hour and jitter
+# jitter: spread of the generator setpoints around the dispatch, per kVAbase
+# workers: number of processes, 0 to solve in this process
+# returns inputs X (samples x injections) and outputs Y (samples x phasors)
+def build_dataset(env_fn, sampleNum, seed=0, jitter=0.1, workers=None, chunk=64, start_method='spawn'):
+    tasks = [(start, min(start + chunk, sampleNum)) for start in range(0, sampleNum, chunk)]
+    if workers == 0:
+        dataset_init(env_fn, seed, jitter)
+        parts = [dataset_chunk(t) for t in tasks]
+    else:
+        ctx = mp.get_context(start_method)
+        with ctx.Pool(workers, initializer=dataset_init, initargs=(env_fn, seed, jitter)) as pool:
+            parts = list(pool.imap_unordered(dataset_chunk, tasks))
+
+    parts.sort(key=lambda p: p[0])
+    X = [x for _, xs, _ in parts for x in xs]
+    Y = [y for _, _, ys in parts for y in ys]
+    if len(X) < sampleNum:
+        print(f'Warning: {sampleNum - len(X)} of {sampleNum} samples did not converge!')
+    return np.array(X), np.array(Y)
+
+
+## MODEL
+# power flow surrogate, from the injections of a case to its snapshot phasors
+# the standardized injections are reduced to their rank leading principal
+# components, expanded to all monomials up to degree 2, and mapped by ridge
+# regression to the outRank leading principal components of the phasors.
+# A prediction is two small matrix products, on the CPU
+# checkEvery: snapshots served between two ground truth solutions (spot checks)
+class pfSurrogate():
+    def __init__(self, rank=16, outRank=64, ridge=1e-6, checkEvery=100):
+        self.rank = rank
+        self.outRank = outRank
+        self.ridge = ridge
+        self.checkEvery = checkEvery
+
+        # fitted model
+        self.xMean = None
+        self.xProj = None
+        self.pairs = None
+        self.W = None
+        self.yMean = None
+        self.yBasis = None
+        self.nodeNum = None
+
+        # serving: snapshots since the last spot check, prediction waiting for
+        # its spot check, network changes the model was served with
+        self.served = 0
+        self.pending = None
+        self.changeCount = None
+        self.counts = {'predict': 0, 'solve': 0}
+        # spot checks: largest relative voltage error and current error (A)
+        self.checks = []
+
+    # monomials of degree 0, 1 and 2 of the reduced inputs (terms, or samples x terms)
+    def expand(self, z):
+        i, j = self.pairs
+        return np.concatenate([np.ones(z.shape[:-1] + (1,)), z, z[..., i] * z[..., j]], axis=-1)
+
+    # reduced inputs, unit variance components
+    def reduce(self, X):
+        return (X - self.xMean) @ self.xProj
+
+    # fit on a dataset of build_dataset, nodeNum: number of node voltages in
+    # the phasors (the case's nodeNum), the rest are element currents
+    def fit(self, X, Y, nodeNum):
+        X = np.asarray(X, dtype=float)
+        Y = np.asarray(Y, dtype=complex)
+        self.nodeNum = nodeNum
+
+        # input components, scaled to unit variance
+        self.xMean = X.mean(axis=0)
+        scale = X.std(axis=0)
+        scale[scale == 0] = 1
+        _, S, Vt = np.linalg.svd((X - self.xMean) / scale, full_matrices=False)
+        r = min(self.rank, int((S > S[0] * 1e-9).sum()) if len(S) > 0 else 0)
+        self.xProj = Vt[:r].T / scale[:, None] / (S[:r] / np.sqrt(len(X)))
+        self.pairs = np.triu_indices(r)
+
+        # output components
+        self.yMean = Y.mean(axis=0)
+        _, _, Vt = np.linalg.svd(Y - self.yMean, full_matrices=False)
+        self.yBasis = Vt[:self.outRank]
+
+        # ridge regression of the output components on the monomials
+        F = self.expand(self.reduce(X))
+        C = (Y - self.yMean) @ self.yBasis.conj().T
+        A = F.T @ F + self.ridge * len(F) * np.eye(F.shape[1])
+        self.W = np.linalg.solve(A, F.T @ C)
+        return self
+
+    # phasors for the injections x of one case (or samples x injections)
+    def predict(self, x):
+        return self.yMean + (self.expand(self.reduce(x)) @ self.W) @ self.yBasis
+
+    # largest relative voltage error and current error (A) of predicted phasors
+    def errors(self, Y, Ytrue):
+        n = self.nodeNum
+        V, Vtrue = Y[..., :n], Ytrue[..., :n]
+        errV = np.max(np.abs(V - Vtrue) / np.maximum(np.abs(Vtrue), 1), axis=-1)
+        errI = np.max(np.abs(Y[..., n:] - Ytrue[..., n:]), axis=-1)
+        return errV, errI
+
+    ## SERVING
+    # predict the snapshot of a case into its snapshot arrays, unless a spot
+    # check is due or the network was changed since the last solution (the
+    # model only knows the injections). Returns False if the case has to be
+    # solved, call check after the solution
+    def serve(self, case):
+        y = self.predict(injections(case))
+        if self.changeCount == case.changeCount and len(y) == case.nodeNum + case.condNum \
+                and (self.checkEvery is None or self.served < self.checkEvery):
+            case.snapV[:] = y[:case.nodeNum]
+            case.snapI[:] = y[case.nodeNum:]
+            case.update_snapshot()
+            self.served += 1
+            self.counts['predict'] += 1
+            return True
+
+        self.pending = y if len(y) == case.nodeNum + case.condNum else None
+        self.counts['solve'] += 1
+        return False
+
+    # ground truth snapshot of a case after serve returned False, the error of
+    # the prediction is recorded
+    def check(self, case):
+        if self.pending is not None:
+            self.checks.append(tuple(float(e) for e in self.errors(self.pending, snapshot_phasors(case))))
+        self.pending = None
+        self.served = 0
+        self.changeCount = case.changeCount
+
+    # spot check statistics: number, mean and largest errors
+    def check_summary(self):
+        checks = np.array(self.checks).reshape(-1, 2)
+        if len(checks) == 0:
+            return {'checks': 0}
+        return {'checks': len(checks), 'meanErrV': checks[:, 0].mean(), 'maxErrV': checks[:, 0].max(),
+                'meanErrI': checks[:, 1].mean(), 'maxErrI': checks[:, 1].max()}
+
+    # write the fitted model to a npz file
+    def save(self, fp):
+        np.savez(fp, rank=self.rank, outRank=self.outRank, ridge=self.ridge,
+                 checkEvery=-1 if self.checkEvery is None else self.checkEvery,
+                 xMean=self.xMean, xProj=self.xProj, W=self.W, yMean=self.yMean,
+                 yBasis=self.yBasis, nodeNum=self.nodeNum)
+
+
+# read a model written by pfSurrogate.save
+def load_surrogate(fp):
+    with np.load(fp) as data:
+        checkEvery = int(data['checkEvery'])
+        s = pfSurrogate(int(data['rank']), int(data['outRank']), float(data['ridge']),
+                        None if checkEvery < 0 else checkEvery)
+        for f in ['xMean', 'xProj', 'W', 'yMean', 'yBasis']:
+            setattr(s, f, data[f])
+        s.pairs = np.triu_indices(s.xProj.shape[1])
+        s.nodeNum = int(data['nodeNum'])
+    return s
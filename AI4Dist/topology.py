@@ -0,0 +1,146 @@
+import numpy as np
+
+
+# compact index of the radial tree of a case, rooted at the source (bus 0)
+# built once from the bus pairs of lines and transformers: parent and depth of
+# every bus, children in CSR form (childPtr/childIdx) and Euler tour entry and
+# exit indexes (tin/tout). The subtree of bus v is order[tin[v]:tout[v]], so
+# ancestor, descendant and subtree questions are O(1) comparisons and subtree
+# masks are one vectorized comparison over all buses
+# edges closing a loop of a meshed network are not part of the tree, buses not
+# connected to the source have parent -1 and an empty subtree
+class topoIndex():
+    def __init__(self, busNum, lineT, xfmrT=()):
+        self.busNum = busNum
+        self.lineT = np.array(lineT, dtype=int).reshape(-1, 2)
+        self.xfmrT = np.array(xfmrT, dtype=int).reshape(-1, 2)
+        self.build_tree()
+        self.build_tour()
+
+        # bus on the far side of every line, -1 for a line closing a loop
+        self.lineChild = self.edge_children(self.lineT)
+        self.xfmrChild = self.edge_children(self.xfmrT)
+
+    # parent and depth by breadth first search from the source
+    def build_tree(self):
+        n = self.busNum
+        edges = np.concatenate([self.lineT, self.xfmrT])
+        edges = edges[edges[:, 0] != edges[:, 1]]
+        # undirected adjacency in CSR form
+        src = np.concatenate([edges[:, 0], edges[:, 1]])
+        dst = np.concatenate([edges[:, 1], edges[:, 0]])
+        perm = np.argsort(src, kind='stable')
+        adjPtr = np.zeros(n + 1, dtype=int)
+        np.cumsum(np.bincount(src, minlength=n), out=adjPtr[1:])
+        adjIdx = dst[perm]
+
+        self.parent = -np.ones(n, dtype=int)
+        self.depth = -np.ones(n, dtype=int)
+        self.depth[0] = 0
+        bfs = [0]
+        frontier = np.array([0])
+        while len(frontier) > 0:
+            # neighbours of the whole frontier at once, first visit wins
+            starts, ends = adjPtr[frontier], adjPtr[frontier + 1]
+            counts = ends - starts
+            nb = adjIdx[np.repeat(ends - counts.cumsum(), counts) + np.arange(counts.sum())]
+            par = np.repeat(frontier, counts)
+            new = self.depth[nb] < 0
+            nb, par = nb[new], par[new]
+            nb, first = np.unique(nb, return_index=True)
+            self.parent[nb] = par[first]
+            self.depth[nb] = self.depth[par[first]] + 1
+            bfs.append(nb)
+            frontier = nb
+        self.bfsOrder = np.concatenate([np.atleast_1d(b) for b in bfs])
+
+        # children in CSR form, in bus order
+        buses = np.flatnonzero(self.parent >= 0)
+        buses = buses[np.argsort(self.parent[buses], kind='stable')]
+        self.childPtr = np.zeros(n + 1, dtype=int)
+        np.cumsum(np.bincount(self.parent[buses], minlength=n), out=self.childPtr[1:])
+        self.childIdx = buses
+
+    # Euler tour: subtree sizes from the leaves up, then entry indexes from the
+    # source down, the children of a bus take consecutive ranges after it
+    def build_tour(self):
+        n = self.busNum
+        size = np.zeros(n, dtype=int)
+        size[self.bfsOrder] = 1
+        for d in range(self.depth.max(), 0, -1):
+            level = np.flatnonzero(self.depth == d)
+            np.add.at(size, self.parent[level], size[level])
+        self.size = size
+
+        self.tin = np.full(n, n, dtype=int)
+        self.tin[0] = 0
+        for d in range(1, self.depth.max() + 1):
+            level = self.childIdx[np.isin(self.childIdx, np.flatnonzero(self.depth == d))]
+            # level is sorted by parent, offset of each child within its siblings
+            par = self.parent[level]
+            csum = np.cumsum(size[level]) - size[level]
+            first = np.searchsorted(par, par)
+            self.tin[level] = self.tin[par] + 1 + csum - csum[first]
+        self.tout = np.where(self.tin < n, self.tin + size, n)
+        self.order = np.argsort(self.tin, kind='stable')[:int(size[0])]
+
+    # bus on the far side of each (F, T) pair, -1 if the pair is not a tree edge
+    def edge_children(self, pairs):
+        child = -np.ones(len(pairs), dtype=int)
+        if len(pairs) > 0:
+            F, T = pairs[:, 0], pairs[:, 1]
+            child[self.parent[T] == F] = T[self.parent[T] == F]
+            child[self.parent[F] == T] = F[self.parent[F] == T]
+        return child
+
+    ## QUERIES
+    # True if u is an ancestor of v (or v itself), u and v can be arrays
+    def is_ancestor(self, u, v):
+        return (self.tin[u] <= self.tin[v]) & (self.tin[v] < self.tout[u])
+
+    # True if v is in the subtree of u, i.e. downstream of u
+    def is_descendant(self, v, u):
+        return self.is_ancestor(u, v)
+
+    # children of a bus
+    def children(self, v):
+        return self.childIdx[self.childPtr[v]:self.childPtr[v + 1]]
+
+    # buses of the subtree of v, v first
+    def subtree(self, v):
+        return self.order[self.tin[v]:self.tout[v]]
+
+    # boolean mask over all buses of the subtree of v
+    def subtree_mask(self, v):
+        return (self.tin >= self.tin[v]) & (self.tin < self.tout[v])
+
+    # masks of several subtrees at once (len(vs) x busNum)
+    def subtree_masks(self, vs):
+        vs = np.asarray(vs)
+        return (self.tin[None, :] >= self.tin[vs, None]) & (self.tin[None, :] < self.tout[vs, None])
+
+    # which of the elements at buses elmtBuses are in the subtree of v
+    def elements_below(self, v, elmtBuses):
+        return self.is_ancestor(v, np.asarray(elmtBuses))
+
+    # buses downstream of a line (empty for a line closing a loop)
+    def line_subtree(self, l):
+        c = self.lineChild[l]
+        return self.subtree(c) if c >= 0 else self.order[:0]
+
+    def line_subtree_mask(self, l):
+        c = self.lineChild[l]
+        return self.subtree_mask(c) if c >= 0 else np.zeros(self.busNum, dtype=bool)
+
+    # True if bus v is downstream of line l, v can be an array
+    def below_line(self, v, l):
+        c = self.lineChild[l]
+        return self.is_ancestor(c, v) & (c >= 0)
+
+    # buses on the path from v up to the source, v first
+    def path_to_source(self, v):
+        path = []
+        while v >= 0:
+            path.append(v)
+            v = self.parent[v]
+        return np.array(path, dtype=int)
@@ -0,0 +1,189 @@
+import os, json, glob
+import numpy as np
+
+
+# flatten an observation, action or reward of an agent into a float vector
+# dicts of measurements (env.take_sample) are concatenated in key order
+def flat_record(x):
+    if x is None:
+        return np.zeros(0, dtype=np.float32)
+    if isinstance(x, dict):
+        if len(x) == 0:
+            return np.zeros(0, dtype=np.float32)
+        return np.concatenate([flat_record(x[k]) for k in sorted(x)])
+    return np.asarray(x, dtype=np.float32).ravel()
+
+
+# growable column of a chunk, rows are appended into preallocated memory
+# the width is set by the first non-empty row, empty rows before and after it
+# are NaN (e.g. no action and reward at the reset of an episode)
+class column():
+    def __init__(self, dtype, width=None, capacity=1024):
+        self.dtype = dtype
+        self.capacity = capacity
+        self.data = None if width is None else np.zeros((capacity, width), dtype=dtype)
+        self.size = 0
+
+    def append(self, row):
+        row = np.asarray(row)
+        if self.data is None:
+            if row.size == 0:
+                self.size += 1
+                return
+            self.data = np.full((max(self.capacity, 2 * self.size), row.size), np.nan, dtype=self.dtype)
+        if self.size == len(self.data):
+            self.data = np.concatenate([self.data, np.zeros_like(self.data)])
+        if row.size == 0:
+            row = np.nan
+        elif row.size != self.data.shape[1]:
+            raise ValueError(f'Row of size {row.size} for a column of width {self.data.shape[1]}!')
+        self.data[self.size] = row
+        self.size += 1
+
+    def values(self):
+        if self.data is None:
+            return np.zeros((self.size, 0), dtype=self.dtype)
+        return self.data[:self.size]
+
+    def clear(self):
+        self.size = 0
+
+
+# append-only writer of the trajectories of all agents of an env
+# one row per observation: the reset of an episode (step 0, no action and
+# reward) and every step after it (timesteps since the reset). Observation, action and reward of every agent, done
+# flag, simulation time and profile timestamp are columns, fault and hour are
+# kept per episode. Rows are written when an episode ends and at least
+# chunk rows are collected, as a folder of uncompressed .npy columns that
+# trajectoryLoader memory maps. Episodes never span two chunks
+# chunk folders are named after the process, so several envs (e.g. the workers
+# of a vecEnv) can write into the same path
+class trajectoryWriter():
+    def __init__(self, path, agents, chunk=100000):
+        self.path = path
+        self.chunk = chunk
+        self.agentNum = len(agents)
+        os.makedirs(path, exist_ok=True)
+        self.prefix = f'chunk-{os.getpid()}-'
+        self.chunkNum = len(glob.glob(os.path.join(path, self.prefix + '*[0-9]')))
+        info = {'agents': [{'type': type(a).__name__, 'bus1': a.bus1, 'bus2': a.bus2,
+                            'timescale': a.timescale} for a in agents]}
+        with open(os.path.join(path, 'agents.json'), 'w') as fh:
+            json.dump(info, fh, indent=1)
+
+        self.columns = {'step': column(np.int32, 1),
+                        'time': column(np.float64, 1),
+                        'timestamp': column(np.int64, 1),
+                        'done': column(bool, 1)}
+        for i in range(self.agentNum):
+            for name in ('obs', 'act', 'rew'):
+                self.columns[f'{name}.{i}'] = column(np.float32)
+        self.episodes = []
+        self.open = False
+
+    # start an episode, info: json-able metadata (hour, fault, ...)
+    def new_episode(self, info):
+        self.end_episode()
+        self.episodes.append(dict(info, start=self.rows()))
+        self.open = True
+
+    def rows(self):
+        return self.columns['step'].size
+
+    # add a row, obs/acts/rews: per agent values (flattened by flat_record)
+    def record(self, step, t, timestamp, done, obs, acts, rews):
+        cols = self.columns
+        cols['step'].append(step)
+        cols['time'].append(t)
+        cols['timestamp'].append(timestamp)
+        cols['done'].append(done)
+        for i in range(self.agentNum):
+            cols[f'obs.{i}'].append(flat_record(obs[i]))
+            cols[f'act.{i}'].append(flat_record(acts[i]))
+            cols[f'rew.{i}'].append(flat_record(rews[i]))
+
+    # close the current episode, the chunk is written once it is large enough
+    def end_episode(self):
+        if not self.open:
+            return
+        self.open = False
+        if self.rows() >= self.chunk:
+            self.flush()
+
+    # write the collected rows as a chunk
+    def flush(self):
+        if self.rows() == 0:
+            return
+        name = f'{self.prefix}{self.chunkNum:06d}'
+        tmp = os.path.join(self.path, name + '.tmp')
+        os.makedirs(tmp, exist_ok=True)
+        for n, c in self.columns.items():
+            np.save(os.path.join(tmp, f'{n}.npy'), c.values())
+        with open(os.path.join(tmp, 'meta.json'), 'w') as fh:
+            json.dump({'rows': self.rows(), 'columns': list(self.columns), 'episodes': self.episodes}, fh)
+        os.replace(tmp, os.path.join(self.path, name))
+        self.chunkNum += 1
+        for c in self.columns.values():
+            c.clear()
+        self.episodes = []
+
+    # write everything left
+    def close(self):
+        self.end_episode()
+        self.flush()
+
+
+# memory mapped reader of the chunks written by trajectoryWriter
+# columns are only mapped, pages are read when rows are accessed, so sampling
+# minibatches from tens of GB does not load the dataset
+# loader.sample(256) -> dict of obs.i/act.i/rew.i/next_obs.i/done/... arrays of
+# random transitions (a row and the observation before it)
+class trajectoryLoader():
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'agents.json')) as fh:
+            self.agents = json.load(fh)['agents']
+        self.chunks = []
+        self.episodes = []
+        for d in sorted(glob.glob(os.path.join(path, 'chunk-*[0-9]'))):
+            with open(os.path.join(d, 'meta.json')) as fh:
+                meta = json.load(fh)
+            cols = {n: np.load(os.path.join(d, f'{n}.npy'), mmap_mode='r') for n in meta['columns']}
+            k = len(self.chunks)
+            self.chunks.append(cols)
+            ends = [e['start'] for e in meta['episodes'][1:]] + [meta['rows']]
+            for e, end in zip(meta['episodes'], ends):
+                self.episodes.append(dict(e, chunk=k, end=end))
+        if len(self.chunks) == 0:
+            raise ValueError(f'No trajectory chunks at {path}!')
+        self.columns = list(self.chunks[0])
+        self.chunkRows = np.array([len(c['step']) for c in self.chunks])
+
+        # rows that end a transition (not the reset of an episode), per chunk
+        self.transitions = [np.flatnonzero(np.asarray(c['step'])[:, 0] > 0) for c in self.chunks]
+        self.transitionNum = np.array([len(t) for t in self.transitions])
+
+    def __len__(self):
+        return int(self.chunkRows.sum())
+
+    # rows of an episode as a dict of columns
+    def episode(self, i):
+        e = self.episodes[i]
+        return {n: np.asarray(c[e['start']:e['end']]) for n, c in self.chunks[e['chunk']].items()}
+
+    # batchSize random transitions, drawn uniformly over all transitions
+    def sample(self, batchSize, rng=np.random):
+        p = self.transitionNum / self.transitionNum.sum()
+        chunks = rng.choice(len(self.chunks), size=batchSize, p=p)
+        batch = {n: [] for n in self.columns}
+        batch.update({f'next_obs.{i}': [] for i in range(len(self.agents))})
+        for k in np.unique(chunks):
+            cols = self.chunks[k]
+            rows = np.sort(self.transitions[k][rng.randint(0, self.transitionNum[k], size=np.sum(chunks == k))])
+            for n, c in cols.items():
+                if n.startswith('obs.'):
+                    batch['next_' + n].append(c[rows])
+                    batch[n].append(c[rows - 1])
+                else:
+                    batch[n].append(c[rows])
+        return {n: np.concatenate(v) for n, v in batch.items()}
@@ -1,6 +1,5 @@
 import numpy as np
 import pandas as pd
-from datetime import datetime
 
 
 # convert Cartesian to Polar for complex numbers
@@ -19,6 +18,14 @@ def cart_to_pol(arr):
 
     return mag, angle
 
+# phase (a, b, c) to sequence (0, 1, 2) transformation
+A_OP = np.exp(2j*np.pi/3)
+SEQ_MATRIX = np.array([[1, 1, 1], [1, A_OP, A_OP**2], [1, A_OP**2, A_OP]]) / 3
+
+# sequence components of phase quantities, arr is (..., 3) complex
+def phase_to_seq(arr):
+    return arr @ SEQ_MATRIX.T
+
 ## Get the number of a string, ignoring other characters
 def getNum(string):
     length = len(string)
@@ -51,27 +58,28 @@ def normalize(df):
     return result
 
 
+# hourly values of an EMDA table (one row per day, one 'HH:MM' column per hour)
+# as a series indexed by date_time, days outside [start, end] and missing
+# hours are dropped. Timestamps are day + hour offset, no string formatting
+def hourly_series(df, start, end):
+    hourCols = [c for c in df.columns if ':' in c]
+    days = pd.to_datetime(df['date'], format='%Y-%m-%d').to_numpy(dtype='datetime64[ns]')
+    keep = (days >= np.datetime64(start, 'ns')) & (days <= np.datetime64(end, 'ns'))
+    offsets = pd.to_timedelta([c + ':00' for c in hourCols]).to_numpy(dtype='timedelta64[ns]')
+
+    stamps = (days[keep][:, None] + offsets[None, :]).ravel()
+    values = df.loc[keep, hourCols].to_numpy(dtype=float).ravel()
+    valid = ~np.isnan(values)
+    return pd.Series(values[valid], index=pd.DatetimeIndex(stamps[valid], name='date_time'), name='value')
+
+
 # load pv and load profile
 def parse_profile(pv_path, load_path):
-    date_range = pd.date_range(datetime(2019, 1, 1), datetime(2019, 12, 31))
-    
-    df_pv = pd.read_csv(pv_path, index_col='date', parse_dates=True)
-    df_pv = df_pv.loc[df_pv.index.isin(date_range)]
-    df_pv = df_pv.set_index([df_pv.index, 'fuel'])
-    df_pv = pd.DataFrame({'value': df_pv.stack()}).reset_index(1)
-    df_pv.index = pd.to_datetime(
-        df_pv.index.get_level_values(0).strftime('%Y-%m-%d ') + df_pv.index.get_level_values(1))
-    df_pv.index.name = 'date_time'
-
-    df_load = pd.read_csv(load_path, index_col='date', parse_dates=True)
-    df_load = df_load.loc[df_load.index.isin(date_range)]
-    df_load = pd.DataFrame({'load': df_load.stack()})
-    df_load.index = pd.to_datetime(
-        df_load.index.get_level_values(0).strftime('%Y-%m-%d ') + df_load.index.get_level_values(1))
-    df_load.index.name = 'date_time'
-
-    pv_profile = df_pv[df_pv['fuel']=='solar']['value']
-    load_profile = df_load['load']
+    start, end = '2019-01-01', '2019-12-31'
+
+    df_pv = pd.read_csv(pv_path)
+    pv_profile = hourly_series(df_pv[df_pv['fuel']=='solar'], start, end)
+    load_profile = hourly_series(pd.read_csv(load_path), start, end)
 
     pv_profile = normalize(pv_profile)
     load_profile = normalize(load_profile)
@@ -0,0 +1,142 @@
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import random
+import numpy as np
+
+
+# flatten the state of the training agent into a float vector
+def flat_obs(ob):
+    if ob is None:
+        return np.zeros(0)
+    return np.asarray(ob, dtype=float).ravel()
+
+
+# run one environment in a worker process
+# commands come through a pipe, observations, rewards and done flags are
+# written into the shared memory buffers of the vecEnv instead of pickled back
+def env_worker(remote, env_fn, idx, seed, mode):
+    np.random.seed(seed)
+    random.seed(seed)
+    e = env_fn()
+    ob = flat_obs(e.reset(mode))
+
+    # report the observation size and attach to the buffers
+    remote.send(ob.size)
+    names, envNum, obsDim = remote.recv()
+    shms = [shared_memory.SharedMemory(name=n) for n in names]
+    obs = np.ndarray((envNum, obsDim), dtype=float, buffer=shms[0].buf)
+    termObs = np.ndarray((envNum, obsDim), dtype=float, buffer=shms[1].buf)
+    rewards = np.ndarray(envNum, dtype=float, buffer=shms[2].buf)
+    dones = np.ndarray(envNum, dtype=bool, buffer=shms[3].buf)
+    obs[idx] = ob
+    remote.send(True)
+
+    while True:
+        cmd, data = remote.recv()
+        if cmd == 'step':
+            ob, R, done, _ = e.step()
+            rewards[idx] = R
+            dones[idx] = done
+            # autoreset, the last observation of the episode is kept aside
+            if done:
+                termObs[idx] = flat_obs(ob)
+                ob = e.reset(mode)
+            obs[idx] = flat_obs(ob)
+            remote.send(True)
+        elif cmd == 'reset':
+            obs[idx] = flat_obs(e.reset(mode))
+            remote.send(True)
+        elif cmd == 'get_attr':
+            remote.send(getattr(e, data))
+        elif cmd == 'close':
+            break
+        else:
+            raise ValueError(f'Unknown command {cmd} for environment worker!')
+
+    del obs, termObs, rewards, dones
+    for s in shms:
+        s.close()
+    remote.close()
+
+
+# vectorized environment, runs envNum env instances in worker processes
+# env_fn: picklable function (defined at module level) that builds one env,
+#         every worker builds and owns its own env and dssCase
+# all environments are stepped in lockstep and reset automatically when done
+class vecEnv():
+    def __init__(self, env_fn, envNum, mode='sequential', seed=0, start_method='spawn'):
+        self.envNum = envNum
+        self.mode = mode
+        self.closed = False
+        ctx = mp.get_context(start_method)
+
+        # start workers
+        self.remotes = []
+        self.procs = []
+        for i in range(envNum):
+            remote, workRemote = ctx.Pipe()
+            p = ctx.Process(target=env_worker, args=(workRemote, env_fn, i, seed + i, mode), daemon=True)
+            p.start()
+            workRemote.close()
+            self.remotes.append(remote)
+            self.procs.append(p)
+
+        # allocate shared buffers once the observation size is known
+        dims = [r.recv() for r in self.remotes]
+        if len(set(dims)) > 1:
+            raise ValueError(f'Environments have different observation sizes {dims}!')
+        self.obsDim = dims[0]
+        itemSize = np.dtype(float).itemsize
+        sizes = [envNum*self.obsDim*itemSize, envNum*self.obsDim*itemSize, envNum*itemSize, envNum]
+        self.shms = [shared_memory.SharedMemory(create=True, size=max(s, 1)) for s in sizes]
+        self.obs = np.ndarray((envNum, self.obsDim), dtype=float, buffer=self.shms[0].buf)
+        self.termObs = np.ndarray((envNum, self.obsDim), dtype=float, buffer=self.shms[1].buf)
+        self.rewards = np.ndarray(envNum, dtype=float, buffer=self.shms[2].buf)
+        self.dones = np.ndarray(envNum, dtype=bool, buffer=self.shms[3].buf)
+        # the workers reset their env to size the buffers, the first reset()
+        # returns these observations instead of starting another episode
+        self.fresh = True
+        for r in self.remotes:
+            r.send(([s.name for s in self.shms], envNum, self.obsDim))
+        for r in self.remotes:
+            r.recv()
+
+    # send a command to all workers and wait for all of them
+    def broadcast(self, cmd, data=None):
+        for r in self.remotes:
+            r.send((cmd, data))
+        return [r.recv() for r in self.remotes]
+
+    # reset all environments, returns (envNum x obsDim) observations
+    def reset(self):
+        if not self.fresh:
+            self.broadcast('reset')
+        self.fresh = False
+        return self.obs.copy()
+
+    # step all environments once
+    # returns observations (envNum x obsDim), rewards and done flags, finished
+    # environments are already reset and their last observation is in infos
+    def step(self):
+        self.fresh = False
+        self.broadcast('step')
+        infos = [{'terminal_observation': self.termObs[i].copy()} if self.dones[i] else {} for i in range(self.envNum)]
+        return self.obs.copy(), self.rewards.copy(), self.dones.copy(), infos
+
+    # read an attribute of every environment (pickled, not for the hot path)
+    def get_attr(self, name):
+        return self.broadcast('get_attr', name)
+
+    # stop workers and release shared buffers
+    def close(self):
+        if self.closed:
+            return
+        for r in self.remotes:
+            r.send(('close', None))
+        for p in self.procs:
+            p.join()
+        del self.obs, self.termObs, self.rewards, self.dones
+        for s in self.shms:
+            s.close()
+            s.unlink()
+        self.closed = True
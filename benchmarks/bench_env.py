@@ -0,0 +1,234 @@
+import sys, os, time, json, argparse, platform, tracemalloc
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+import numpy as np
+import AI4Dist.env as aienv
+from AI4Dist.dss_tools import dssCase
+from AI4Dist.market.market_template import DoNothingMarket
+from AI4Dist.agent.AgentTemplate import agent
+from AI4Dist.agent.OCRelayAgent import OCAgent
+
+
+# benchmarks of the env and dssCase hot paths on the bundled cases
+# python bench_env.py --engine nosolve      Python overhead only (stand-in engine)
+# python bench_env.py --engine direct       with the in-process OpenDSS solver
+# python bench_env.py --engine synthetic    without OpenDSS, see engine.synthetic_engine
+# results are written as json and compared against the stored baseline of the
+# same case, benchmark and engine, a slowdown beyond the tolerance is reported
+# as a regression (exit code 1). --save-baseline stores the results as baseline
+
+BENCH_CASES = {'IEEE34': 'case/IEEE34/ieee34Mod1_DER.dss',
+               'IEEE37': 'case/IEEE37/ieee37.dss',
+               'ISU': 'case/ISU/Master.dss'}
+
+BENCH_PROFILES = {'load_profile': 'profiles/load_profile/ercot_houston_load.csv',
+                  'pv_profile': 'profiles/PV_profile/ercot_houston_pv.csv',
+                  'wind_profile': 'profiles/wind_profile/ercot_houston_wind.csv'}
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+# steady state agent reading the voltages of a bus, drives step_ss_snapshots
+# and take_sample
+class probeAgent(agent):
+    def __init__(self, bus1):
+        super().__init__(bus1, None, 'steadystate')
+        self.obs = ['VLN', 'Vseq']
+        self.state = None
+        self.reward = 0
+
+    def observe(self):
+        self.state = self.env.take_sample(self.env.agents.index(self))
+
+
+# environment of a bundled case with an overcurrent relay on the feeder head
+# (dynamic) or a voltage probe at the last three phase bus (steady state)
+def make_env(caseName, engine, timescale, adaptive=False):
+    params = {'time_step': 0.0167,
+              'max_step': 600,
+              'DEREnable': True,
+              'engine': engine,
+              'adaptive': adaptive}
+    for k, v in BENCH_PROFILES.items():
+        params[k] = os.path.join(ROOT, v)
+    casePath = os.path.join(ROOT, BENCH_CASES[caseName])
+
+    # first line out of the source
+    case = dssCase(casePath, params['time_step'], engine)
+    line = case.lineNames[0]
+    case.engine.set_active_element('line.' + line)
+    bus1, bus2 = [b.split('.')[0] for b in case.engine.elmt_bus_names()]
+    I1 = case.snap_line_I(line, 'Iseq', 3)[1]
+
+    if timescale == 'dynamic':
+        # pickup above the load current
+        a = OCAgent(bus1, bus2, line, max(2 * I1, 1.0), 0.1, 'IEEE-VIT')
+    else:
+        a = probeAgent([b for b in case.busNames if b in case.busSeqRow][-1])
+    del case
+
+    return aienv.env(casePath, [a], market=DoNothingMarket(), params=params)
+
+
+# wall time of n calls, setup runs before each call and is not timed
+def time_calls(fn, n, setup=None):
+    times = np.empty(n)
+    for i in range(n):
+        if setup is not None:
+            setup()
+        t = time.perf_counter()
+        fn()
+        times[i] = time.perf_counter() - t
+    return times
+
+
+# peak Python memory of a few calls, traced apart from the timing
+def peak_memory(fn, n=3, setup=None):
+    tracemalloc.start()
+    for i in range(n):
+        if setup is not None:
+            setup()
+        fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+# benchmarks of a case as {name: (fn, calls, setup)}
+def case_benchmarks(caseName, engine, repeat):
+    np.random.seed(0)
+    casePath = os.path.join(ROOT, BENCH_CASES[caseName])
+    dynEnv = make_env(caseName, engine, 'dynamic')
+    ssEnv = make_env(caseName, engine, 'steadystate')
+    ssEnv.reset('random')
+    gens = ssEnv.case.genTable
+    hours = dynEnv.commonIndex.size
+
+    # steps run on through episodes, resets are not timed
+    stepState = {'done': 1}
+
+    def step_setup(e, mode):
+        def setup():
+            if stepState['done']:
+                e.reset(mode)
+                stepState['done'] = 0
+        return setup
+
+    def step(e):
+        def fn():
+            stepState['done'] = e.step()[2]
+        return fn
+
+    def perturb_gens():
+        gens['Pg'] = gens['Pg'] * np.random.uniform(0.95, 1.05, len(gens))
+
+    dynEnv.hourNum = None
+    return {
+        'case_init': (lambda: dssCase(casePath, 0.0167, engine), max(repeat // 20, 3), None),
+        'apply_profile': (lambda: ssEnv.apply_profile(int(np.random.randint(hours))), repeat, None),
+        'sync_gen_df': (ssEnv.case.sync_gen_df, repeat, perturb_gens),
+        'reset_sequential': (lambda: dynEnv.reset('sequential'), max(repeat // 10, 3), None),
+        'reset_random': (lambda: dynEnv.reset('random'), max(repeat // 10, 3), None),
+        'step_dynamic_event': (step(dynEnv), repeat, step_setup(dynEnv, 'random')),
+        'step_ss_snapshots': (step(ssEnv), repeat, step_setup(ssEnv, 'random')),
+        'take_sample': (lambda: ssEnv.take_sample(0), repeat, None),
+    }
+
+
+# run all benchmarks of the selected cases
+def run_benchmarks(cases, engine, repeat, only=None):
+    results = []
+    for caseName in cases:
+        for name, (fn, n, setup) in case_benchmarks(caseName, engine, repeat).items():
+            if only is not None and name not in only:
+                continue
+            # warm up caches and lazy initialization
+            time_calls(fn, 1, setup)
+            times = time_calls(fn, n, setup)
+            results.append({'case': caseName,
+                            'bench': name,
+                            'engine': engine,
+                            'n': n,
+                            'mean_ms': 1e3 * times.mean(),
+                            'median_ms': 1e3 * np.median(times),
+                            'p95_ms': 1e3 * np.percentile(times, 95),
+                            'per_sec': 1 / times.mean(),
+                            'peak_kb': peak_memory(fn, 3, setup) / 1024})
+            print(f'{caseName:8s} {name:20s} {results[-1]["median_ms"]:10.3f} ms {results[-1]["per_sec"]:10.1f} /s '
+                  f'{results[-1]["peak_kb"]:10.1f} kB')
+    return results
+
+
+def result_key(r):
+    return f'{r["case"]}/{r["bench"]}/{r["engine"]}'
+
+
+# compare results against the baseline, returns the regressions
+def compare(results, baseline, tol):
+    base = {result_key(r): r for r in baseline['results']}
+    regressions = []
+    for r in results:
+        b = base.get(result_key(r))
+        if b is None:
+            continue
+        ratio = r['median_ms'] / b['median_ms']
+        flag = ''
+        if ratio > 1 + tol:
+            flag = 'REGRESSION'
+            regressions.append((result_key(r), ratio))
+        elif ratio < 1 / (1 + tol):
+            flag = 'faster'
+        print(f'{result_key(r):45s} {b["median_ms"]:10.3f} -> {r["median_ms"]:10.3f} ms  x{ratio:5.2f} {flag}')
+    return regressions
+
+
+def meta_info():
+    return {'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'machine': platform.machine()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the env and dssCase hot paths')
+    parser.add_argument('--engine', default='nosolve', help="'nosolve' (Python overhead), 'synthetic', 'direct' or 'com'")
+    parser.add_argument('--cases', nargs='+', default=list(BENCH_CASES))
+    parser.add_argument('--bench', nargs='+', default=None, help='run only these benchmarks')
+    parser.add_argument('--repeat', type=int, default=200, help='calls per benchmark')
+    parser.add_argument('--out', default=None, help='json file of the results')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--tol', type=float, default=0.25, help='allowed slowdown against the baseline')
+    parser.add_argument('--save-baseline', action='store_true', help='store the results in the baseline')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.cases, args.engine, args.repeat, args.bench)
+    report = {'meta': meta_info(), 'results': results}
+    if args.out is not None:
+        with open(args.out, 'w') as fh:
+            json.dump(report, fh, indent=1)
+
+    regressions = []
+    if os.path.isfile(args.baseline):
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+        print(f'\nagainst baseline of {baseline["meta"]["time"]} ({baseline["meta"]["platform"]})')
+        regressions = compare(results, baseline, args.tol)
+
+    if args.save_baseline:
+        # replace the entries of this run, keep the other engines and cases
+        old = []
+        if os.path.isfile(args.baseline):
+            keys = set(result_key(r) for r in results)
+            old = [r for r in baseline['results'] if result_key(r) not in keys]
+        with open(args.baseline, 'w') as fh:
+            json.dump({'meta': meta_info(), 'results': old + results}, fh, indent=1)
+        return 0
+
+    if len(regressions) > 0:
+        print(f'\n{len(regressions)} regression(s) beyond {args.tol:.0%}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
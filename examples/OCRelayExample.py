@@ -13,9 +13,16 @@ bus_coords = r'C:\Users\Dongqi Wu\OneDrive\Work\iEnergy\case\IEEE34\IEEE34_BusXY
 params = {'time_step' : 0.0167,
           'max_step' : 600,
           'DEREnable' : True,
+          'engine' : 'com',     # 'com' (Windows OpenDSS) or 'direct' (in-process OpenDSSDirect.py)
           'pv_profile' : r'..\..\profiles\pv_profile\ercot_houston_pv.csv',
           'wind_profile' : r'..\..\profiles\wind_profile\ercot_houston_wind.csv',
           'load_profile' : r'..\..\profiles\load_profile\ercot_houston_load.csv',
+          'adaptive' : False,       # solve the dynamic steps between fault onset and relay events at once, see env.steps_to_next_event
+          'instrument' : None,      # True or {'jsonl': file, 'openmetrics': file, 'every': episodes} to record phase timings and engine calls, see env.get_stats
+          'case_cache' : None,      # folder to cache the parsed network info of cases, None to parse at every start
+          'waveform_path' : None,   # folder to write the relay waveforms in compressed chunks of 'waveform_chunk' episodes, read them with recorder.waveReader
+          'trajectory_path' : None, # folder to write observations, actions and rewards of all agents for offline RL, read them with trajectory.trajectoryLoader
+          'profile_store' : None,   # folder of a compiled profile store (python -m AI4Dist.profile_store <folder>), profiles are then given by name, e.g. 'ercot_houston_load'
           }
 
 
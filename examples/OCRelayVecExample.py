@@ -0,0 +1,38 @@
+import sys, os
+sys.path.append(r"..\\")
+import AI4Dist.env as aienv
+from AI4Dist.vec_env import vecEnv
+from AI4Dist.market.market_template import DoNothingMarket
+from AI4Dist.agent.OCRelayAgent import OCAgent
+
+
+case_path = r'C:\Users\Dongqi Wu\OneDrive\Work\iEnergy\case\IEEE34\ieee34Mod1.dss'
+
+
+params = {'time_step' : 0.0167,
+          'max_step' : 600,
+          'DEREnable' : True,
+          'engine' : 'direct',  # each worker runs its own in-process engine
+          'pv_profile' : r'..\..\profiles\pv_profile\ercot_houston_pv.csv',
+          'wind_profile' : r'..\..\profiles\wind_profile\ercot_houston_wind.csv',
+          'load_profile' : r'..\..\profiles\load_profile\ercot_houston_load.csv',
+          }
+
+
+# build one environment, called inside every worker process
+def make_env():
+    agent1 = OCAgent('800','802','l1', 70, 0.1, 'IEEE-VIT')
+    agent2 = OCAgent('830','854','l15', 60, 0.1, 'IEEE-VIT')
+    return aienv.env(case_path, [agent1, agent2], market=DoNothingMarket(), params=params)
+
+
+if __name__ == '__main__':
+    # one environment per core
+    myEnv = vecEnv(make_env, os.cpu_count(), mode='random')
+
+    # observations, rewards and done flags are (envNum, ...) arrays
+    obs = myEnv.reset()
+    for i in range(2000):
+        obs, R, done, infos = myEnv.step()
+
+    myEnv.close()
@@ -0,0 +1,32 @@
+import sys, os
+sys.path.append(r"..\\")
+import AI4Dist.env as aienv
+from AI4Dist.market.market_template import DoNothingMarket
+import matplotlib.pyplot as plt
+
+
+case_path = r'C:\Users\Dongqi Wu\OneDrive\Work\iEnergy\case\ISU\Master.dss'
+
+
+params = {'time_step' : 0.0167,
+          'max_step' : 600,
+          'DEREnable' : False,
+          'engine' : 'direct',
+          'pv_profile' : r'..\..\profiles\pv_profile\ercot_houston_pv.csv',
+          'wind_profile' : r'..\..\profiles\wind_profile\ercot_houston_wind.csv',
+          'load_profile' : r'..\..\profiles\load_profile\ercot_houston_load.csv',
+          }
+
+
+# no agents, the environment only runs the time series (reset and step then return no observation)
+myEnv = aienv.env(case_path, [], market=DoNothingMarket(), params=params)
+
+# a year of hourly profile in one engine call, the substation transformer is monitored every hour
+res = myEnv.run_qsts(start=0, hours=8760, monitors=[('Transformer.sub_xfmr', 1)])
+
+# daily voltages (steady state agents would act at these intervals)
+daily = myEnv.run_qsts(start=0, hours=8760, interval=24)
+plt.plot(daily['time'], daily['Vpu'].min(axis=1), label='min V')
+plt.plot(daily['time'], daily['Vpu'].max(axis=1), label='max V')
+plt.legend()
+plt.show()
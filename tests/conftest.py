@@ -0,0 +1,25 @@
+import os
+import pytest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IEEE34 = os.path.join(ROOT, 'case', 'IEEE34', 'ieee34Mod1.dss')
+IEEE34_DER = os.path.join(ROOT, 'case', 'IEEE34', 'ieee34Mod1_DER.dss')
+PROFILES = os.path.join(ROOT, 'profiles')
+
+
+# environment on IEEE34 with the ercot houston profiles, extra params override the defaults
+@pytest.fixture
+def make_env():
+    pytest.importorskip('rl')
+    pytest.importorskip('opendssdirect')
+    import AI4Dist.env as aienv
+
+    def make(agents, market=None, case_path=IEEE34, **extra):
+        params = {'time_step': 0.0167, 'max_step': 600, 'DEREnable': True, 'engine': 'direct',
+                  'pv_profile': os.path.join(PROFILES, 'PV_profile', 'ercot_houston_pv.csv'),
+                  'wind_profile': os.path.join(PROFILES, 'wind_profile', 'ercot_houston_wind.csv'),
+                  'load_profile': os.path.join(PROFILES, 'load_profile', 'ercot_houston_load.csv')}
+        params.update(extra)
+        return aienv.env(case_path, agents, market=market, params=params)
+    return make
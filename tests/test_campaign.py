@@ -0,0 +1,32 @@
+import json, os
+import numpy as np
+import pytest
+
+from AI4Dist.campaign import run_campaign, read_campaign
+
+
+# results of an earlier campaign: meta.json and parts of one scenario per chunk
+def old_campaign(path, partNum, **meta):
+    meta = {'scenarioNum': partNum, 'seed': 0, 'chunk': 1, 'given': False, 'specs': None, **meta}
+    with open(os.path.join(path, 'meta.json'), 'w') as fh:
+        json.dump(meta, fh)
+    for k in range(partNum):
+        np.savez(os.path.join(path, f'part-{k:06d}.npz'), scenario=np.array([k]))
+
+
+# resuming with other settings does not mix the two campaigns
+def test_resume_other_settings(tmp_path):
+    old_campaign(tmp_path, 3)
+    with pytest.raises(ValueError, match='other settings'):
+        run_campaign(None, str(tmp_path), scenarioNum=3, seed=1, chunk=1)
+    with open(os.path.join(tmp_path, 'meta.json')) as fh:
+        assert json.load(fh)['seed'] == 0
+    assert len(read_campaign(str(tmp_path))) == 3
+
+
+# parts past the scenarios of meta.json are not read
+def test_read_ignores_extra_parts(tmp_path):
+    old_campaign(tmp_path, 4)
+    with open(os.path.join(tmp_path, 'meta.json'), 'w') as fh:
+        json.dump({'scenarioNum': 2, 'seed': 0, 'chunk': 1, 'given': False, 'specs': None}, fh)
+    assert list(read_campaign(str(tmp_path))['scenario']) == [0, 1]
@@ -0,0 +1,34 @@
+import os
+import pytest
+
+pytest.importorskip('opendssdirect')
+from AI4Dist.engine.direct_engine import DirectEngine
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IEEE34 = os.path.join(ROOT, 'case', 'IEEE34', 'ieee34Mod1_DER.dss')
+IEEE37 = os.path.join(ROOT, 'case', 'IEEE37', 'ieee37.dss')
+
+
+# two engines in one process keep their own circuits
+def test_engines_are_independent():
+    a = DirectEngine()
+    a.command(f'compile [{IEEE34}]')
+    busesA = list(a.bus_names())
+    b = DirectEngine()
+    b.command(f'compile [{IEEE37}]')
+
+    assert list(a.bus_names()) == busesA
+    assert set(b.bus_names()) != set(busesA)
+    a.solve()
+    assert a.converged()
+    assert len(a.all_bus_volts()) == 2 * len(a.all_node_names())
+
+
+# a duplicated 'New' in a batch redefines the element, as in command()
+def test_commands_redefine_new():
+    a = DirectEngine()
+    a.command(f'compile [{IEEE34}]')
+    a.commands(['New load.extra bus1=840 kW=10', 'New load.extra bus1=840 kW=20'])
+    a.set('loads', 'Name', 'extra')
+    assert a.get('loads', 'kW') == 20
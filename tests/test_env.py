@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+
+from AI4Dist.agent.OCRelayAgent import OCAgent
+from AI4Dist.market.market_template import DoNothingMarket
+
+
+def relays():
+    return [OCAgent('800', '802', 'l1', 70, 0.1, 'IEEE-VIT'),
+            OCAgent('830', '854', 'l15', 60, 0.1, 'IEEE-VIT')]
+
+
+# 3-phase faults close to the relays of l1 and l15
+def faults(e):
+    return [e.case.make_fault({'bus': '806', 'type': '3', 'phases': ['1', '2', '3'], 'R': 0.01, 'T': 0.3}),
+            e.case.make_fault({'bus': '854', 'type': '3', 'phases': ['1', '2', '3'], 'R': 0.01, 'T': 0.2})]
+
+
+# trip times of the relays in an episode of the fault, NaN if a relay did not trip
+def run_episode(e, flt):
+    np.random.seed(1)
+    e.reset('fixed', 10, flt)
+    done = 0
+    while not done:
+        _, _, done, _ = e.step()
+    return np.array([np.nan if a.tripTime is None else a.tripTime for a in e.agents])
+
+
+# episodes do not depend on the ones before them
+def test_episodes_match_fresh_runs(make_env):
+    e = make_env(relays(), DoNothingMarket(), max_step=120)
+    X, Y = faults(e)
+    first = run_episode(e, X)
+    second = run_episode(e, Y)
+    third = run_episode(e, X)
+    assert np.array_equal(first, third, equal_nan=True)
+    assert not np.isnan(first).all()
+
+    fresh = make_env(relays(), DoNothingMarket(), max_step=120)
+    assert np.array_equal(run_episode(fresh, Y), second, equal_nan=True)
+
+
+# adaptive stepping trips the same relays at the same times as fixed steps
+def test_adaptive_matches_fixed(make_env):
+    trips = []
+    for adaptive in [False, True]:
+        e = make_env(relays(), DoNothingMarket(), max_step=120, adaptive=adaptive)
+        np.random.seed(2)
+        flts = [e.case.random_fault() for i in range(8)] + faults(e)
+        trips.append([run_episode(e, f) for f in flts])
+    # solving k steps at once adds up the time differently, by rounding only
+    np.testing.assert_allclose(trips[0], trips[1], atol=1e-9)
+    assert not np.isnan(trips[0]).all()
+
+
+# generators added after a checkpoint leave the registry with the rollback
+def test_rollback_trims_generators(make_env):
+    e = make_env(relays())
+    cp = e.case.checkpoint()
+    num = e.case.registry.count('generator')
+    e.case.add_gen(name='gx', fuel='diesel', bus='840', Pg=10, Vg=24.9, kVAbase=100)
+    assert e.case.registry.has('generator', 'gx')
+    e.case.rollback(cp)
+    assert not e.case.registry.has('generator', 'gx')
+    assert e.case.registry.count('generator') == num == len(e.case.genTable)
+
+
+# current samples need a line between the buses of the agent
+def test_sample_without_line(make_env):
+    e = make_env([OCAgent('800', '806', 'l1', 70, 0.1, 'IEEE-VIT')])
+    e.agents[0].obs = ['Iph']
+    with pytest.raises(ValueError, match='No line between bus 800 and 806'):
+        e.take_sample(0)
+
+
+# an env without agents runs the time series and still resets
+def test_qsts_without_agents(make_env):
+    e = make_env([], DoNothingMarket())
+    res = e.run_qsts(start=0, hours=3, interval=1)
+    assert res['Vpu'].shape[0] == 3
+    assert e.reset('fixed', 5) is None
+
+
+# the sensitivities come back when the time series fails
+def test_qsts_restores_sensitivity(make_env):
+    e = make_env([], DoNothingMarket())
+    sens = object()
+    e.case.sensitivity = sens
+    with pytest.raises(Exception):
+        e.run_qsts(start=0, hours=3, monitors=['Line.nowhere'])
+    assert e.case.sensitivity is sens
+
+
+# dynamic events are always solved, not served by a surrogate
+def test_dynamic_env_rejects_surrogate(make_env):
+    with pytest.raises(ValueError, match='dynamic agents'):
+        make_env(relays(), surrogate='surrogate.pkl')
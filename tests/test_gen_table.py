@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from AI4Dist.gen_table import genTable, genFrame
+
+
+def make_table():
+    return genTable({'name': ['g1', 'pv1', 'pv2'], 'fuel': ['diesel', 'pv', 'pv'], 'bus': ['800', '840', '890'],
+                     'Pg': [100, 20, 30], 'Qg': [0, 0, 0], 'Vg': [1, 1, 1], 'kVAbase': [500, 50, 60],
+                     'Pmin': [0, 0, 0], 'Pmax': [500, 50, 60], 'Qmin': [0, 0, 0], 'Qmax': [0, 0, 0], 'Pcost': [1, 0, 0]})
+
+
+# writes through genDF land in the table and are synced as changed rows
+def test_gen_frame_writes_through():
+    t = make_table()
+    gens = genFrame(t)
+    pv = gens['fuel'] == 'pv'
+    gens.loc[pv, 'Pmax'] = gens.loc[pv, 'kVAbase'] * 0.5
+    gens.loc[0, 'Pg'] = 120
+    gens['Qg'] = [1, 2, 3]
+
+    assert np.allclose(t['Pmax'], [500, 25, 30])
+    assert t['Pg'][0] == 120
+    assert np.allclose(t['Qg'], [1, 2, 3])
+    assert list(t.dirty_rows()) == [0, 1, 2]
+    assert list(gens.loc[pv, ['name', 'Pmax']]['name']) == ['pv1', 'pv2']
+
+
+# the DataFrame copy stays detached from the table
+def test_gen_frame_copy():
+    t = make_table()
+    df = genFrame(t).to_frame()
+    df.loc[0, 'Pg'] = 0
+    assert t['Pg'][0] == 100
+
+
+# the fuel rows and the name index follow writes of the text columns
+def test_text_writes_reindex():
+    t = make_table()
+    gens = genFrame(t)
+    assert list(t.fuel_rows('pv')) == [1, 2]
+    gens.loc[2, 'fuel'] = 'wind'
+    assert list(t.fuel_rows('pv')) == [1]
+    assert list(t.fuel_rows('wind')) == [2]
+    t['name'] = ['g1', 'pv1', 'w1']
+    assert t.index('w1') == 2
+    with pytest.raises(ValueError):
+        t['fuel'][0] = 'pv'
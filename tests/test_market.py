@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('scipy')
+from AI4Dist.market.market_template import OPFMarket
+from AI4Dist.agent.OCRelayAgent import OCAgent
+from conftest import IEEE34_DER
+
+
+# the generator table holds the last dispatch within the current bounds
+def check_dispatch(m, gens):
+    lo, hi, qlo, qhi = m.bounds()
+    assert np.allclose(gens['Pg'][m.rows], np.clip(m.last['pg'], lo, hi))
+    assert np.allclose(gens['Qg'][m.rows], np.clip(m.last['qg'], qlo, qhi))
+
+
+# skipped clearings keep the dispatch after the rollback of the table
+def test_skipped_hour_keeps_dispatch(make_env):
+    m = OPFMarket(tol=0.5)
+    e = make_env([OCAgent('800', '802', 'l1', 70, 0.1, 'IEEE-VIT')], m, IEEE34_DER)
+    for h in range(6):
+        e.reset('sequential')
+        check_dispatch(m, e.case.genTable)
+    assert m.counts['skip'] > 0
+
+
+# hours between clearings keep the dispatch of the last clearing
+def test_interval_keeps_dispatch(make_env):
+    m = OPFMarket(interval=2)
+    e = make_env([OCAgent('800', '802', 'l1', 70, 0.1, 'IEEE-VIT')], m, IEEE34_DER)
+    for h in range(6):
+        e.reset('sequential')
+        check_dispatch(m, e.case.genTable)
+
+
+# idle generators get a tiny power, absorbing ones keep their dispatch
+def test_sync_gen_power(make_env):
+    e = make_env([OCAgent('800', '802', 'l1', 70, 0.1, 'IEEE-VIT')], OPFMarket(), IEEE34_DER)
+    gens = e.case.genTable
+    rows = np.flatnonzero((gens['fuel'] != 'source') & (gens['fuel'] != 'pv'))[:2]
+    gens['Pg'][rows] = [0, -5]
+    e.case.sync_gen_df()
+    kw = []
+    for i in rows:
+        e.case.engine.set('generators', 'Name', gens['name'][i])
+        kw.append(e.case.engine.get('generators', 'kW'))
+    assert np.allclose(kw, [1e-3, -5])
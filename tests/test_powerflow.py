@@ -0,0 +1,22 @@
+import os
+import pytest
+
+pytest.importorskip('rl')
+pytest.importorskip('opendssdirect')
+from AI4Dist.dss_tools import dssCase
+from AI4Dist.powerflow import sweepSolver
+from conftest import ROOT
+
+
+CASES = ['IEEE34/ieee34Mod1.dss', 'IEEE34/ieee34Mod1_DER.dss', 'IEEE34/ieee34Mod2.dss',
+         'IEEE37/ieee37.dss', 'ISU/Master.dss']
+
+
+# the sweep solution matches OpenDSS on every bundled case
+@pytest.mark.parametrize('case', CASES)
+def test_sweep_matches_engine(case):
+    c = dssCase(os.path.join(ROOT, 'case', case), 0.0167, 'direct')
+    c.engine.command('set maxcontroliter=100')
+    c.engine.command('solve')
+    assert c.engine.converged()
+    assert sweepSolver(c).check_engine() < 1e-5
@@ -0,0 +1,45 @@
+import os
+import numpy as np
+import pytest
+
+pytest.importorskip('rl')
+import AI4Dist.env as aienv
+from AI4Dist.engine.replay_engine import ReplayEngine, RecordEngine
+from AI4Dist.agent.OCRelayAgent import OCAgent
+from AI4Dist.market.market_template import DoNothingMarket
+from conftest import IEEE34, PROFILES
+
+
+# two seeded fault episodes on IEEE34, returns the trip times of the relays
+def run_session(engine):
+    params = {'time_step': 0.0167, 'max_step': 60, 'DEREnable': True, 'engine': engine,
+              'pv_profile': os.path.join(PROFILES, 'PV_profile', 'ercot_houston_pv.csv'),
+              'wind_profile': os.path.join(PROFILES, 'wind_profile', 'ercot_houston_wind.csv'),
+              'load_profile': os.path.join(PROFILES, 'load_profile', 'ercot_houston_load.csv')}
+    agents = [OCAgent('800', '802', 'l1', 70, 0.1, 'IEEE-VIT'), OCAgent('830', '854', 'l15', 60, 0.1, 'IEEE-VIT')]
+    e = aienv.env(IEEE34, agents, market=DoNothingMarket(), params=params)
+    trips = []
+    for k, bus in enumerate(['806', '854']):
+        flt = e.case.make_fault({'bus': bus, 'type': '3', 'phases': ['1', '2', '3'], 'R': 0.01, 'T': 0.2})
+        np.random.seed(k)
+        e.reset('fixed', 10, flt)
+        done = 0
+        while not done:
+            _, _, done, _ = e.step()
+        trips.append([a.tripTime for a in agents])
+    return trips
+
+
+# a session recorded with the in-process engine is replayed call by call:
+# env, dssCase and the relays make the same calls and get the same trips
+def test_replay_session(tmp_path):
+    pytest.importorskip('opendssdirect')
+    from AI4Dist.engine.direct_engine import DirectEngine
+    rec = RecordEngine(DirectEngine())
+    trips = run_session(rec)
+    rec.save(str(tmp_path / 'session.pkl'))
+
+    eng = ReplayEngine(str(tmp_path / 'session.pkl'))
+    assert run_session(eng) == trips
+    assert eng.finished()
+    assert any(t is not None for ep in trips for t in ep)
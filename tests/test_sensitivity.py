@@ -0,0 +1,38 @@
+import pytest
+
+from AI4Dist.market.market_template import DoNothingMarket
+from conftest import IEEE34_DER
+
+
+# a setpoint whose finite difference did not converge is solved when it changes
+def test_failed_column_untracked(make_env, monkeypatch):
+    e = make_env([], DoNothingMarket(), IEEE34_DER, sensitivity={})
+    e.reset('fixed', 12)
+    s = e.case.sensitivity
+    engine = e.case.engine
+    converged = engine.converged
+    calls = []
+
+    # the first finite difference fails
+    def first_fails():
+        calls.append(1)
+        return len(calls) > 1
+
+    monkeypatch.setattr(engine, 'converged', first_fails)
+    s.build()
+    monkeypatch.setattr(engine, 'converged', converged)
+
+    row = s.rowsP[0]
+    assert not s.tracked[0, row]
+    assert row not in s.cols
+    assert s.JV.shape[1] == len(s.cols)
+    gen = s.setpoints()
+    gen[0, row] += 1
+    assert s.untracked(gen)
+
+
+# dynamic events are always solved
+def test_dynamic_env_rejects_sensitivity(make_env):
+    from AI4Dist.agent.OCRelayAgent import OCAgent
+    with pytest.raises(ValueError, match='dynamic agents'):
+        make_env([OCAgent('800', '802', 'l1', 70, 0.1, 'IEEE-VIT')], sensitivity={})
@@ -0,0 +1,32 @@
+import numpy as np
+
+from AI4Dist.agent.OCRelayAgent import OCAgent
+from AI4Dist.market.market_template import DoNothingMarket
+
+
+def relays():
+    return [OCAgent('800', '802', 'l1', 70, 0.1, 'IEEE-VIT'), OCAgent('802', '806', 'l2', 65, 0.1, 'IEEE-VIT'),
+            OCAgent('830', '854', 'l15', 60, 0.1, 'IEEE-VIT'), OCAgent('852r', '832', 'l25', 50, 0.1, 'IEEE-VIT')]
+
+
+# relays that trip in seeded IEEE34 faults
+def tripped(make_env, engine, num=15):
+    e = make_env(relays(), DoNothingMarket(), max_step=150, engine=engine)
+    res = []
+    for k in range(num):
+        np.random.seed(k)
+        flt = e.case.random_fault()
+        np.random.seed(100 + k)
+        e.reset('fixed', 10, flt)
+        done = 0
+        while not done:
+            _, _, done, _ = e.step()
+        res.append([a.tripTime is not None for a in e.agents])
+    return res
+
+
+# the synthetic engine trips the same relays as the real solver
+def test_synthetic_trips_match(make_env):
+    real = tripped(make_env, 'direct')
+    assert tripped(make_env, 'synthetic') == real
+    assert any(any(t) for t in real)
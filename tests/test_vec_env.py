@@ -0,0 +1,31 @@
+import os
+import pytest
+
+from conftest import IEEE34, PROFILES
+
+
+# one environment, built in the worker processes
+def build_env():
+    import AI4Dist.env as aienv
+    from AI4Dist.agent.OCRelayAgent import OCAgent
+    from AI4Dist.market.market_template import DoNothingMarket
+    params = {'time_step': 0.0167, 'max_step': 600, 'DEREnable': True, 'engine': 'direct',
+              'pv_profile': os.path.join(PROFILES, 'PV_profile', 'ercot_houston_pv.csv'),
+              'wind_profile': os.path.join(PROFILES, 'wind_profile', 'ercot_houston_wind.csv'),
+              'load_profile': os.path.join(PROFILES, 'load_profile', 'ercot_houston_load.csv')}
+    return aienv.env(IEEE34, [OCAgent('800', '802', 'l1', 70, 0.1, 'IEEE-VIT')], market=DoNothingMarket(), params=params)
+
+
+# sequential environments start at the first hour of the profiles
+def test_sequential_starts_at_first_hour():
+    pytest.importorskip('rl')
+    pytest.importorskip('opendssdirect')
+    from AI4Dist.vec_env import vecEnv
+    v = vecEnv(build_env, 2, mode='sequential')
+    try:
+        v.reset()
+        assert v.get_attr('hourNum') == [0, 0]
+        v.reset()
+        assert v.get_attr('hourNum') == [1, 1]
+    finally:
+        v.close()